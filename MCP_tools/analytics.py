@@ -0,0 +1,190 @@
+import argparse
+import os
+import time
+from typing import Any
+
+import numpy as np
+
+from roster import NO_ID, Roster
+
+# Cohort arrays are rebuilt at most this often per course; every report in between is pure array math
+ANALYTICS_TTL_SECONDS = float(os.getenv("ANALYTICS_TTL_SECONDS", "30"))
+# A student is stalled on an unpassed topic after this many days with no checkpoint attempt or cursor move
+ANALYTICS_STALLED_DAYS = float(os.getenv("ANALYTICS_STALLED_DAYS", "7"))
+
+
+class Cohort:
+    """
+    One course's students as columns: cursor position (TOC index, -1 when the
+    cursor is on a topic outside the TOC), passed checkpoints and best
+    scores (students × modules), the time of the latest attempt and the
+    time the cursor was last moved (enrolment counts as a move).
+    """
+
+    def __init__(self, course_id: str, toc: list[dict], user_ids: list[str], position: np.ndarray,
+                 completed: np.ndarray, best_score: np.ndarray, last_active: np.ndarray,
+                 cursor_since: np.ndarray):
+        self.course_id = course_id
+        self.toc = toc
+        self.user_ids = user_ids
+        self.position = position
+        self.completed = completed
+        self.best_score = best_score
+        self.last_active = last_active
+        self.cursor_since = cursor_since
+        self.built_at = time.time()
+
+    @classmethod
+    def build(cls, course_id: str, toc: list[dict], roster: Roster, progress_rows: list[tuple]) -> "Cohort":
+        """Columns for `course_id` from the roster and (user_id, topic_id, passed, best_score, last_attempt) rows."""
+        course = roster.courses.find(course_id)
+        user_ids, topics, since = [], [], []
+        if course != NO_ID:
+            # A snapshot: the build runs in a worker thread while tools may write the roster
+            for user_id, record in list(roster.records()):
+                if record.course == course:
+                    user_ids.append(user_id)
+                    topics.append(record.topic)
+                    since.append(record.since)
+
+        # topic code -> TOC index, then one gather for every student's position
+        module_of_topic = np.full(len(roster.topics) + 1, -1, dtype=np.int32)
+        for index, module in enumerate(toc):
+            code = roster.topics.find(module["name"])
+            if code != NO_ID:
+                module_of_topic[code] = index
+        # NO_ID (-1) indexes the trailing -1 slot
+        position = module_of_topic[np.asarray(topics, dtype=np.int32)] if topics else np.empty(0, dtype=np.int32)
+
+        rows = {user_id: row for row, user_id in enumerate(user_ids)}
+        modules = {module["name"]: index for index, module in enumerate(toc)}
+        completed = np.zeros((len(user_ids), len(toc)), dtype=bool)
+        best_score = np.full((len(user_ids), len(toc)), np.nan, dtype=np.float32)
+        last_active = np.full(len(user_ids), np.nan)
+        hits = [(rows[u], modules[t], passed, best, last) for u, t, passed, best, last in progress_rows
+                if u in rows and t in modules]
+        if hits:
+            r, m, passed, best, last = (np.asarray(column) for column in zip(*hits))
+            completed[r, m] = passed.astype(bool)
+            best_score[r, m] = best
+            np.fmax.at(last_active, r, last.astype(float))
+        return cls(course_id, toc, user_ids, position, completed, best_score, last_active,
+                   np.asarray(since, dtype=float))
+
+    def report(self, stalled_days: float = ANALYTICS_STALLED_DAYS, limit: int = 50,
+               now: float | None = None) -> dict[str, Any]:
+        now = time.time() if now is None else now
+        students, count = len(self.user_ids), len(self.toc)
+        on_toc = self.position >= 0
+
+        at_module = np.bincount(self.position[on_toc], minlength=count)
+        # Reached = cursor at or past the module, or its checkpoint passed
+        reached = ((self.position[:, None] >= np.arange(count)[None, :]) | self.completed).sum(axis=0)
+        completed = self.completed.sum(axis=0)
+        attempted = ~np.isnan(self.best_score)
+        attempts = attempted.sum(axis=0)
+        mean_best = np.where(attempts > 0, np.nansum(self.best_score, axis=0) / np.maximum(attempts, 1), np.nan)
+        following = np.append(reached[1:], 0)
+        drop_off = np.where(reached > 0, (reached - following) / np.maximum(reached, 1), 0.0)
+
+        # Stalled: on a TOC topic not yet passed, with no checkpoint attempt and no cursor move for stalled_days
+        current = np.clip(self.position, 0, None)
+        passed_current = self.completed[np.arange(students), current] if count else np.zeros(students, dtype=bool)
+        # fmax skips the NaN of students who never attempted, so idle time then runs from enrolment
+        idle_days = (now - np.fmax(self.last_active, self.cursor_since)) / 86400
+        stalled = on_toc & ~passed_current & (idle_days > stalled_days)
+        stalled_at = np.bincount(self.position[stalled], minlength=count)
+        stalled_rows = np.flatnonzero(stalled)
+        # Longest idle first
+        stalled_rows = stalled_rows[np.argsort(-idle_days[stalled_rows], kind="stable")]
+
+        return {
+            "course_id": self.course_id,
+            "students": students,
+            "off_toc_students": int(students - on_toc.sum()),
+            "modules": [
+                {
+                    "topic_id": module["name"],
+                    "description": module["description"],
+                    "at_topic": int(at_module[i]),
+                    "reached": int(reached[i]),
+                    "completed": int(completed[i]),
+                    "completion_rate": round(float(completed[i] / students), 4) if students else 0.0,
+                    "mean_best_score": None if np.isnan(mean_best[i]) else round(float(mean_best[i]), 4),
+                    "stalled": int(stalled_at[i]),
+                    "drop_off": round(float(drop_off[i]), 4) if i < count - 1 else None,
+                }
+                for i, module in enumerate(self.toc)
+            ],
+            "completed_histogram": np.bincount(self.completed.sum(axis=1), minlength=count + 1).tolist(),
+            "stalled_total": int(stalled.sum()),
+            "stalled": [
+                {
+                    "user_id": self.user_ids[row],
+                    "topic_id": self.toc[self.position[row]]["name"],
+                    "days_idle": round(float(idle_days[row]), 1),
+                }
+                for row in stalled_rows[:max(0, limit)]
+            ],
+            "stuck_topic": self.toc[int(stalled_at.argmax())]["name"] if stalled.any() else None,
+            "stalled_days": stalled_days,
+            "built_at": self.built_at,
+        }
+
+
+class ClassAnalytics:
+    """Per-course cohorts, rebuilt from the roster and progress store when older than `ttl`."""
+
+    def __init__(self, roster: Roster, courses: dict, progress_store, ttl: float = ANALYTICS_TTL_SECONDS):
+        self.roster = roster
+        self.courses = courses
+        self.progress_store = progress_store
+        self.ttl = ttl
+        self._cohorts: dict[str, Cohort] = {}
+
+    def cohort(self, course_id: str) -> Cohort:
+        if course_id not in self.courses:
+            raise ValueError(f"Course {course_id} not found")
+        cohort = self._cohorts.get(course_id)
+        if cohort is None or time.time() - cohort.built_at > self.ttl:
+            toc = self.courses[course_id]["toc"]
+            rows = self.progress_store.for_topics([module["name"] for module in toc])
+            cohort = self._cohorts[course_id] = Cohort.build(course_id, toc, self.roster, rows)
+        return cohort
+
+    def report(self, course_id: str, stalled_days: float = ANALYTICS_STALLED_DAYS, limit: int = 50) -> dict[str, Any]:
+        started = time.perf_counter()
+        result = self.cohort(course_id).report(stalled_days, limit)
+        result["compute_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+
+def print_report(report: dict[str, Any]):
+    print(f"📊 {report['course_id']}: {report['students']:,} students "
+          f"({report['off_toc_students']:,} outside the TOC), computed in {report['compute_ms']} ms")
+    print(f"{'topic':<32} {'at':>7} {'reached':>8} {'passed':>7} {'rate':>6} {'score':>6} {'stalled':>8} {'drop':>6}")
+    for m in report["modules"]:
+        score = "-" if m["mean_best_score"] is None else f"{m['mean_best_score']:.2f}"
+        drop = "-" if m["drop_off"] is None else f"{m['drop_off']:.0%}"
+        print(f"{m['topic_id'][:32]:<32} {m['at_topic']:>7,} {m['reached']:>8,} {m['completed']:>7,} "
+              f"{m['completion_rate']:>6.0%} {score:>6} {m['stalled']:>8,} {drop:>6}")
+    print(f"✅ Modules passed per student: {report['completed_histogram']}")
+    print(f"🧱 {report['stalled_total']:,} stalled (> {report['stalled_days']:g} days); "
+          f"most stuck on {report['stuck_topic'] or '-'}")
+    for s in report["stalled"]:
+        print(f"   {s['user_id']:<24} {s['topic_id']:<32} {s['days_idle']} days idle")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Class progress report for one course")
+    parser.add_argument("course_id")
+    parser.add_argument("--stalled-days", type=float, default=ANALYTICS_STALLED_DAYS)
+    parser.add_argument("--limit", type=int, default=20, help="stalled students to list")
+    args = parser.parse_args()
+
+    from main import class_analytics
+    print_report(class_analytics.report(args.course_id, args.stalled_days, args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+# Token verification for the tools' auth_token argument: off (default, tokens ignored) or on
+MCP_AUTH = os.getenv("MCP_AUTH", "off")
+# JSON key set {"active": kid, "keys": {kid: base64 secret}}; reloaded when the file changes
+#
+#   python auth.py rotate                  # add a new signing key and make it active
+#   python auth.py retire <kid>            # drop an old key (its tokens stop verifying)
+#   python auth.py issue Mustafa --ttl 3600
+MCP_AUTH_KEYS = os.getenv("MCP_AUTH_KEYS", "auth_keys.json")
+# Verified tokens kept in memory; a hit costs a dict lookup instead of an HMAC check
+MCP_AUTH_CACHE_ENTRIES = int(os.getenv("MCP_AUTH_CACHE_ENTRIES", "10000"))
+# Cached verifications are redone at least this often, even for long-lived tokens
+MCP_AUTH_CACHE_SECONDS = float(os.getenv("MCP_AUTH_CACHE_SECONDS", "300"))
+# Allowed clock difference when checking exp / nbf
+MCP_AUTH_LEEWAY_SECONDS = float(os.getenv("MCP_AUTH_LEEWAY_SECONDS", "30"))
+
+
+class AuthError(ValueError):
+    """An auth token is malformed, badly signed, expired, or not the caller's."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class KeySet:
+    """
+    HMAC-SHA256 signing keys by key id. Tokens are signed with the active key
+    and verified with whichever key their header names, so a rotation keeps
+    older tokens valid until their key is retired.
+    """
+
+    def __init__(self, keys: dict[str, bytes], active: str | None = None):
+        if active is not None and active not in keys:
+            raise ValueError(f"Active key {active} is not in the key set")
+        self.keys = keys
+        self.active = active
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KeySet":
+        return cls({kid: _b64decode(secret) for kid, secret in data.get("keys", {}).items()}, data.get("active"))
+
+    def to_dict(self) -> dict:
+        return {"active": self.active, "keys": {kid: _b64encode(secret) for kid, secret in self.keys.items()}}
+
+    def rotate(self, kid: str | None = None) -> str:
+        """Add a fresh key and make it the signing key. Returns its id."""
+        kid = kid or time.strftime("k%Y%m%d%H%M%S")
+        if kid in self.keys:
+            raise ValueError(f"Key {kid} already exists")
+        self.keys[kid] = secrets.token_bytes(32)
+        self.active = kid
+        return kid
+
+    def retire(self, kid: str):
+        if kid == self.active:
+            raise ValueError(f"Key {kid} is the active signing key; rotate first")
+        if self.keys.pop(kid, None) is None:
+            raise ValueError(f"Unknown key {kid}")
+
+    def sign(self, claims: dict) -> str:
+        if self.active is None:
+            raise ValueError("The key set has no active signing key; run `python auth.py rotate`")
+        header = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT", "kid": self.active}).encode())
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        signature = hmac.new(self.keys[self.active], f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        return f"{header}.{payload}.{_b64encode(signature)}"
+
+    def verify(self, token: str, now: float | None = None, leeway: float = MCP_AUTH_LEEWAY_SECONDS) -> dict:
+        """Claims of a validly signed, unexpired HS256 token; raises AuthError otherwise."""
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+            header = json.loads(_b64decode(header_b64))
+            signature = _b64decode(signature_b64)
+        except ValueError:
+            raise AuthError("Malformed auth token") from None
+        if not isinstance(header, dict) or header.get("alg") != "HS256":
+            raise AuthError("Unsupported auth token algorithm")
+        key = self.keys.get(header.get("kid"))
+        if key is None:
+            raise AuthError("Auth token signed with an unknown or retired key")
+        expected = hmac.new(key, f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(signature, expected):
+            raise AuthError("Invalid auth token signature")
+        try:
+            claims = json.loads(_b64decode(payload_b64))
+        except ValueError:
+            raise AuthError("Malformed auth token") from None
+        if not isinstance(claims, dict):
+            raise AuthError("Malformed auth token")
+        now = time.time() if now is None else now
+        if "exp" not in claims or claims["exp"] + leeway < now:
+            raise AuthError("Auth token expired")
+        if claims.get("nbf", 0) - leeway > now:
+            raise AuthError("Auth token not valid yet")
+        return claims
+
+
+def load_key_set(path: str = MCP_AUTH_KEYS) -> KeySet:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return KeySet.from_dict(json.load(f))
+    except FileNotFoundError:
+        return KeySet({})
+
+
+def save_key_set(key_set: KeySet, path: str = MCP_AUTH_KEYS):
+    tmp_path = f"{path}.tmp"
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+        json.dump(key_set.to_dict(), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class VerifiedTokenCache:
+    """
+    Bounded token → claims cache. Entries expire with their token (or after
+    `max_age`, whichever is first). Inserting into a full cache first drops
+    expired entries (soonest expiry first, via a heap), then the least
+    recently used ones.
+    """
+
+    def __init__(self, max_entries: int = MCP_AUTH_CACHE_ENTRIES, max_age: float = MCP_AUTH_CACHE_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.max_age = max_age
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._expiries: list[tuple[float, str]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str, now: float) -> dict | None:
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= now:
+            if entry is not None:
+                del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, token: str, claims: dict, now: float):
+        expires = min(float(claims["exp"]), now + self.max_age)
+        if len(self._entries) >= self.max_entries:
+            self._evict(now)
+        self._entries[token] = (expires, claims)
+        heapq.heappush(self._expiries, (expires, token))
+        # Heap entries of evicted or re-verified tokens are dropped lazily; rebuild if they pile up
+        if len(self._expiries) > 2 * self.max_entries:
+            self._expiries = [(expires, token) for token, (expires, _) in self._entries.items()]
+            heapq.heapify(self._expiries)
+
+    def _evict(self, now: float):
+        while self._expiries and self._expiries[0][0] <= now:
+            expires, token = heapq.heappop(self._expiries)
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] == expires:
+                del self._entries[token]
+                self.evictions += 1
+        while len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._expiries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class TokenVerifier:
+    """
+    Checks a tool call's auth_token: cache hit → claims in about a
+    microsecond; miss → HMAC check against the key set, then cached. The key
+    file is re-read within a second of changing (rotation), which also
+    empties the cache so tokens of a retired key stop working.
+    """
+
+    def __init__(self, key_set: KeySet | None = None, keys_path: str | None = MCP_AUTH_KEYS,
+                 cache: VerifiedTokenCache | None = None, enabled: bool = MCP_AUTH == "on"):
+        self.enabled = enabled
+        self.keys_path = keys_path if key_set is None else None
+        self.key_set = key_set or KeySet({})
+        self.cache = cache or VerifiedTokenCache()
+        self._lock = threading.Lock()
+        self._keys_mtime = None
+        self._keys_checked = 0.0
+
+    def _refresh_keys(self, now: float):
+        # Runs on cache hits too (a retired key must empty the cache), but stats the file at most once a second
+        if self.keys_path is None or now - self._keys_checked < 1:
+            return
+        self._keys_checked = now
+        try:
+            mtime = os.stat(self.keys_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._keys_mtime:
+            self.key_set = load_key_set(self.keys_path)
+            self._keys_mtime = mtime
+            self.cache.clear()
+
+    def verify(self, token: str, user_id: str | None = None, role: str | None = None) -> dict:
+        """Claims for `token`; with `user_id`, the token must also belong to that student; with `role`, carry it."""
+        now = time.time()
+        with self._lock:
+            self._refresh_keys(now)
+            claims = self.cache.get(token, now)
+            if claims is None:
+                claims = self.key_set.verify(token, now)
+                self.cache.put(token, claims, now)
+        if user_id is not None and claims.get("sub") != user_id and "admin" not in claims.get("roles", ()):
+            raise AuthError("Auth token does not belong to this student")
+        if role is not None and role not in claims.get("roles", ()):
+            raise AuthError(f"This tool needs the {role} role")
+        return claims
+
+
+verifier = TokenVerifier()
+
+
+def authorize(auth_token: str, user_id: str | None = None, role: str | None = None):
+    """Called first by every tool; a no-op unless MCP_AUTH=on."""
+    if verifier.enabled:
+        verifier.verify(auth_token, user_id, role)
+
+
+def issue_token(key_set: KeySet, subject: str, ttl: float = 3600, roles: list[str] | None = None) -> str:
+    now = int(time.time())
+    claims: dict[str, Any] = {"sub": subject, "iat": now, "exp": now + int(ttl)}
+    if roles:
+        claims["roles"] = roles
+    return key_set.sign(claims)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage MCP tool auth keys and issue tokens")
+    parser.add_argument("--keys", default=MCP_AUTH_KEYS, help="key set file (default: MCP_AUTH_KEYS)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rotate_parser = sub.add_parser("rotate", help="add a new signing key and make it active")
+    rotate_parser.add_argument("kid", nargs="?")
+    retire_parser = sub.add_parser("retire", help="remove a key that no longer signs tokens")
+    retire_parser.add_argument("kid")
+    issue_parser = sub.add_parser("issue", help="print a token for a student (or service with --role admin)")
+    issue_parser.add_argument("subject")
+    issue_parser.add_argument("--ttl", type=float, default=3600)
+    issue_parser.add_argument("--role", action="append", dest="roles")
+    sub.add_parser("list", help="list key ids")
+    args = parser.parse_args()
+
+    key_set = load_key_set(args.keys)
+    if args.command == "rotate":
+        kid = key_set.rotate(args.kid)
+        save_key_set(key_set, args.keys)
+        print(f"🔑 Signing with {kid}; keys: {', '.join(key_set.keys)}")
+    elif args.command == "retire":
+        key_set.retire(args.kid)
+        save_key_set(key_set, args.keys)
+        print(f"🗑️ Retired {args.kid}; keys: {', '.join(key_set.keys) or '(none)'}")
+    elif args.command == "issue":
+        print(issue_token(key_set, args.subject, args.ttl, args.roles))
+    else:
+        for kid in key_set.keys:
+            print(f"{'*' if kid == key_set.active else ' '} {kid}")
+
+
+if __name__ == "__main__":
+    main()
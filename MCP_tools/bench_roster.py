@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Resident memory of the roster: nested dicts (the old STUDENTS shape) vs roster.Roster
+#
+#   python bench_roster.py                       # 100k and 1M students
+#   python bench_roster.py --students 250000
+#
+# Each measurement runs in a fresh interpreter so RSS is not skewed by earlier runs.
+
+COURSES = 40
+TOPICS_PER_COURSE = 25
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux /proc; falls back to the peak from getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def student(i: int) -> tuple[str, dict]:
+    course = i % COURSES
+    # Built with str() so ids are distinct objects, as they are when loaded from catalog.db
+    return f"student{i:07d}", {
+        "name": f"Student Number {i}",
+        "level": ("beginner", "intermediate", "advanced")[i % 3],
+        "active_cursor_position": {
+            "course_id": str(f"COURSE_{course:03d}"),
+            "topic_id": str(f"{i % TOPICS_PER_COURSE:02d}_topic_of_course_{course:03d}"),
+        },
+    }
+
+
+def measure(kind: str, count: int) -> dict:
+    from roster import Roster
+
+    before = rss_bytes()
+    started = time.perf_counter()
+    students = Roster() if kind == "roster" else {}
+    for i in range(count):
+        user_id, data = student(i)
+        students[user_id] = data
+    build = time.perf_counter() - started
+    resident = rss_bytes() - before
+
+    probes = [f"student{i:07d}" for i in range(0, count, max(1, count // 10000))]
+    started = time.perf_counter()
+    for user_id in probes:
+        students[user_id]["active_cursor_position"]["topic_id"]
+    lookup_us = (time.perf_counter() - started) / len(probes) * 1e6
+    return {
+        "kind": kind, "students": count, "rss_bytes": resident,
+        "bytes_per_student": resident // count, "build_seconds": round(build, 2), "lookup_us": round(lookup_us, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark resident memory of the student roster")
+    parser.add_argument("--students", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--worker", nargs=2, metavar=("KIND", "COUNT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker[0], int(args.worker[1]))))
+        return
+
+    print(f"{'roster':>8} {'students':>10} {'RSS MB':>9} {'B/student':>10} {'build s':>8} {'lookup µs':>10}")
+    for count in args.students:
+        for kind in ("dict", "roster"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", kind, str(count)],
+                check=True, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout
+            r = json.loads(output)
+            print(f"{r['kind']:>8} {r['students']:>10,} {r['rss_bytes'] / 1e6:>9.1f} {r['bytes_per_student']:>10} "
+                  f"{r['build_seconds']:>8} {r['lookup_us']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import sqlite3
+from typing import Any, Iterable
+
+from resources import CONTENT_ROOT
+
+# SQLite catalog store filled by import_catalog.py; loaded by main.py at startup
+CATALOG_DB = os.getenv("CATALOG_DB", os.path.join(CONTENT_ROOT, "catalog.db"))
+
+LEVELS = ("beginner", "intermediate", "advanced")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    user_id   TEXT PRIMARY KEY,
+    name      TEXT NOT NULL,
+    level     TEXT NOT NULL,
+    course_id TEXT,
+    topic_id  TEXT
+);
+CREATE TABLE IF NOT EXISTS courses (
+    course_id TEXT PRIMARY KEY,
+    title     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS toc (
+    course_id   TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    topic_id    TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (course_id, position)
+);
+CREATE INDEX IF NOT EXISTS toc_topic ON toc (course_id, topic_id);
+CREATE TABLE IF NOT EXISTS topics (
+    topic_id TEXT PRIMARY KEY,
+    title    TEXT NOT NULL,
+    content  TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS topic_resources (
+    topic_id TEXT NOT NULL,
+    key      TEXT NOT NULL,
+    url      TEXT NOT NULL,
+    PRIMARY KEY (topic_id, key)
+);
+"""
+
+# TOC rows of one import are staged here, then replace their courses' TOCs in one transaction
+TOC_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS toc_import (
+    course_id   TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    topic_id    TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (course_id, position)
+);
+"""
+
+# kind -> (required fields, optional fields, upsert statement)
+ROW_KINDS = {
+    "student": (
+        ("user_id", "name", "level"), ("course_id", "topic_id"),
+        "INSERT INTO students (user_id, name, level, course_id, topic_id) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET name=excluded.name, level=excluded.level, "
+        "course_id=excluded.course_id, topic_id=excluded.topic_id",
+    ),
+    "course": (
+        ("course_id", "title"), (),
+        "INSERT INTO courses (course_id, title) VALUES (?, ?) "
+        "ON CONFLICT(course_id) DO UPDATE SET title=excluded.title",
+    ),
+    "toc": (
+        ("course_id", "position", "topic_id", "description"), (),
+        "INSERT INTO toc_import (course_id, position, topic_id, description) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(course_id, position) DO UPDATE SET topic_id=excluded.topic_id, description=excluded.description",
+    ),
+    "topic": (
+        ("topic_id", "title"), ("content",),
+        "INSERT INTO topics (topic_id, title, content) VALUES (?, ?, ?) "
+        "ON CONFLICT(topic_id) DO UPDATE SET title=excluded.title, content=excluded.content",
+    ),
+    "resource": (
+        ("topic_id", "key", "url"), (),
+        "INSERT INTO topic_resources (topic_id, key, url) VALUES (?, ?, ?) "
+        "ON CONFLICT(topic_id, key) DO UPDATE SET url=excluded.url",
+    ),
+}
+
+
+def connect(path: str = CATALOG_DB) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    conn.executescript(TOC_STAGING)
+    return conn
+
+
+def validate_row(kind: str, row: dict[str, Any]) -> tuple:
+    """Return the row as an insert tuple. Raises ValueError describing the first problem."""
+    if not isinstance(row, dict):
+        raise ValueError(f"row must be an object, got {type(row).__name__}")
+    if kind not in ROW_KINDS:
+        raise ValueError(f"unknown row kind {kind!r}")
+    required, optional, _ = ROW_KINDS[kind]
+    values = []
+    for field in required:
+        value = row.get(field)
+        if value is None or str(value).strip() == "":
+            raise ValueError(f"{kind}: missing {field}")
+        values.append(str(value).strip())
+    for field in optional:
+        value = row.get(field)
+        values.append(str(value).strip() if value not in (None, "") else ("" if field == "content" else None))
+
+    if kind == "student" and values[2] not in LEVELS:
+        raise ValueError(f"student {values[0]}: level must be one of {', '.join(LEVELS)}")
+    if kind == "toc":
+        try:
+            values[1] = int(values[1])
+        except ValueError:
+            raise ValueError(f"toc {values[0]}: position must be an integer") from None
+    if kind == "resource" and "://" not in values[2]:
+        raise ValueError(f"resource {values[0]}/{values[1]}: url needs a scheme (e.g. file://)")
+    return tuple(values)
+
+
+def upsert_batch(conn: sqlite3.Connection, kind: str, rows: Iterable[tuple]) -> int:
+    """Upsert validated rows of one kind in a single transaction."""
+    rows = list(rows)
+    with conn:
+        conn.executemany(ROW_KINDS[kind][2], rows)
+    return len(rows)
+
+
+def replace_tocs(conn: sqlite3.Connection) -> int:
+    """
+    Make the staged TOC rows the whole TOC of each course they mention, in one
+    transaction: a shorter TOC re-imported over a longer one leaves no stale rows.
+    """
+    with conn:
+        conn.execute("DELETE FROM toc WHERE course_id IN (SELECT DISTINCT course_id FROM toc_import)")
+        replaced = conn.execute(
+            "INSERT INTO toc (course_id, position, topic_id, description) "
+            "SELECT course_id, position, topic_id, description FROM toc_import"
+        ).rowcount
+        conn.execute("DELETE FROM toc_import")
+    return replaced
+
+
+def misplaced_students(conn: sqlite3.Connection, limit: int = 10) -> tuple[int, list[tuple]]:
+    """Students whose cursor names a topic missing from their course's TOC: (count, first `limit` rows)."""
+    query = (
+        "FROM students s WHERE s.course_id IS NOT NULL AND NOT EXISTS "
+        "(SELECT 1 FROM toc t WHERE t.course_id = s.course_id AND t.topic_id = s.topic_id)"
+    )
+    count = conn.execute(f"SELECT COUNT(*) {query}").fetchone()[0]
+    rows = conn.execute(f"SELECT s.user_id, s.course_id, s.topic_id {query} LIMIT ?", (limit,)).fetchall()
+    return count, rows
+
+
+def load_catalog(path: str, students: dict, courses: dict, topics: dict):
+    """
+    Merge the catalog store into the in-memory STUDENTS / COURSES / TOPICS
+    dicts, in the same shapes main.py's literal test data uses.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        for user_id, name, level, course_id, topic_id in conn.execute(
+            "SELECT user_id, name, level, course_id, topic_id FROM students"
+        ):
+            student = {"name": name, "level": level}
+            if course_id and topic_id:
+                student["active_cursor_position"] = {"course_id": course_id, "topic_id": topic_id}
+            students[user_id] = student
+
+        for course_id, title in conn.execute("SELECT course_id, title FROM courses"):
+            courses[course_id] = {"title": title, "toc": []}
+        for course_id, topic_id, description in conn.execute(
+            "SELECT course_id, topic_id, description FROM toc ORDER BY course_id, position"
+        ):
+            course = courses.setdefault(course_id, {"title": course_id, "toc": []})
+            course["toc"].append({"name": topic_id, "description": description})
+
+        for topic_id, title, content in conn.execute("SELECT topic_id, title, content FROM topics"):
+            topics[topic_id] = {
+                "title": title, "content": content, "topic_id": topic_id, "content_resource_urls": {},
+            }
+        for topic_id, key, url in conn.execute("SELECT topic_id, key, url FROM topic_resources ORDER BY topic_id, key"):
+            topic = topics.setdefault(
+                topic_id, {"title": topic_id, "content": "", "topic_id": topic_id, "content_resource_urls": {}}
+            )
+            topic["content_resource_urls"][key] = url
+    finally:
+        conn.close()
+    print(f"📚 Loaded catalog {path}: {len(students)} students, {len(courses)} courses, {len(topics)} topics")
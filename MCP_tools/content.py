@@ -0,0 +1,150 @@
+import hashlib
+import json
+import sys
+from collections import OrderedDict
+from typing import Any
+
+from resources import TEXT_CACHE_ENTRIES, resolver
+from lessons import lesson_store, outline
+
+
+class ContentIndex:
+    """
+    Topics identified by what they teach, not by where they are listed.
+
+    A topic's content hash is the sha256 of its resources' content hashes, so
+    the same lessons reached through several courses (or several topic ids)
+    share one hash. Parsed lessons, outlines and compact TOCs are cached per
+    hash, and the catalog's TOC entries and resource maps are interned, so
+    memory and warm-up grow with unique content rather than course count.
+    """
+
+    def __init__(self, max_entries: int = TEXT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._hashes: dict[tuple, str] = {}
+        self._lessons: OrderedDict[str, dict] = OrderedDict()
+        self._outlines: OrderedDict[str, dict] = OrderedDict()
+        self._tocs: OrderedDict[str, list] = OrderedDict()
+        self._course_tocs: dict[str, tuple[list, list]] = {}
+        self.interned_modules = 0
+        self.interned_resource_maps = 0
+
+    def topic_hash(self, topic: dict) -> str:
+        """Content hash of a topic (resource handles are revalidated by stat, so edits change it)."""
+        shas = tuple(sorted(
+            (key, resolver.resolve(url).sha256) for key, url in topic.get("content_resource_urls", {}).items()
+        ))
+        digest = self._hashes.get(shas)
+        if digest is None:
+            digest = hashlib.sha256(json.dumps(shas).encode()).hexdigest()
+            self._hashes[shas] = digest
+        return digest
+
+    def content_hash(self, topic: dict, topic_id: str = "") -> str | None:
+        """topic_hash, or None when a resource is missing or unreadable (one bad file must not fail a TOC)."""
+        try:
+            return self.topic_hash(topic)
+        except (ValueError, OSError) as e:
+            print(f"⚠️ Cannot hash content of {topic_id or 'topic'}: {e}")
+            return None
+
+    def lessons(self, topic: dict) -> tuple[str, dict[str, dict]]:
+        """(content hash, {resource key: parsed lesson}); lessons are parsed once per content hash."""
+        digest = self.topic_hash(topic)
+        lessons = self._cached(self._lessons, digest)
+        if lessons is None:
+            lessons = {key: lesson_store.get(url) for key, url in topic["content_resource_urls"].items()}
+            self._store(self._lessons, digest, lessons)
+        return digest, lessons
+
+    def outline(self, topic: dict) -> dict[str, Any]:
+        """Per-resource section outline, built once per content hash."""
+        digest, lessons = self.lessons(topic)
+        result = self._cached(self._outlines, digest)
+        if result is None:
+            result = {
+                key: {"title": lesson["title"], "tokens": lesson["tokens"], "sections": outline(lesson)}
+                for key, lesson in lessons.items()
+            }
+            self._store(self._outlines, digest, result)
+        return result
+
+    def toc_modules(self, course_id: str, toc: list[dict]) -> list:
+        """[[topic_id, description], ...] for a course, one shared list per distinct TOC."""
+        memo = self._course_tocs.get(course_id)
+        if memo is not None and memo[0] is toc:
+            return memo[1]
+        pairs = [[module["name"], module["description"]] for module in toc]
+        digest = hashlib.sha256(json.dumps(pairs).encode()).hexdigest()
+        modules = self._cached(self._tocs, digest)
+        if modules is None:
+            modules = pairs
+            self._store(self._tocs, digest, modules)
+        self._course_tocs[course_id] = (toc, modules)
+        return modules
+
+    def intern_catalog(self, courses: dict, topics: dict):
+        """
+        Make identical TOC entries and resource maps one shared object each,
+        so a module listed by a thousand courses is held once.
+        """
+        modules: dict[tuple, dict] = {}
+        for course in courses.values():
+            toc = []
+            for module in course.get("toc", []):
+                key = (module["name"], module["description"])
+                shared = modules.get(key)
+                if shared is None:
+                    shared = modules[key] = {"name": sys.intern(key[0]), "description": key[1]}
+                else:
+                    self.interned_modules += 1
+                toc.append(shared)
+            course["toc"] = toc
+
+        resource_maps: dict[tuple, dict] = {}
+        for topic in topics.values():
+            urls = topic.get("content_resource_urls") or {}
+            key = tuple(sorted(urls.items()))
+            shared = resource_maps.get(key)
+            if shared is None:
+                resource_maps[key] = urls
+            else:
+                topic["content_resource_urls"] = shared
+                self.interned_resource_maps += 1
+
+    def unique_topics(self, topics: dict) -> dict[str, list[str]]:
+        """{content hash: [topic ids teaching it]}; topics whose resources cannot be resolved are skipped."""
+        unique: dict[str, list[str]] = {}
+        for topic_id, topic in topics.items():
+            digest = self.content_hash(topic, topic_id)
+            if digest is not None:
+                unique.setdefault(digest, []).append(topic_id)
+        return unique
+
+    def stats(self, topics: dict) -> dict:
+        unique = self.unique_topics(topics)
+        return {
+            "topics": len(topics),
+            "unique_contents": len(unique),
+            "shared_contents": sum(1 for ids in unique.values() if len(ids) > 1),
+            "interned_modules": self.interned_modules,
+            "interned_resource_maps": self.interned_resource_maps,
+            "cached_lessons": len(self._lessons),
+            "cached_outlines": len(self._outlines),
+            "cached_tocs": len(self._tocs),
+        }
+
+    @staticmethod
+    def _cached(cache: OrderedDict, key: str):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    def _store(self, cache: OrderedDict, key: str, value):
+        cache[key] = value
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+
+content_index = ContentIndex()
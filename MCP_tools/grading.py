@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from resources import CONTENT_ROOT
+
+# Authored checkpoint questions: QUESTION_BANK_DIR/<topic_id>.json (see question_banks/)
+QUESTION_BANK_DIR = os.getenv("QUESTION_BANK_DIR", os.path.join(CONTENT_ROOT, "question_banks"))
+# Checkpoint progress per (user_id, topic_id); kept in memory, written through to SQLite
+PROGRESS_DB = os.getenv("PROGRESS_DB", os.path.join(CONTENT_ROOT, "progress.db"))
+# Share of a checkpoint's questions a student must get right, unless the bank sets its own
+DEFAULT_PASS_RATIO = float(os.getenv("CHECKPOINT_PASS_RATIO", "0.7"))
+
+QUESTION_TYPES = ("choice", "keywords", "regex", "numeric")
+
+_NUMBER = re.compile(r"[-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+)")
+# "1,000" / "12,500.5": commas followed by exactly three digits group thousands ("1,5" stays a decimal comma)
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+# "b", "B)", "(b)", "b. Zero-shot prompting", "answer: b" -- but not "a zero-shot prompt", where "a" is an
+# article, nor "0.8-1.0", where "." is a decimal point: "." and ":" only mark a key before a space or the end
+_CHOICE_KEY = re.compile(r"^(?:answer\s*[:=]?\s*)?\(?([a-z0-9])\s*(?:\)|[.:](?=\s|$)|$)")
+_ARTICLE = re.compile(r"^(?:a|an|the)\s+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, punctuation-free, single-spaced text for comparing answers."""
+    return " ".join(re.sub(r"[^\w\s.+-]", " ", str(text).lower()).split())
+
+
+class Question:
+    """One compiled question: its matchers are built once, when the bank is loaded."""
+
+    __slots__ = ("id", "type", "prompt", "choices", "answer", "tolerance", "patterns", "min_matches", "explanation")
+
+    def __init__(self, spec: dict):
+        self.id = str(spec["id"])
+        self.type = spec["type"]
+        self.prompt = spec["prompt"]
+        self.choices = None
+        self.answer = None
+        self.tolerance = 0.0
+        self.patterns = ()
+        self.min_matches = 0
+        self.explanation = spec.get("explanation")
+
+        if self.type == "choice":
+            self.choices = {str(key).lower(): text for key, text in spec["choices"].items()}
+            self.answer = str(spec["answer"]).lower()
+            if self.answer not in self.choices:
+                raise ValueError(f"Question {self.id}: answer {self.answer!r} is not one of its choices")
+            # The choice text itself is also accepted
+            self.patterns = {normalize(text): key for key, text in self.choices.items()}
+        elif self.type == "keywords":
+            # Each entry is a keyword or a list of synonyms; any synonym matches the entry
+            groups = [entry if isinstance(entry, list) else [entry] for entry in spec["keywords"]]
+            self.patterns = tuple(
+                re.compile(r"\b(?:" + "|".join(re.escape(normalize(word)) for word in group) + r")\b")
+                for group in groups
+            )
+            self.min_matches = int(spec.get("min_matches", len(groups)))
+        elif self.type == "regex":
+            self.patterns = (re.compile(spec["pattern"], re.IGNORECASE),)
+        elif self.type == "numeric":
+            self.answer = float(spec["answer"])
+            # Absolute tolerance, or relative_tolerance as a share of the answer
+            self.tolerance = max(float(spec.get("tolerance", 0)),
+                                 float(spec.get("relative_tolerance", 0)) * abs(self.answer))
+        else:
+            raise ValueError(f"Question {self.id}: type must be one of {', '.join(QUESTION_TYPES)}")
+
+    def public(self) -> dict[str, Any]:
+        """The question as shown to the student (no answer or matchers)."""
+        question = {"id": self.id, "type": self.type, "prompt": self.prompt}
+        if self.choices is not None:
+            question["choices"] = self.choices
+        return question
+
+    def grade(self, answer) -> tuple[bool, str]:
+        """(correct, feedback) for one answer."""
+        if answer is None or not str(answer).strip():
+            return False, "no answer"
+        text = normalize(answer)
+
+        if self.type == "choice":
+            # Matched on the raw answer: normalize() drops the ")" / ":" that mark a choice letter
+            match = _CHOICE_KEY.match(str(answer).strip().lower())
+            key = match.group(1) if match and match.group(1) in self.choices else self._choice_by_text(text)
+            if key is None:
+                return False, f"not one of the choices ({', '.join(self.choices)})"
+            return key == self.answer, f"chose {key}"
+
+        if self.type == "keywords":
+            found = sum(1 for pattern in self.patterns if pattern.search(text))
+            return found >= self.min_matches, f"{found} of {len(self.patterns)} key points (need {self.min_matches})"
+
+        if self.type == "regex":
+            matched = self.patterns[0].search(text) is not None
+            return matched, "matched" if matched else "no match"
+
+        # Raw text as well: normalize() would split "1,000" into "1 000"
+        match = _NUMBER.search(_THOUSANDS.sub("", str(answer)))
+        if match is None:
+            return False, "no number found"
+        value = float(match.group().replace(",", "."))
+        return abs(value - self.answer) <= self.tolerance, f"read {value:g}"
+
+    def _choice_by_text(self, text: str) -> str | None:
+        """
+        The choice whose text was written out ("a zero-shot prompt" → "Zero-shot
+        prompting"), if unambiguous. A shortened answer must keep at least the
+        choice's first whole word, so fragments like "o" or "zero" match nothing.
+        """
+        text = _ARTICLE.sub("", text)
+        if text in self.patterns:
+            return self.patterns[text]
+        compact = text.replace(" ", "")
+        keys = {key for choice, key in self.patterns.items() if text and (
+            # Spacing aside ("0.8-1.0" for "0.8 - 1.0")
+            choice.replace(" ", "") == compact
+            or (choice.startswith(text) and (" " in text or choice[len(text)] == " "))
+            or text.startswith(choice + " ")
+        )}
+        return keys.pop() if len(keys) == 1 else None
+
+
+class QuestionBank:
+    __slots__ = ("topic_id", "title", "pass_ratio", "questions", "mtime")
+
+    def __init__(self, spec: dict, mtime: int):
+        self.topic_id = spec["topic_id"]
+        self.title = spec.get("title", self.topic_id)
+        self.pass_ratio = float(spec.get("pass_ratio", DEFAULT_PASS_RATIO))
+        self.questions = {}
+        for entry in spec["questions"]:
+            question = Question(entry)
+            if question.id in self.questions:
+                raise ValueError(f"Bank {self.topic_id}: duplicate question id {question.id}")
+            self.questions[question.id] = question
+        self.mtime = mtime
+
+
+class QuestionBanks:
+    """Banks compiled once per file edit (revalidated with a stat, like resolved resources)."""
+
+    def __init__(self, bank_dir: str = QUESTION_BANK_DIR):
+        self.bank_dir = bank_dir
+        self._banks: dict[str, QuestionBank] = {}
+
+    def path(self, topic_id: str) -> str:
+        return os.path.join(self.bank_dir, f"{os.path.basename(topic_id)}.json")
+
+    def get(self, topic_id: str) -> QuestionBank:
+        path = self.path(topic_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            raise ValueError(f"Topic {topic_id} has no checkpoint questions") from None
+        bank = self._banks.get(topic_id)
+        if bank is None or bank.mtime != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                bank = QuestionBank(json.load(f), mtime)
+            self._banks[topic_id] = bank
+        return bank
+
+    def topic_ids(self) -> list[str]:
+        if not os.path.isdir(self.bank_dir):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.bank_dir) if name.endswith(".json"))
+
+
+class ProgressStore:
+    """
+    Checkpoint progress per (user_id, topic_id): attempts, last and best score,
+    passed. Reads come from memory (loaded from SQLite on first use); every
+    graded attempt is written through. The database is opened on first use,
+    not at import.
+    """
+
+    def __init__(self, path: str = PROGRESS_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._progress: dict[tuple[str, str], dict] = {}
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        # Called with self._lock held
+        if self._conn is None:
+            self._conn = self._open()
+        return self._conn
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoint_progress (
+                user_id TEXT NOT NULL, topic_id TEXT NOT NULL, attempts INTEGER NOT NULL,
+                last_score REAL NOT NULL, best_score REAL NOT NULL, passed INTEGER NOT NULL,
+                last_attempt REAL NOT NULL, PRIMARY KEY (user_id, topic_id)
+            )
+            """
+        )
+        return conn
+
+    def get(self, user_id: str, topic_id: str) -> dict:
+        key = (user_id, topic_id)
+        progress = self._progress.get(key)
+        if progress is None:
+            with self._lock:
+                row = self._db().execute(
+                    "SELECT attempts, last_score, best_score, passed, last_attempt FROM checkpoint_progress "
+                    "WHERE user_id = ? AND topic_id = ?", key,
+                ).fetchone()
+            progress = {"attempts": 0, "last_score": 0.0, "best_score": 0.0, "passed": False, "last_attempt": None}
+            if row is not None:
+                progress.update(attempts=row[0], last_score=row[1], best_score=row[2],
+                                passed=bool(row[3]), last_attempt=row[4])
+            self._progress[key] = progress
+        return progress
+
+    def for_topics(self, topic_ids: list[str]) -> list[tuple]:
+        """(user_id, topic_id, passed, best_score, last_attempt) rows for every student, straight from SQLite."""
+        if not topic_ids:
+            return []
+        marks = ", ".join("?" * len(topic_ids))
+        with self._lock:
+            return self._db().execute(
+                "SELECT user_id, topic_id, passed, best_score, last_attempt FROM checkpoint_progress "
+                f"WHERE topic_id IN ({marks})", list(topic_ids),
+            ).fetchall()
+
+    def record(self, user_id: str, topic_id: str, score: float, passed: bool) -> dict:
+        progress = dict(self.get(user_id, topic_id))
+        progress["attempts"] += 1
+        progress["last_score"] = score
+        progress["best_score"] = max(progress["best_score"], score)
+        progress["passed"] = progress["passed"] or passed
+        progress["last_attempt"] = time.time()
+        with self._lock, self._db() as conn:
+            conn.execute(
+                "INSERT INTO checkpoint_progress VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(user_id, topic_id) DO UPDATE SET attempts=excluded.attempts, "
+                "last_score=excluded.last_score, best_score=excluded.best_score, "
+                "passed=excluded.passed, last_attempt=excluded.last_attempt",
+                (user_id, topic_id, progress["attempts"], score, progress["best_score"],
+                 int(progress["passed"]), progress["last_attempt"]),
+            )
+        self._progress[(user_id, topic_id)] = progress
+        return progress
+
+
+def grade_answers(bank: QuestionBank, answers: dict[str, Any]) -> dict[str, Any]:
+    """
+    Grade {question id: answer} against a bank. Questions left out count as
+    wrong, so a partial submission cannot pass on the questions it chose.
+    """
+    unknown = [key for key in answers if str(key) not in bank.questions]
+    if unknown:
+        raise ValueError(f"Unknown question ids for {bank.topic_id}: {', '.join(map(str, unknown))}")
+    answers = {str(key): value for key, value in answers.items()}
+
+    started = time.perf_counter_ns()
+    results = {}
+    for question_id, question in bank.questions.items():
+        correct, feedback = question.grade(answers.get(question_id))
+        results[question_id] = {"correct": correct, "feedback": feedback}
+        if not correct and question.explanation:
+            results[question_id]["explanation"] = question.explanation
+    score = sum(result["correct"] for result in results.values())
+    total = len(results)
+    elapsed_ns = time.perf_counter_ns() - started
+    return {
+        "topic_id": bank.topic_id,
+        "score": score,
+        "total": total,
+        "ratio": round(score / total, 4) if total else 0.0,
+        "passed": total > 0 and score / total >= bank.pass_ratio,
+        "pass_ratio": bank.pass_ratio,
+        "results": results,
+        "grading_us": round(elapsed_ns / 1000, 1),
+    }
+
+
+question_banks = QuestionBanks()
+progress_store = ProgressStore()
@@ -0,0 +1,119 @@
+import argparse
+import csv
+import json
+import time
+from collections import defaultdict
+from typing import Iterator
+
+from catalog import CATALOG_DB, ROW_KINDS, connect, misplaced_students, replace_tocs, upsert_batch, validate_row
+
+# Streaming roster / catalog import into the catalog store (constant memory).
+#
+#   python import_catalog.py students.csv --kind student
+#   python import_catalog.py toc.csv --kind toc
+#   python import_catalog.py catalog.jsonl                 # every line has a "kind" field
+#
+# Row kinds and fields:
+#   student   user_id, name, level, [course_id, topic_id]
+#   course    course_id, title
+#   toc       course_id, topic_id, description, [position]   (position defaults to file order;
+#             a file's rows replace the whole TOC of every course it lists)
+#   topic     topic_id, title, [content]
+#   resource  topic_id, key, url                              (e.g. 01, file://01_prompt_engineering.md)
+
+
+def read_rows(path: str, kind: str | None) -> Iterator[tuple[int, str, dict]]:
+    """Yield (line_number, kind, row) one at a time from a CSV or JSONL file."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_number, "invalid", {"error": f"bad JSON: {e}"}
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, "invalid", {"error": f"expected a JSON object, got {type(row).__name__}"}
+                    continue
+                yield line_number, kind or row.get("kind", ""), row
+        else:
+            if kind is None:
+                raise SystemExit("❌ CSV files need --kind")
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                yield line_number, kind, row
+
+
+def import_file(path: str, db_path: str = CATALOG_DB, kind: str | None = None,
+                batch_size: int = 5000, max_errors_shown: int = 10) -> dict:
+    conn = connect(db_path)
+    started = time.perf_counter()
+    batches: dict[str, list[tuple]] = defaultdict(list)
+    next_position: dict[str, int] = defaultdict(int)
+    counts = {"read": 0, "imported": 0, "rejected": 0}
+
+    def flush(batch_kind: str):
+        counts["imported"] += upsert_batch(conn, batch_kind, batches.pop(batch_kind))
+
+    try:
+        for line_number, row_kind, row in read_rows(path, kind):
+            counts["read"] += 1
+            try:
+                if row_kind == "invalid":
+                    raise ValueError(row["error"])
+                if row_kind == "toc" and not str(row.get("position", "")).strip():
+                    row = {**row, "position": next_position[row.get("course_id", "")]}
+                values = validate_row(row_kind, row)
+            except ValueError as e:
+                counts["rejected"] += 1
+                if counts["rejected"] <= max_errors_shown:
+                    print(f"⚠️ line {line_number}: {e}")
+                continue
+
+            if row_kind == "toc":
+                next_position[values[0]] = max(next_position[values[0]], values[1] + 1)
+            batches[row_kind].append(values)
+            if len(batches[row_kind]) >= batch_size:
+                flush(row_kind)
+
+            if counts["read"] % (batch_size * 10) == 0:
+                elapsed = time.perf_counter() - started
+                print(f"… {counts['read']:,} rows read ({counts['read'] / elapsed:,.0f} rows/s)")
+
+        for batch_kind in list(batches):
+            flush(batch_kind)
+        counts["tocs_replaced"] = replace_tocs(conn)
+        misplaced, examples = misplaced_students(conn, max_errors_shown)
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    counts["seconds"] = round(elapsed, 2)
+    counts["rows_per_second"] = round(counts["read"] / elapsed) if elapsed else counts["read"]
+    print(
+        f"✅ {path}: {counts['imported']:,} imported, {counts['rejected']:,} rejected "
+        f"in {elapsed:.2f}s ({counts['rows_per_second']:,} rows/s) -> {db_path}"
+    )
+    counts["misplaced_students"] = misplaced
+    if misplaced:
+        # Checked against the whole store, so student and TOC files can be imported in either order
+        print(f"⚠️ {misplaced:,} students point at a topic that is not in their course's TOC in {db_path}:")
+        for user_id, course_id, topic_id in examples:
+            print(f"   {user_id}: {course_id} / {topic_id}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream roster / catalog files into the catalog store")
+    parser.add_argument("paths", nargs="+", help="CSV or JSONL files")
+    parser.add_argument("--kind", choices=sorted(ROW_KINDS), help="row kind for CSV files")
+    parser.add_argument("--db", default=CATALOG_DB)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    for path in args.paths:
+        import_file(path, args.db, args.kind, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
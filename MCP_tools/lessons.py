@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import re
+import tempfile
+from typing import Any
+
+from resources import CONTENT_ROOT, resolver
+
+# Lesson markdown is parsed once per content hash into LESSON_BUILD_DIR/<sha256>.json
+#
+#   python lessons.py build                 # every topic resource in main.TOPICS
+#   python lessons.py build 02_six_part_prompting_framework.md
+#   python lessons.py show file://03_context_engineering_tutorial.md
+LESSON_BUILD_DIR = os.getenv("LESSON_BUILD_DIR", os.path.join(CONTENT_ROOT, "lesson_build"))
+# Bump when the parsed format changes so older builds are redone
+PARSER_VERSION = 1
+
+CHARS_PER_TOKEN = 4
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)\s*([\w+-]*)")
+# "Example 1: ...", "Hands-On Examples", "Real-World Example: ..." (not "Provide Examples When Possible")
+EXAMPLE_TITLE = re.compile(
+    r"^(?:(?:concrete|complete|real-world|hands-on|worked|practical|more)\s+)?examples?\b", re.IGNORECASE
+)
+EXERCISE_TITLE = re.compile(r"\b(?:exercises?|quiz(?:zes)?|assessment|practice projects?)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (≈4 chars per token)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def plain_title(title: str) -> str:
+    """Heading text without markdown emphasis or a leading "1." / "2)" number."""
+    title = re.sub(r"[*_`]", "", title).strip()
+    return re.sub(r"^\d+[.)]\s*", "", title)
+
+
+def classify(title: str) -> str:
+    title = plain_title(title)
+    if EXERCISE_TITLE.search(title):
+        return "exercise"
+    if EXAMPLE_TITLE.match(title):
+        return "example"
+    return "section"
+
+
+def parse_lesson(text: str) -> dict[str, Any]:
+    """
+    Split lesson markdown into a flat list of sections (one per heading, plus
+    any text before the first heading). Each section keeps its own body, its
+    fenced code blocks, a kind (section / example / exercise), and `end`: the
+    index after its last subsection, so sections[i:end] is the whole subtree.
+    Headings inside code fences are not headings.
+    """
+    sections = [{"level": 0, "title": "", "lines": [], "code_blocks": []}]
+    fence = None
+    code = None
+    for line in text.splitlines():
+        current = sections[-1]
+        match = FENCE.match(line)
+        if fence is None and match:
+            fence = match.group(1)
+            code = {"language": match.group(2), "lines": []}
+        elif fence is not None and line.strip().startswith(fence):
+            current["code_blocks"].append({"language": code["language"], "code": "\n".join(code["lines"])})
+            fence = code = None
+        elif fence is not None:
+            code["lines"].append(line)
+        elif HEADING.match(line):
+            level, title = HEADING.match(line).groups()
+            sections.append({"level": len(level), "title": title, "lines": [], "code_blocks": []})
+            continue
+        current["lines"].append(line)
+
+    if not "".join(sections[0]["lines"]).strip():
+        sections.pop(0)
+
+    parsed = []
+    for section in sections:
+        heading = f"{'#' * section['level']} {section['title']}\n" if section["level"] else ""
+        body = heading + "\n".join(section["lines"]).strip("\n")
+        parsed.append({
+            "title": plain_title(section["title"]),
+            "level": section["level"],
+            "kind": classify(section["title"]) if section["level"] else "section",
+            "body": body,
+            "tokens": estimate_tokens(body),
+            "code_blocks": [{**block, "tokens": estimate_tokens(block["code"])} for block in section["code_blocks"]],
+        })
+
+    for i, section in enumerate(parsed):
+        end = i + 1
+        while end < len(parsed) and section["level"] and parsed[end]["level"] > section["level"]:
+            end += 1
+        section["end"] = end
+        section["subtree_tokens"] = sum(s["tokens"] for s in parsed[i:end])
+
+    title = next((s["title"] for s in parsed if s["level"] == 1), parsed[0]["title"] if parsed else "")
+    return {
+        "parser_version": PARSER_VERSION,
+        "title": title,
+        "tokens": sum(s["tokens"] for s in parsed),
+        "sections": parsed,
+    }
+
+
+def section_text(lesson: dict, index: int) -> str:
+    """A section together with all of its subsections."""
+    sections = lesson["sections"]
+    return "\n\n".join(s["body"] for s in sections[index:sections[index]["end"]])
+
+
+def pieces(lesson: dict, kind: str) -> list[int]:
+    """
+    Indexes of sections of `kind`, innermost first-class pieces only: a
+    "Hands-On Examples" section that holds "Example 1..3" is not itself an example.
+    """
+    sections = lesson["sections"]
+    result = []
+    for i, section in enumerate(sections):
+        if section["kind"] != kind:
+            continue
+        if any(s["kind"] == kind for s in sections[i + 1:section["end"]]):
+            continue
+        result.append(i)
+    return result
+
+
+def outline(lesson: dict) -> list[dict]:
+    """Section list without text: what a tool returns before fetching one piece."""
+    return [
+        {
+            "section": i, "title": s["title"], "level": s["level"], "kind": s["kind"],
+            "tokens": s["subtree_tokens"], "code_blocks": len(s["code_blocks"]),
+        }
+        for i, s in enumerate(lesson["sections"])
+    ]
+
+
+def lesson_piece(lessons: dict[str, dict], piece: str, index: int = 0,
+                 resource: str | None = None, section: int | None = None) -> dict[str, Any]:
+    """
+    One piece of a topic's lessons ({resource key: lesson}):
+    piece="example" / "exercise" → the index-th one across the resources (in order),
+    piece="section" → section number `section` of `resource`, with its subsections,
+    piece="intro" → the same section's own text only, for sections too long to take whole.
+    Raises ValueError for unknown pieces or out-of-range indexes.
+    """
+    if resource is not None and resource not in lessons:
+        raise ValueError(f"Unknown resource {resource}; choose one of {', '.join(lessons)}")
+    keys = [resource] if resource is not None else list(lessons)
+
+    if piece in ("section", "intro"):
+        if resource is None or section is None:
+            raise ValueError(f"piece='{piece}' needs resource and section (see piece='outline')")
+        sections = lessons[resource]["sections"]
+        if not 0 <= section < len(sections):
+            raise ValueError(f"Resource {resource} has sections 0-{len(sections) - 1}")
+        found, total, position = (resource, section), len(sections), section
+    elif piece in ("example", "exercise"):
+        matches = [(key, i) for key in keys for i in pieces(lessons[key], piece)]
+        if not matches:
+            raise ValueError(f"No {piece} in this topic")
+        if not 0 <= index < len(matches):
+            raise ValueError(f"This topic has {len(matches)} {piece}s (index 0-{len(matches) - 1})")
+        found, total, position = matches[index], len(matches), index
+    else:
+        raise ValueError("piece must be one of: outline, section, intro, example, exercise")
+
+    key, i = found
+    entry = lessons[key]["sections"][i]
+    return {
+        "piece": piece,
+        "index": position,
+        "total": total,
+        "resource": key,
+        "section": i,
+        "title": entry["title"],
+        "kind": entry["kind"],
+        "tokens": entry["tokens"] if piece == "intro" else entry["subtree_tokens"],
+        "text": entry["body"] if piece == "intro" else section_text(lessons[key], i),
+    }
+
+
+class LessonStore:
+    """
+    Parsed lessons keyed by the sha256 of their markdown. A lesson is parsed
+    at most once per edit: first from memory, then from its build file, and
+    only then from the markdown (writing the build file for next time).
+    """
+
+    def __init__(self, build_dir: str = LESSON_BUILD_DIR):
+        self.build_dir = build_dir
+        self._lessons: dict[str, dict] = {}
+        self.parses = 0
+
+    def build_path(self, sha256: str) -> str:
+        return os.path.join(self.build_dir, f"{sha256}.json")
+
+    def get(self, url: str) -> dict[str, Any]:
+        handle = resolver.resolve(url)
+        lesson = self._lessons.get(handle.sha256)
+        if lesson is None:
+            lesson = self.load_build(handle.sha256)
+            if lesson is None:
+                lesson = self.build(url)
+            self._lessons[handle.sha256] = lesson
+        return lesson
+
+    def build(self, url: str) -> dict[str, Any]:
+        """Parse `url` and write its build file (atomic); returns the lesson."""
+        handle = resolver.resolve(url)
+        lesson = parse_lesson(resolver.read_text(url))
+        lesson["sha256"] = handle.sha256
+        self.parses += 1
+
+        os.makedirs(self.build_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.build_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(lesson, f, ensure_ascii=False)
+        os.replace(tmp_path, self.build_path(handle.sha256))
+        return lesson
+
+    def load_build(self, sha256: str) -> dict | None:
+        try:
+            with open(self.build_path(sha256), "r", encoding="utf-8") as f:
+                lesson = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return lesson if lesson.get("parser_version") == PARSER_VERSION else None
+
+
+lesson_store = LessonStore()
+
+
+def build_all(urls: list[str], prune: bool = False) -> dict[str, str]:
+    """Build every URL whose content hash has no current build. Returns {url: status}."""
+    statuses = {}
+    keep = set()
+    for url in urls:
+        sha256 = resolver.resolve(url).sha256
+        keep.add(f"{sha256}.json")
+        if lesson_store.load_build(sha256) is not None:
+            statuses[url] = "up to date"
+        else:
+            lesson = lesson_store.build(url)
+            statuses[url] = f"built ({len(lesson['sections'])} sections, {lesson['tokens']:,} tokens)"
+    if prune and os.path.isdir(LESSON_BUILD_DIR):
+        for name in os.listdir(LESSON_BUILD_DIR):
+            if name.endswith(".json") and name not in keep:
+                os.remove(os.path.join(LESSON_BUILD_DIR, name))
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-parse lesson markdown into the structured lesson format")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="build lessons whose content changed")
+    build_parser.add_argument("urls", nargs="*", help="resource URLs or files under CONTENT_ROOT (default: every topic)")
+    build_parser.add_argument("--prune", action="store_true", help="delete builds no listed lesson uses")
+    show_parser = sub.add_parser("show", help="print a lesson outline")
+    show_parser.add_argument("url")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        urls = [url if "://" in url else f"file://{url}" for url in args.urls]
+        if not urls:
+            from main import TOPICS
+            urls = sorted({url for topic in TOPICS.values() for url in topic.get("content_resource_urls", {}).values()})
+        for url, status in build_all(urls, prune=args.prune).items():
+            print(f"📘 {url}: {status}")
+    else:
+        url = args.url if "://" in args.url else f"file://{args.url}"
+        lesson = lesson_store.get(url)
+        print(f"📘 {lesson['title']} ({lesson['tokens']:,} tokens)")
+        for entry in outline(lesson):
+            marker = {"example": "🧪", "exercise": "✏️"}.get(entry["kind"], "  ")
+            print(f"{entry['section']:>4} {marker} {'  ' * max(0, entry['level'] - 1)}{entry['title']}  [{entry['tokens']:,}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,27 @@
 from mcp.server.fastmcp import FastMCP
 from starlette.applications import Starlette
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 from typing import Any
+import asyncio
+import os
+import threading
+import time
 
-# Simple test data
-STUDENTS = {
+from payloads import MCP_COMPACT_MAX_BYTES, MCP_DEFAULT_MAX_BYTES, compact_toc, fit_texts, topic_metadata, truncate_text
+from catalog import CATALOG_DB, load_catalog
+from roster import Roster
+from analytics import ANALYTICS_STALLED_DAYS, ClassAnalytics
+from resources import resolver
+from lessons import lesson_piece
+from content import content_index
+from grading import grade_answers, progress_store, question_banks
+from auth import authorize
+from ratelimit import MCP_HEAVY_CALL_COST, InFlightLimit, buckets, limit_stats, throttle
+
+# Simple test data (STUDENTS holds compact records; reads still return the dicts below, see roster.py)
+STUDENTS = Roster({
     "Mustafa": {
         "name": "Muhammad Mustafa",
         "level": "beginner",
@@ -12,7 +30,7 @@ STUDENTS = {
             "topic_id": "00_prompt_engineering"
         }
     }
-}
+})
 
 COURSES = {
     "AI-101": {
@@ -52,34 +70,95 @@ TOPICS = {
     }
 }
 
-mcp_app: FastMCP = FastMCP(name="STUDY_MODE_TOOLBOX", stateless_http=True,)
+# Rosters and catalogs imported with import_catalog.py extend / override the test data above
+if os.path.exists(CATALOG_DB):
+    load_catalog(CATALOG_DB, STUDENTS, COURSES, TOPICS)
+
+# Courses listing the same modules / resources share one copy of them (see content.py)
+content_index.intern_catalog(COURSES, TOPICS)
+
+# Columnar per-course progress for the co-teacher dashboard (see analytics.py)
+class_analytics = ClassAnalytics(STUDENTS, COURSES, progress_store)
+
+# Optional compressed transfer for large JSON tool responses (clients send Accept-Encoding: gzip).
+# GZipMiddleware skips text/event-stream, so gzip also switches tool calls from SSE to plain JSON responses
+MCP_GZIP = os.getenv("MCP_GZIP", "0") == "1"
+
+mcp_app: FastMCP = FastMCP(name="STUDY_MODE_TOOLBOX", stateless_http=True, json_response=MCP_GZIP)
+
+def load_topic_texts(topic: dict) -> dict[str, str]:
+    result = {}
+    # resolve content resource urls against the content root (see resources.py)
+    for key, url in topic["content_resource_urls"].items():
+        result[key] = resolver.read_text(url)
+    return result
+
+def load_topic_lessons(topic: dict) -> dict[str, dict]:
+    # parsed once per content hash, shared by every topic teaching the same files (see content.py)
+    return content_index.lessons(topic)[1]
+
+def is_first_session(user_id: str, student: dict) -> bool:
+    """No cursor yet, or still on the course's first topic without a checkpoint attempt."""
+    cursor = student.get("active_cursor_position")
+    if not cursor:
+        return True
+    toc = COURSES.get(cursor["course_id"], {}).get("toc") or []
+    if not toc or cursor["topic_id"] != toc[0]["name"]:
+        return False
+    return progress_store.get(user_id, cursor["topic_id"])["attempts"] == 0
 
 @mcp_app.tool(
     name="get_student_profile",
-    description="Get basic student information for teaching"
+    description=(
+        "Get basic student information for teaching. is_first_session is true for a student "
+        "who has not started the course yet (on its first topic, no checkpoint attempts)."
+    )
 )
 def get_student_profile(user_id: str, auth_token: str) -> dict[str, Any]:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id)
     if user_id in STUDENTS:
-        return STUDENTS[user_id]
+        student = STUDENTS[user_id]
+        student["is_first_session"] = is_first_session(user_id, student)
+        return student
     raise ValueError(f"Student {user_id} not found")
 
 @mcp_app.tool(
     name="get_course_basic_info", 
-    description="Get basic course information"
+    description="Get basic course information. Pass the student's user_id (it is charged to their rate limit)."
 )
-def get_course_basic_info(course_id: str, auth_token: str) -> dict[str, Any]:
+def get_course_basic_info(course_id: str, auth_token: str, user_id: str | None = None) -> dict[str, Any]:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id)
     if course_id in COURSES:
         return COURSES[course_id]
     raise ValueError(f"Course {course_id} not found")
 
 @mcp_app.tool(
     name="get_table_of_contents",
-    description="Get course modules list"
+    description=(
+        "Get course modules list. compact=true returns an ordered 'modules' list of [topic_id, description] "
+        "and 'content_hashes' (topic_id -> hash; equal hashes teach the same lessons; null when the topic's "
+        "files cannot be read). "
+        "Pass the student's user_id (it is charged to their rate limit)."
+    )
 )
-def get_table_of_contents(course_id: str, auth_token: str) -> dict[str, Any]:
+def get_table_of_contents(course_id: str, auth_token: str, compact: bool = False,
+                          user_id: str | None = None) -> dict[str, Any]:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id)
     print(f"Getting table of contents for course {course_id}")
     if course_id in COURSES:
         toc = COURSES[course_id]["toc"]
+        if compact:
+            result = compact_toc(course_id, toc, content_index.toc_modules(course_id, toc))
+            # Same hash = same lessons, whichever course or topic id lists them; null when
+            # a topic's files cannot be read, so one bad lesson does not fail the whole TOC
+            result["content_hashes"] = {
+                module["name"]: content_index.content_hash(TOPICS[module["name"]], module["name"])
+                for module in toc if module["name"] in TOPICS
+            }
+            return result
         # Return a flat dictionary with each module as a key-value pair
         result = {"course_id": course_id, "total_modules": len(toc)}
         for i, module in enumerate(toc):
@@ -89,52 +168,182 @@ def get_table_of_contents(course_id: str, auth_token: str) -> dict[str, Any]:
 
 @mcp_app.tool(
     name="get_personalized_content",
-    description="Get content for a topic"
+    description=(
+        "Get content for a topic. max_bytes is a budget for the lesson text, shared across its parts (longer parts "
+        "are truncated with a marker); the JSON keys and quoting around the text are not counted."
+    )
 )
-def get_personalized_content(topic_id: str, user_id: str, auth_token: str) -> dict[str, Any]:
+def get_personalized_content(topic_id: str, user_id: str, auth_token: str, max_bytes: int = MCP_DEFAULT_MAX_BYTES) -> dict[str, Any]:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id, cost=MCP_HEAVY_CALL_COST)
     if topic_id in TOPICS:
-        content_resource_urls = TOPICS[topic_id]["content_resource_urls"]
-        result = {}
-        # load content from resource urls from local filesystem
-        for key, url in content_resource_urls.items():
-            file_path = url.replace("file://", "")
-            result[key] = open(file_path, "r", encoding="utf-8").read()
-        return result
+        return fit_texts(load_topic_texts(TOPICS[topic_id]), max_bytes)
     raise ValueError(f"Topic {topic_id} not found")
 
+@mcp_app.tool(
+    name="get_lesson_piece",
+    description=(
+        "Get just the part of a topic's lesson the current teaching step needs. "
+        "piece='outline' lists each resource's sections (number, title, kind, tokens) without text; "
+        "piece='example' / 'exercise' returns the index-th example or exercise (optionally within one resource); "
+        "piece='section' returns section number `section` of `resource` with its subsections; "
+        "piece='intro' returns only that section's own text, without its subsections. "
+        "max_bytes caps the returned text."
+    )
+)
+def get_lesson_piece(topic_id: str, user_id: str, auth_token: str, piece: str = "outline", index: int = 0,
+                     resource: str | None = None, section: int | None = None,
+                     max_bytes: int = MCP_DEFAULT_MAX_BYTES) -> dict[str, Any]:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id)
+    if topic_id not in TOPICS:
+        raise ValueError(f"Topic {topic_id} not found")
+    content_hash, lessons = content_index.lessons(TOPICS[topic_id])
+    if piece == "outline":
+        return {"topic_id": topic_id, "content_hash": content_hash, "resources": content_index.outline(TOPICS[topic_id])}
+    result = lesson_piece(lessons, piece, index, resource, section)
+    result["topic_id"] = topic_id
+    result["text"] = truncate_text(result["text"], max_bytes)
+    return result
+
+@mcp_app.tool(
+    name="get_checkpoint",
+    description=(
+        "Get a topic's checkpoint questions (id, type, prompt, choices) without answers. "
+        "Ask them, then send the student's answers to grade_checkpoint."
+    )
+)
+def get_checkpoint(topic_id: str, user_id: str, auth_token: str) -> dict[str, Any]:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id)
+    if topic_id not in TOPICS:
+        raise ValueError(f"Topic {topic_id} not found")
+    bank = question_banks.get(topic_id)
+    return {
+        "topic_id": topic_id,
+        "title": bank.title,
+        "pass_ratio": bank.pass_ratio,
+        "questions": [question.public() for question in bank.questions.values()],
+        "progress": progress_store.get(user_id, topic_id),
+    }
+
+@mcp_app.tool(
+    name="grade_checkpoint",
+    description=(
+        "Grade a student's checkpoint answers ({question id: answer text}) on the server and record progress. "
+        "Returns score, total, passed, per-question correct/feedback and the student's progress."
+    )
+)
+def grade_checkpoint(topic_id: str, user_id: str, auth_token: str, answers: dict[str, str]) -> dict[str, Any]:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id)
+    if topic_id not in TOPICS:
+        raise ValueError(f"Topic {topic_id} not found")
+    result = grade_answers(question_banks.get(topic_id), answers)
+    result["progress"] = progress_store.record(user_id, topic_id, result["ratio"], result["passed"])
+    return result
+
+@mcp_app.tool(
+    name="get_class_progress",
+    description=(
+        "Co-teacher view of a course: students at / reaching / passing each topic, mean checkpoint score, "
+        "drop-off to the next topic, a histogram of topics passed, and stalled students (on an unpassed topic "
+        "with neither a checkpoint attempt nor a cursor move, enrolment included, for more than stalled_days). "
+        "Needs the admin role when auth is on."
+    )
+)
+async def get_class_progress(course_id: str, auth_token: str, stalled_days: float = ANALYTICS_STALLED_DAYS,
+                             limit: int = 50) -> dict[str, Any]:
+    authorize(auth_token, role="admin")
+    throttle(auth_token, cost=MCP_HEAVY_CALL_COST)
+    # A rebuild scans the whole roster; keep it off the event loop the other tools share
+    return await asyncio.to_thread(class_analytics.report, course_id, stalled_days, limit)
+
 @mcp_app.tool(
     name="check_topic_completion",
-    description="Check if student completed a topic"
+    description="Check if student completed a topic (passed its checkpoint)"
 )
 def check_topic_completion(topic_id: str, user_id: str, auth_token: str) -> bool:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id)
     if topic_id in TOPICS:
-        return False  # Simple: nobody completed anything yet
+        return progress_store.get(user_id, topic_id)["passed"]
     raise ValueError(f"Topic {topic_id} not found")
 
 @mcp_app.tool(
     name="get_current_topic",
-    description="Get student's current topic"
+    description=(
+        "Get student's current topic. mode='full' returns topic details and all content, "
+        "mode='compact' returns metadata plus content text cut to max_bytes (a default budget applies when 0; "
+        "metadata and JSON framing are not counted), "
+        "mode='metadata' returns metadata only (no content text)."
+    )
 )
-def get_current_topic(user_id: str, auth_token: str) -> dict[str, Any]:
+def get_current_topic(user_id: str, auth_token: str, mode: str = "full", max_bytes: int = MCP_DEFAULT_MAX_BYTES) -> dict[str, Any]:
+    authorize(auth_token, user_id)
+    throttle(auth_token, user_id, cost=1 if mode == "metadata" else MCP_HEAVY_CALL_COST)
     if user_id in STUDENTS:
         student = STUDENTS[user_id]
         topic = TOPICS.get(student["active_cursor_position"]["topic_id"], {})
-        content_resource_urls = topic["content_resource_urls"]
-        result = {}
-        # load content from resource urls from local filesystem
-        for key, url in content_resource_urls.items():
-            file_path = url.replace("file://", "")
-            result[key] = open(file_path, "r", encoding="utf-8").read()
 
+        if mode in ("compact", "metadata"):
+            # Sizes and hash come from the resolved handles (a stat per file); no lesson text is read
+            urls = topic.get("content_resource_urls", {})
+            compact = topic_metadata(topic, {key: resolver.resolve(url).size for key, url in urls.items()})
+            compact["content_hash"] = content_index.topic_hash(topic)
+            if mode == "compact":
+                compact["topic_content_data"] = fit_texts(load_topic_texts(topic), max_bytes or MCP_COMPACT_MAX_BYTES)
+            return compact
+
+        result = load_topic_texts(topic)
         return {
             "topic_id": student["active_cursor_position"]["topic_id"],
             "topic_details": topic,
-            "topic_content_data": result
+            "topic_content_data": fit_texts(result, max_bytes)
         }
 
+_ready = threading.Event()
+
+def warm_up():
+    """Load and parse every topic's resources (and compile its question bank) once so the first tool call is warm and missing files show up at boot."""
+    started = time.perf_counter()
+    # One load per unique content, however many courses / topic ids list it
+    for content_hash, topic_ids in content_index.unique_topics(TOPICS).items():
+        try:
+            load_topic_texts(TOPICS[topic_ids[0]])
+            content_index.outline(TOPICS[topic_ids[0]])
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Warm-up could not load resources for {', '.join(topic_ids)}: {e}")
+    for topic_id in question_banks.topic_ids():
+        try:
+            question_banks.get(topic_id)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Warm-up could not compile the question bank for {topic_id}: {e}")
+    _ready.set()
+    print(f"🔥 MCP warm-up finished in {time.perf_counter() - started:.2f}s: {content_index.stats(TOPICS)}")
+
+@mcp_app.custom_route("/ready", methods=["GET"])
+async def ready(request: Request) -> JSONResponse:
+    # Readiness probe for the load balancer: 503 until warm-up has finished
+    if _ready.is_set():
+        return JSONResponse({"status": "ready"})
+    return JSONResponse({"status": "warming_up"}, status_code=503)
+
+@mcp_app.custom_route("/metrics/limits", methods=["GET"])
+async def limits(request: Request) -> JSONResponse:
+    return JSONResponse(limit_stats.snapshot(buckets))
+
 app: Starlette = mcp_app.streamable_http_app()
 
-import uvicorn
+if MCP_GZIP:
+    app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("MCP_GZIP_MIN_BYTES", "1024")))
+
+# Outermost: shed MCP requests over this worker's in-flight cap before any other work
+app.add_middleware(InFlightLimit)
+
+threading.Thread(target=warm_up, name="mcp-warm-up", daemon=True).start()
 
 if __name__ == "__main__":
+    # Only needed when run as a script; the ASGI app itself never imports uvicorn
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
@@ -0,0 +1,68 @@
+import os
+from typing import Any
+
+# Default per-call budget for tool payloads (0 = unlimited); tools also take max_bytes
+MCP_DEFAULT_MAX_BYTES = int(os.getenv("MCP_DEFAULT_MAX_BYTES", "0"))
+# Budget for get_current_topic(mode="compact") when the call does not give one: compact is never unlimited
+MCP_COMPACT_MAX_BYTES = int(os.getenv("MCP_COMPACT_MAX_BYTES", "6000"))
+
+TRUNCATION_MARKER = "\n\n[...truncated {omitted} bytes; ask for a smaller piece or a larger max_bytes]"
+
+
+def truncate_text(text: str, max_bytes: int) -> str:
+    """Cut text to at most max_bytes of UTF-8 (marker included), on a character boundary."""
+    data = text.encode("utf-8")
+    if max_bytes <= 0 or len(data) <= max_bytes:
+        return text
+    marker_room = len(TRUNCATION_MARKER.format(omitted=len(data)).encode("utf-8"))
+    if marker_room >= max_bytes:
+        # No room for the marker: the budget is a hard cap, so return the bare cut
+        return data[:max_bytes].decode("utf-8", errors="ignore")
+    keep = max_bytes - marker_room
+    kept = data[:keep].decode("utf-8", errors="ignore")
+    omitted = len(data) - len(kept.encode("utf-8"))
+    return kept + TRUNCATION_MARKER.format(omitted=omitted)
+
+
+def fit_texts(texts: dict[str, str], max_bytes: int) -> dict[str, str]:
+    """
+    Share a byte budget across several texts. Small texts keep their full
+    size and the rest of the budget is split evenly among the larger ones.
+    """
+    if max_bytes <= 0:
+        return dict(texts)
+    sizes = {key: len(text.encode("utf-8")) for key, text in texts.items()}
+    remaining = max_bytes
+    budgets = {}
+    pending = sorted(sizes, key=sizes.get)
+    while pending:
+        share = remaining // len(pending)
+        key = pending[0]
+        if sizes[key] <= share:
+            budgets[key] = sizes[key]
+            remaining -= sizes[key]
+            pending.pop(0)
+        else:
+            for key in pending:
+                budgets[key] = share
+            break
+    return {key: truncate_text(text, budgets[key]) for key, text in texts.items()}
+
+
+def compact_toc(course_id: str, toc: list[dict], modules: list | None = None) -> dict[str, Any]:
+    """TOC as an ordered list of [topic_id, description] pairs instead of module_{i} keys."""
+    return {
+        "course_id": course_id,
+        "total_modules": len(toc),
+        "modules": modules if modules is not None else [[module["name"], module["description"]] for module in toc],
+    }
+
+
+def topic_metadata(topic: dict, resource_sizes: dict[str, int]) -> dict[str, Any]:
+    """Everything about a topic except resource text: ids, title, summary, resource sizes."""
+    return {
+        "topic_id": topic.get("topic_id"),
+        "title": topic.get("title"),
+        "summary": topic.get("content"),
+        "resources": {key: {"bytes": size} for key, size in resource_sizes.items()},
+    }
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from starlette.responses import JSONResponse
+
+# Per-student token bucket: sustained calls per second and burst size (0 rate = unlimited)
+MCP_USER_RATE = float(os.getenv("MCP_USER_RATE", "2"))
+MCP_USER_BURST = float(os.getenv("MCP_USER_BURST", "20"))
+# Bucket cost of calls that return whole lesson files
+MCP_HEAVY_CALL_COST = float(os.getenv("MCP_HEAVY_CALL_COST", "3"))
+# Bucket state: "memory" (one worker) or redis://host:port/db shared by every worker (`pip install redis`)
+MCP_RATE_STORE = os.getenv("MCP_RATE_STORE", "memory")
+# MCP requests one worker serves at once; tool calls over the cap are rejected at once (0 = no cap)
+MCP_MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "64"))
+MCP_OVERLOAD_RETRY_SECONDS = float(os.getenv("MCP_OVERLOAD_RETRY_SECONDS", "1"))
+
+
+class RateLimited(ValueError):
+    """
+    A call rejected by a limit. The message is JSON so the agent can read
+    `retry_after_seconds` from the tool error and wait instead of looping.
+    """
+
+    error = "rate_limited"
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = round(retry_after, 2)
+        super().__init__(json.dumps({
+            "error": self.error,
+            "scope": scope,
+            "retry_after_seconds": self.retry_after,
+            "message": f"Too many tool calls; wait {self.retry_after:g}s before calling again. "
+                       "Answer from what you already have if you can.",
+        }))
+
+
+class Overloaded(RateLimited):
+    """The worker is at its in-flight cap; same JSON, so the agent waits the same way."""
+
+    error = "overloaded"
+
+
+class MemoryBuckets:
+    """Token buckets in this process: {key: (tokens, updated)}, idle full buckets pruned."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key: str, cost: float) -> float:
+        """0 if `cost` tokens were taken, else seconds until they will be available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (cost - tokens) / self.rate
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now: float):
+        refill = self.burst / self.rate
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated >= refill:
+                del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# KEYS[1] bucket hash; ARGV rate, burst, now, cost → {taken (0/1), wait seconds}
+_TAKE_SCRIPT = """
+local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """The same buckets in Redis (one atomic script per call) so every worker shares each student's limit."""
+
+    def __init__(self, url: str, rate: float, burst: float):
+        import redis  # optional dependency, only needed for redis:// stores
+
+        self.rate = rate
+        self.burst = burst
+        self._redis = redis.Redis.from_url(url, decode_responses=True, socket_timeout=0.05)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str, cost: float) -> float:
+        try:
+            return float(self._take(keys=[f"mcp:bucket:{key}"], args=[self.rate, self.burst, time.time(), cost]))
+        except Exception as e:
+            # Fail open: a slow or missing Redis must not take the tools down with it
+            print(f"⚠️ Rate store unavailable, call not limited: {e}")
+            return 0.0
+
+    def __len__(self) -> int:
+        return -1  # not tracked locally
+
+
+class LimitStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected_user = 0
+        self.rejected_overload = 0
+        self.in_flight = 0
+        self.max_in_flight_seen = 0
+
+    def snapshot(self, buckets) -> dict:
+        return {
+            "user_rate": MCP_USER_RATE,
+            "user_burst": MCP_USER_BURST,
+            "store": "memory" if isinstance(buckets, MemoryBuckets) else "redis",
+            "tracked_students": len(buckets) if buckets is not None else 0,
+            "max_in_flight": MCP_MAX_IN_FLIGHT,
+            "in_flight": self.in_flight,
+            "max_in_flight_seen": self.max_in_flight_seen,
+            "admitted": self.admitted,
+            "rejected_user": self.rejected_user,
+            "rejected_overload": self.rejected_overload,
+        }
+
+
+limit_stats = LimitStats()
+
+if MCP_USER_RATE <= 0:
+    buckets = None
+elif MCP_RATE_STORE.startswith(("redis://", "rediss://")):
+    buckets = RedisBuckets(MCP_RATE_STORE, MCP_USER_RATE, MCP_USER_BURST)
+else:
+    buckets = MemoryBuckets(MCP_USER_RATE, MCP_USER_BURST)
+
+
+def throttle(auth_token: str, user_id: str | None = None, cost: float = 1):
+    """
+    Called first by every tool (after authorize): takes `cost` from the
+    student's bucket or raises RateLimited. Calls without a user_id (clients
+    that do not pass one to the course tools) are charged to their auth
+    token, which a client may share between all of its students.
+    """
+    if buckets is None:
+        return
+    key = user_id or "token:" + hashlib.sha256(str(auth_token).encode()).hexdigest()[:16]
+    wait = buckets.take(key, cost)
+    if wait > 0:
+        limit_stats.rejected_user += 1
+        raise RateLimited("student", wait)
+    limit_stats.admitted += 1
+
+
+def _replay(messages: list, receive):
+    async def replayed():
+        return messages.pop(0) if messages else await receive()
+    return replayed
+
+
+def tool_error_response(request_id, error: RateLimited) -> JSONResponse:
+    """A JSON-RPC tools/call result with isError, as FastMCP sends for a tool that raised."""
+    return JSONResponse({
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "result": {"content": [{"type": "text", "text": str(error)}], "isError": True},
+    })
+
+
+async def _read_body(receive) -> tuple[bytes, list]:
+    """The request body and the ASGI messages it came in, so they can be replayed to the app."""
+    body, messages = b"", []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return body, messages
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body, messages
+
+
+def _tool_call_id(body: bytes):
+    """The JSON-RPC id of a single tools/call request, else None."""
+    try:
+        message = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(message, dict) and message.get("method") == "tools/call":
+        return message.get("id")
+    return None
+
+
+class InFlightLimit:
+    """
+    ASGI middleware capping concurrent POSTs (calls) under `path` for this worker.
+    A tool call over the cap is answered immediately instead of queueing, so
+    one runaway client cannot push every other student's calls to the back
+    of a long line. The answer is a tool error carrying retry_after_seconds
+    (like RateLimited), not an HTTP 503: the MCP client treats a 503 as a
+    transport failure and tears down its whole session, cancelling the
+    other calls in flight on it. Other MCP traffic (initialize, listings,
+    notifications) is small and always let through.
+    """
+
+    def __init__(self, app, max_in_flight: int = MCP_MAX_IN_FLIGHT, path: str = "/mcp",
+                 retry_after: float = MCP_OVERLOAD_RETRY_SECONDS):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.path = path
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        # Only POSTs carry calls; a client's GET event stream stays open for its whole session
+        if (scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path)
+                or self.max_in_flight <= 0):
+            await self.app(scope, receive, send)
+            return
+        if limit_stats.in_flight >= self.max_in_flight:
+            body, messages = await _read_body(receive)
+            request_id = _tool_call_id(body)
+            if request_id is not None:
+                limit_stats.rejected_overload += 1
+                await tool_error_response(request_id, Overloaded("server", self.retry_after))(scope, receive, send)
+                return
+            receive = _replay(messages, receive)
+        limit_stats.in_flight += 1
+        limit_stats.max_in_flight_seen = max(limit_stats.max_in_flight_seen, limit_stats.in_flight)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit_stats.in_flight -= 1
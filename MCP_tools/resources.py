@@ -0,0 +1,169 @@
+import hashlib
+import json
+import mmap
+import os
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# Lesson files are resolved against this root, never the process's working directory
+CONTENT_ROOT = os.path.abspath(os.getenv("CONTENT_ROOT", os.path.dirname(os.path.abspath(__file__))))
+# Directory stand-in for an object store: store://<bucket>/<key> -> CONTENT_STORE_DIR/<bucket>/<key>
+CONTENT_STORE_DIR = os.getenv("CONTENT_STORE_DIR", os.path.join(CONTENT_ROOT, "content_store"))
+# Optional JSON file {url: sha256} pinning each resource to a content hash
+RESOURCE_PINS = os.getenv("RESOURCE_PINS", os.path.join(CONTENT_ROOT, "resource_pins.json"))
+# Files at least this large are read through mmap instead of a buffered read
+MMAP_THRESHOLD = int(os.getenv("MMAP_THRESHOLD", str(1024 * 1024)))
+TEXT_CACHE_ENTRIES = int(os.getenv("RESOURCE_TEXT_CACHE", "256"))
+
+
+class ResourceError(ValueError):
+    """A resource URL cannot be resolved, or its content does not match its pin."""
+
+
+class ResourceHandle:
+    """A resolved resource: where it lives, its size/mtime and its content hash."""
+
+    __slots__ = ("url", "path", "size", "mtime", "sha256")
+
+    def __init__(self, url: str, path: str):
+        self.url = url
+        self.path = path
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        self.sha256 = _hash_file(path, self.size)
+
+    def is_stale(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        return stat.st_mtime_ns != self.mtime or stat.st_size != self.size
+
+
+class FileBackend:
+    """file://<relative path> under a registered content root."""
+
+    def __init__(self, root: str = CONTENT_ROOT):
+        self.root = os.path.abspath(root)
+
+    def locate(self, parsed) -> str:
+        relative = (parsed.netloc + parsed.path).lstrip("/")
+        path = os.path.abspath(os.path.join(self.root, relative))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ResourceError(f"{relative} escapes the content root")
+        return path
+
+
+class DirectoryObjectStore:
+    """store://<bucket>/<key> backed by a local directory (stand-in for S3/GCS)."""
+
+    def __init__(self, root: str = CONTENT_STORE_DIR):
+        self.root = os.path.abspath(root)
+
+    def locate(self, parsed) -> str:
+        bucket, key = parsed.netloc, parsed.path.lstrip("/")
+        if not bucket or not key:
+            raise ResourceError("store:// URLs need a bucket and a key")
+        path = os.path.abspath(os.path.join(self.root, bucket, key))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ResourceError(f"{bucket}/{key} escapes the object store")
+        return path
+
+
+class ResourceResolver:
+    """
+    Resolves content resource URLs through pluggable backends (by URL scheme),
+    caches resolved handles (revalidated by mtime/size), caches decoded text
+    by content hash, and enforces content-hash pins when they are configured.
+    """
+
+    def __init__(self, pins_path: str | None = RESOURCE_PINS):
+        self.backends = {}
+        self._handles: dict[str, ResourceHandle] = {}
+        self._texts: OrderedDict[str, str] = OrderedDict()
+        self.pins: dict[str, str] = {}
+        self.pins_path = pins_path
+        if pins_path and os.path.exists(pins_path):
+            with open(pins_path, "r", encoding="utf-8") as f:
+                self.pins = json.load(f)
+
+    def register(self, scheme: str, backend):
+        self.backends[scheme] = backend
+
+    def resolve(self, url: str) -> ResourceHandle:
+        handle = self._handles.get(url)
+        if handle is not None and not handle.is_stale():
+            return handle
+
+        parsed = urlparse(url)
+        backend = self.backends.get(parsed.scheme)
+        if backend is None:
+            raise ResourceError(f"No backend registered for {parsed.scheme or 'bare'} URL {url}")
+        path = backend.locate(parsed)
+        if not os.path.isfile(path):
+            raise ResourceError(f"Resource {url} not found at {path}")
+
+        handle = ResourceHandle(url, path)
+        pinned = self.pins.get(url)
+        if pinned and pinned != handle.sha256:
+            raise ResourceError(f"Resource {url} changed: sha256 {handle.sha256[:12]} != pinned {pinned[:12]}")
+        self._handles[url] = handle
+        return handle
+
+    def read_text(self, url: str) -> str:
+        handle = self.resolve(url)
+        text = self._texts.get(handle.sha256)
+        if text is None:
+            text = _read_text(handle.path, handle.size)
+            self._texts[handle.sha256] = text
+            while len(self._texts) > TEXT_CACHE_ENTRIES:
+                self._texts.popitem(last=False)
+        else:
+            self._texts.move_to_end(handle.sha256)
+        return text
+
+    def pin_all(self, urls) -> dict[str, str]:
+        """Pin every URL to its current content hash and save the pins file."""
+        for url in urls:
+            self.pins.pop(url, None)
+            self._handles.pop(url, None)
+            self.pins[url] = self.resolve(url).sha256
+        if self.pins_path:
+            with open(self.pins_path, "w", encoding="utf-8") as f:
+                json.dump(self.pins, f, indent=2, sort_keys=True)
+        return self.pins
+
+
+def _read_text(path: str, size: int) -> str:
+    with open(path, "rb") as f:
+        if size >= MMAP_THRESHOLD:
+            # Decode straight from the mapped pages: slicing the map would copy the whole file into bytes first
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                return str(view, "utf-8")
+        return f.read().decode("utf-8")
+
+
+def _hash_file(path: str, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+resolver = ResourceResolver()
+resolver.register("file", FileBackend())
+resolver.register("store", DirectoryObjectStore())
+
+
+if __name__ == "__main__":
+    # Pin every topic resource to its current content hash: python resources.py
+    from main import TOPICS
+    urls = [url for topic in TOPICS.values() for url in topic.get("content_resource_urls", {}).values()]
+    for url, sha in sorted(resolver.pin_all(urls).items()):
+        print(f"📌 {url} -> {sha[:16]}")
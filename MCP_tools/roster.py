@@ -0,0 +1,118 @@
+import sys
+import time
+from collections.abc import MutableMapping
+from typing import Any
+
+from catalog import LEVELS
+
+NO_ID = -1
+
+
+class Interner:
+    """Small-int codes for repeated strings (levels, course ids, topic ids); each string is held once."""
+
+    __slots__ = ("values", "_codes")
+
+    def __init__(self, values=()):
+        self.values: list[str] = []
+        self._codes: dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def code(self, value: str | None) -> int:
+        if value is None:
+            return NO_ID
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return code
+
+    def find(self, value: str) -> int:
+        """Code of an already interned value, or NO_ID (never adds)."""
+        return self._codes.get(value, NO_ID)
+
+    def value(self, code: int) -> str | None:
+        return None if code == NO_ID else self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class StudentRecord:
+    """
+    One student in five slots: the name, interned level, course and topic
+    codes, and `since`, when the cursor was last moved (or first set).
+    """
+
+    __slots__ = ("name", "level", "course", "topic", "since")
+
+    def __init__(self, name: str, level: int, course: int = NO_ID, topic: int = NO_ID, since: float = 0.0):
+        self.name = name
+        self.level = level
+        self.course = course
+        self.topic = topic
+        self.since = since
+
+
+class Roster(MutableMapping):
+    """
+    STUDENTS as compact records. Reads and writes use the same dicts as
+    before ({"name", "level", "active_cursor_position": {"course_id",
+    "topic_id"}}), built on demand, so tools and the catalog loader are
+    unchanged; only the resident form is smaller. Each write that moves the
+    cursor stamps the record's `since`.
+    """
+
+    def __init__(self, students: dict[str, dict] | None = None):
+        self._records: dict[str, StudentRecord] = {}
+        self.levels = Interner(LEVELS)
+        self.courses = Interner()
+        self.topics = Interner()
+        if students:
+            self.update(students)
+
+    def __getitem__(self, user_id: str) -> dict[str, Any]:
+        return self.to_dict(self._records[user_id])
+
+    def __setitem__(self, user_id: str, student: dict[str, Any]):
+        cursor = student.get("active_cursor_position") or {}
+        course = self.courses.code(cursor.get("course_id"))
+        topic = self.topics.code(cursor.get("topic_id"))
+        # Rewriting the same cursor (a name or level change) keeps its time; analytics measures idleness from it
+        previous = self._records.get(user_id)
+        if previous is not None and (previous.course, previous.topic) == (course, topic):
+            since = previous.since
+        else:
+            since = time.time()
+        self._records[sys.intern(user_id)] = StudentRecord(
+            student["name"], self.levels.code(student["level"]), course, topic, since,
+        )
+
+    def __delitem__(self, user_id: str):
+        del self._records[user_id]
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, user_id: str) -> StudentRecord:
+        """The raw record (codes, not strings), for scans that should not build dicts."""
+        return self._records[user_id]
+
+    def records(self):
+        return self._records.items()
+
+    def to_dict(self, record: StudentRecord) -> dict[str, Any]:
+        student = {"name": record.name, "level": self.levels.values[record.level]}
+        if record.course != NO_ID and record.topic != NO_ID:
+            student["active_cursor_position"] = {
+                "course_id": self.courses.values[record.course],
+                "topic_id": self.topics.values[record.topic],
+            }
+        return student
@@ -0,0 +1,47 @@
+from mcp.server.fastmcp import FastMCP
+from starlette.applications import Starlette
+import asyncio
+import os
+
+# Local stand-in for the remote Tavily MCP server, for offline testing of the
+# search guard (timeouts, circuit breaker, result cache) in the tutor UI.
+#
+#   STAND_IN_DELAY=10 uv run search_stand_in.py        -> every search is slow
+#   STAND_IN_FAIL=1   uv run search_stand_in.py        -> every search errors
+#
+# Point the tutor at it with TAVILY_MCP_URL=http://localhost:8002/mcp
+STAND_IN_DELAY = float(os.getenv("STAND_IN_DELAY", "0"))
+STAND_IN_FAIL = os.getenv("STAND_IN_FAIL", "0") == "1"
+
+search_app: FastMCP = FastMCP(name="TAVILY_STAND_IN", stateless_http=True,)
+
+calls = {"count": 0}
+
+@search_app.tool(
+    name="tavily-search",
+    description="Search the web (offline stand-in with canned results)"
+)
+async def tavily_search(query: str, max_results: int = 3) -> dict:
+    calls["count"] += 1
+    print(f"Stand-in search #{calls['count']}: {query!r}")
+    if STAND_IN_DELAY:
+        await asyncio.sleep(STAND_IN_DELAY)
+    if STAND_IN_FAIL:
+        raise RuntimeError("stand-in configured to fail")
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"Result {i + 1} for {query}",
+                "url": f"https://example.com/{i + 1}",
+                "content": f"Canned search result {i + 1} about {query}.",
+            }
+            for i in range(max_results)
+        ],
+    }
+
+app: Starlette = search_app.streamable_http_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("search_stand_in:app", host="0.0.0.0", port=8002)
@@ -0,0 +1,45 @@
+from analytics import Cohort
+from roster import Roster
+
+DAY = 86400
+TOC = [{"name": "intro", "description": "Intro"}, {"name": "framework", "description": "Framework"}]
+
+
+def enrolled(topic: str = "intro") -> dict:
+    return {"name": "Ada", "level": "beginner",
+            "active_cursor_position": {"course_id": "COURSE", "topic_id": topic}}
+
+
+def report(roster: Roster, rows: list[tuple], now: float, stalled_days: float = 7) -> dict:
+    return Cohort.build("COURSE", TOC, roster, rows).report(stalled_days, now=now)
+
+
+def test_new_student_without_attempts_is_not_stalled_until_stalled_days_pass():
+    roster = Roster({"ada": enrolled()})
+    since = roster.record("ada").since
+    assert report(roster, [], since + 1 * DAY)["stalled_total"] == 0
+    late = report(roster, [], since + 8 * DAY)
+    assert late["stalled_total"] == 1
+    assert late["stalled"][0]["days_idle"] == 8.0
+
+
+def test_idle_time_runs_from_the_latest_attempt_or_cursor_move():
+    roster = Roster({"ada": enrolled()})
+    since = roster.record("ada").since
+    # Failed attempt on day 5: idle counts from there, not from enrolment
+    rows = [("ada", "intro", 0, 0.4, since + 5 * DAY)]
+    assert report(roster, rows, since + 10 * DAY)["stalled_total"] == 0
+    assert report(roster, rows, since + 13 * DAY)["stalled"][0]["days_idle"] == 8.0
+
+
+def test_cursor_move_resets_idle_time_but_a_rename_does_not():
+    roster = Roster({"ada": enrolled()})
+    since = roster.record("ada").since
+    roster["ada"] = {**enrolled(), "name": "Ada L."}
+    assert roster.record("ada").since == since
+    roster["ada"] = enrolled("framework")
+    assert roster.record("ada").since >= since
+    # Moved on day 6 (of a day-10 report): 4 days idle on the new topic
+    roster.record("ada").since = since + 6 * DAY
+    assert report(roster, [], since + 10 * DAY)["stalled_total"] == 0
+    assert report(roster, [], since + 14 * DAY)["stalled_total"] == 1
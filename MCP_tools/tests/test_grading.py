@@ -0,0 +1,28 @@
+from grading import Question
+
+TEMPERATURE = Question({
+    "id": "creative_temperature", "type": "choice", "prompt": "Which range?",
+    "choices": {"0": "0 - 0.3", "1": "0.4 - 0.7", "2": "0.8 - 1.0"}, "answer": "2",
+})
+TECHNIQUE = Question({
+    "id": "zero_shot", "type": "choice", "prompt": "Which technique?",
+    "choices": {"a": "Few-shot prompting", "b": "Zero-shot prompting", "c": "One-shot prompting"}, "answer": "b",
+})
+
+
+def test_choice_keys_are_read_from_markers_not_decimals():
+    assert TEMPERATURE.grade("2") == (True, "chose 2")
+    assert TEMPERATURE.grade("(2)") == (True, "chose 2")
+    # "0." is the start of a number here, not choice "0"
+    assert TEMPERATURE.grade("0.8-1.0") == (True, "chose 2")
+    assert TECHNIQUE.grade("b. Zero-shot prompting") == (True, "chose b")
+    assert TECHNIQUE.grade("answer: b") == (True, "chose b")
+
+
+def test_written_out_choices_match_whole_words_only():
+    assert TECHNIQUE.grade("a zero-shot prompt") == (True, "chose b")
+    assert TECHNIQUE.grade("zero-shot") == (True, "chose b")
+    assert TECHNIQUE.grade("the zero-shot prompting approach") == (True, "chose b")
+    # One-letter and part-word fragments are not guesses at a choice
+    assert TECHNIQUE.grade("o")[1].startswith("not one of the choices")
+    assert TECHNIQUE.grade("zero")[1].startswith("not one of the choices")
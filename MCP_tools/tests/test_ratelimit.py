@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from ratelimit import InFlightLimit, limit_stats
+
+
+class BlockingApp:
+    """Downstream MCP app: holds every request until `release` is set, then answers 200."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.bodies = []
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        self.bodies.append(message.get("body", b""))
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def request(app, method: str = "POST", body: dict | None = None) -> tuple[int, bytes]:
+    scope = {"type": "http", "method": method, "path": "/mcp", "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(body or {}).encode(), "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    return status, b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+
+
+def tool_call(request_id: int) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": {"name": "x", "arguments": {}}}
+
+
+def test_tool_call_over_the_cap_is_a_tool_error_not_a_503():
+    async def scenario():
+        inner = BlockingApp()
+        app = InFlightLimit(inner, max_in_flight=1, retry_after=1.5)
+        first = asyncio.create_task(request(app, body=tool_call(1)))
+        await asyncio.sleep(0)
+        status, body = await request(app, body=tool_call(2))
+        inner.release.set()
+        assert (await first)[0] == 200
+        return status, json.loads(body)
+
+    rejected_before = limit_stats.rejected_overload
+    status, reply = asyncio.run(scenario())
+    # The MCP client tears its whole session down on an HTTP error status
+    assert status == 200
+    assert reply["id"] == 2 and reply["result"]["isError"]
+    error = json.loads(reply["result"]["content"][0]["text"])
+    assert error["error"] == "overloaded" and error["retry_after_seconds"] == 1.5
+    assert limit_stats.rejected_overload == rejected_before + 1
+
+
+def test_other_requests_over_the_cap_reach_the_app_with_their_body():
+    async def scenario():
+        inner = BlockingApp()
+        app = InFlightLimit(inner, max_in_flight=1)
+        first = asyncio.create_task(request(app, body=tool_call(1)))
+        await asyncio.sleep(0)
+        listing = asyncio.create_task(request(app, body={"jsonrpc": "2.0", "id": 3, "method": "tools/list"}))
+        await asyncio.sleep(0)
+        inner.release.set()
+        await first
+        return await listing, inner.bodies
+
+    (status, _), bodies = asyncio.run(scenario())
+    assert status == 200
+    assert json.loads(bodies[1])["method"] == "tools/list"
+
+
+def test_open_event_streams_do_not_take_a_slot():
+    async def scenario():
+        inner = BlockingApp()
+        app = InFlightLimit(inner, max_in_flight=1)
+        stream = asyncio.create_task(request(app, method="GET"))
+        await asyncio.sleep(0)
+        call = asyncio.create_task(request(app, body=tool_call(1)))
+        await asyncio.sleep(0)
+        inner.release.set()
+        await stream
+        return await call
+
+    status, body = asyncio.run(scenario())
+    assert status == 200 and body == b"{}"
@@ -0,0 +1,117 @@
+# delivery.py
+import asyncio
+import os
+import weakref
+from collections import deque
+
+# Frames buffered per streamed message before the overflow policy applies
+STREAM_BUFFER_FRAMES = int(os.getenv("STREAM_BUFFER_FRAMES", "64"))
+# coalesce: merge overflowing tokens into the newest frame (nothing lost, fewer frames)
+# drop:     discard overflowing tokens (the final message update still carries the full text)
+STREAM_BUFFER_POLICY = os.getenv("STREAM_BUFFER_POLICY", "coalesce")
+# How long a finished stream may keep sending buffered frames before the final update replaces them
+STREAM_DRAIN_SECONDS = float(os.getenv("STREAM_DRAIN_SECONDS", "1"))
+
+
+class DeliveryStats:
+    """Process-wide counters plus the live buffer depth of every open stream."""
+
+    def __init__(self):
+        self.streams = 0
+        self.frames_in = 0
+        self.frames_sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.discarded_at_close = 0
+        self.max_depth = 0
+        self._open = weakref.WeakSet()
+
+    def snapshot(self) -> dict:
+        depths = {stream.session_id: len(stream) for stream in list(self._open)}
+        return {
+            "policy": STREAM_BUFFER_POLICY,
+            "buffer_frames": STREAM_BUFFER_FRAMES,
+            "open_streams": len(depths),
+            "depth_by_session": depths,
+            "max_depth": self.max_depth,
+            "streams": self.streams,
+            "frames_in": self.frames_in,
+            "frames_sent": self.frames_sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "discarded_at_close": self.discarded_at_close,
+        }
+
+
+delivery_stats = DeliveryStats()
+
+
+class StreamDelivery:
+    """
+    Bounded buffer between reading the model stream and sending tokens to the
+    browser. `put` never waits, so the model stream (and its limiter slot) is
+    drained at full speed; a background sender delivers frames as fast as the
+    client's websocket allows. When the buffer is full the policy coalesces
+    or drops frames. The caller always finishes with a full message update,
+    so the final text reaches the student either way.
+    """
+
+    def __init__(self, msg, session_id: str, max_frames: int = STREAM_BUFFER_FRAMES,
+                 policy: str = STREAM_BUFFER_POLICY):
+        if policy not in ("coalesce", "drop"):
+            raise ValueError(f"STREAM_BUFFER_POLICY must be coalesce or drop, not {policy!r}")
+        self.msg = msg
+        self.session_id = session_id
+        self.max_frames = max(1, max_frames)
+        self.policy = policy
+        self._frames: deque[str] = deque()
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._sender = asyncio.get_running_loop().create_task(self._send())
+        delivery_stats.streams += 1
+        delivery_stats._open.add(self)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def put(self, token: str):
+        delivery_stats.frames_in += 1
+        if len(self._frames) >= self.max_frames:
+            if self.policy == "coalesce":
+                self._frames[-1] += token
+                delivery_stats.coalesced += 1
+            else:
+                delivery_stats.dropped += 1
+            return
+        self._frames.append(token)
+        delivery_stats.max_depth = max(delivery_stats.max_depth, len(self._frames))
+        self._wake.set()
+
+    async def close(self, drain_seconds: float = STREAM_DRAIN_SECONDS):
+        """Let the sender catch up for up to `drain_seconds`, then stop it and discard the rest."""
+        self._closing = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._sender), drain_seconds)
+        except TimeoutError:
+            pass
+        except Exception as e:
+            # The sender died (e.g. the websocket closed); the caller's final update and ledger write still run
+            print(f"⚠️ Token stream for {self.session_id} stopped early: {e!r}")
+        finally:
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+            delivery_stats.discarded_at_close += len(self._frames)
+            self._frames.clear()
+            delivery_stats._open.discard(self)
+
+    async def _send(self):
+        while True:
+            if not self._frames:
+                if self._closing:
+                    return
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            await self.msg.stream_token(self._frames.popleft())
+            delivery_stats.frames_sent += 1
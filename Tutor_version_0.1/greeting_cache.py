@@ -0,0 +1,118 @@
+# greeting_cache.py
+import json
+import os
+import re
+import time
+
+# Where rendered greeting templates are kept between restarts
+GREETING_CACHE_PATH = os.getenv("GREETING_CACHE_PATH", "greeting_cache.json")
+# Templates older than this are re-generated by the agent (prompt / course changes)
+GREETING_CACHE_TTL = float(os.getenv("GREETING_CACHE_TTL", str(24 * 3600)))
+
+NAME_SLOT = "<<student_name>>"
+
+
+class GreetingCache:
+    """
+    Stores greeting templates keyed by (course_id, topic_id, level).
+    A template is a greeting the agent already produced for one student,
+    with that student's name replaced by a slot so it can be re-rendered
+    for any other student at the same place in the course.
+    """
+
+    def __init__(self, path: str | None = GREETING_CACHE_PATH, ttl_seconds: float = GREETING_CACHE_TTL):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._templates: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def key(course_id: str, topic_id: str, level: str) -> str:
+        return f"{course_id}|{topic_id}|{level}"
+
+    def render(self, course_id: str, topic_id: str, level: str, student_name: str) -> str | None:
+        """Return the cached greeting for this student, or None on a miss."""
+        entry = self._templates.get(self.key(course_id, topic_id, level))
+        if entry is None or time.time() - entry["created_at"] > self.ttl_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["template"].replace(NAME_SLOT, first_name(student_name))
+
+    def store(self, course_id: str, topic_id: str, level: str, greeting: str, student_name: str,
+              aliases: tuple[str, ...] = ()) -> bool:
+        """
+        Turn an agent greeting into a template and keep it. `aliases` are
+        other names the agent may have used for the student (the name its
+        prompt was given). Returns False (and stores nothing) if no name is
+        found in the greeting, because the result could not be personalized.
+        """
+        template = slot_name(greeting, student_name, aliases)
+        if template == greeting:
+            return False
+
+        self._templates[self.key(course_id, topic_id, level)] = {
+            "template": template,
+            "created_at": time.time(),
+        }
+        self._save()
+        return True
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._templates = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load greeting cache {self.path}: {e}")
+            self._templates = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._templates, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save greeting cache {self.path}: {e}")
+
+
+def first_name(full_name: str) -> str:
+    return full_name.split()[0] if full_name and full_name.split() else full_name
+
+
+def slot_name(text: str, student_name: str, aliases: tuple[str, ...] = ()) -> str:
+    """
+    Replace the student's full name, aliases and first name with NAME_SLOT,
+    whole words only ("Ann" keeps "Annotate"), longest first.
+    """
+    names = {name for name in (student_name, *aliases, first_name(student_name)) if name}
+    for name in sorted(names, key=len, reverse=True):
+        text = re.sub(rf"\b{re.escape(name)}\b", NAME_SLOT, text)
+    return text
+
+
+def greeting_context(profile: dict) -> dict | None:
+    """
+    Extract the cache key parts from a get_student_profile payload.
+    Returns None for first sessions (is_first_session, derived by the server
+    from the cursor and checkpoint progress), which always go through the
+    agent (they need the course overview / onboarding flow).
+    """
+    cursor = profile.get("active_cursor_position") or {}
+    if profile.get("is_first_session") or not cursor.get("topic_id"):
+        return None
+    return {
+        "course_id": cursor.get("course_id", ""),
+        "topic_id": cursor["topic_id"],
+        "level": profile.get("level", "unknown"),
+        "student_name": profile.get("name", ""),
+    }
+
+
+greeting_cache = GreetingCache()
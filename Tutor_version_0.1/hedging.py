@@ -0,0 +1,168 @@
+# hedging.py
+import asyncio
+import os
+import time
+from collections import deque
+
+from agents import Model
+
+from limiter import slot_admitted
+
+# Hedge when the first token is slower than this percentile of recent turns
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+# Used until enough first-token samples have been collected
+HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "3.0"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "8.0"))
+HEDGE_MIN_SAMPLES = 20
+
+
+class HedgedModel(Model):
+    """
+    Sends each request to `primary`. If no first event arrives within the
+    hedge budget (a percentile of recent first-token latencies), the same
+    request is sent to `secondary` and whichever answers first is streamed;
+    the other request is cancelled. A primary that fails outright falls back
+    to the secondary immediately.
+
+    With `waits_for_slot` the primary takes a limiter slot (LimitedModel) and
+    the hedge clock starts when it is admitted: time queued behind other
+    students is load, and hedging it would only add more. The latency window
+    gets the primary's first-token time on every race it does not fail,
+    including ones the secondary won (then it is at least the time the race
+    took), so slow primaries keep the hedge delay up.
+
+    Both models are plain `Model` objects, so fake models with injected
+    delays can be used to exercise this offline.
+    """
+
+    def __init__(self, primary: Model, secondary: Model, percentile: float = HEDGE_PERCENTILE,
+                 initial_delay: float = HEDGE_INITIAL_DELAY, min_delay: float = HEDGE_MIN_DELAY,
+                 max_delay: float = HEDGE_MAX_DELAY, window: int = 200, waits_for_slot: bool = False):
+        self.primary = primary
+        self.secondary = secondary
+        self.waits_for_slot = waits_for_slot
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._first_token_latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.secondary_wins = 0
+
+    def hedge_delay(self) -> float:
+        if len(self._first_token_latencies) < HEDGE_MIN_SAMPLES:
+            return self.initial_delay
+        samples = sorted(self._first_token_latencies)
+        index = min(len(samples) - 1, int(self.percentile * len(samples)))
+        return min(self.max_delay, max(self.min_delay, samples[index]))
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "secondary_wins": self.secondary_wins,
+            "hedge_delay_s": round(self.hedge_delay(), 3),
+        }
+
+    async def get_response(self, *args, **kwargs):
+        self.requests += 1
+        primary, admitted = self._start_primary(lambda: asyncio.ensure_future(self.primary.get_response(*args, **kwargs)))
+        winner = await self._race(
+            primary, admitted, lambda: asyncio.ensure_future(self.secondary.get_response(*args, **kwargs))
+        )
+        return winner.result()
+
+    async def stream_response(self, *args, **kwargs):
+        self.requests += 1
+        streams = {}
+
+        def start(model):
+            stream = model.stream_response(*args, **kwargs)
+            task = asyncio.ensure_future(stream.__anext__())
+            streams[task] = stream
+            return task
+
+        primary, admitted = self._start_primary(lambda: start(self.primary))
+        try:
+            winner = await self._race(primary, admitted, lambda: start(self.secondary))
+            for task, stream in list(streams.items()):
+                if task is not winner:
+                    await _close_stream(task, stream)
+
+            try:
+                first_event = winner.result()
+            except StopAsyncIteration:
+                return
+            yield first_event
+            async for event in streams[winner]:
+                yield event
+        finally:
+            for task, stream in streams.items():
+                await _close_stream(task, stream)
+
+    def _start_primary(self, start) -> tuple[asyncio.Future, asyncio.Event | None]:
+        """Start the primary request; with waits_for_slot, also the event its limiter slot sets."""
+        if not self.waits_for_slot:
+            return start(), None
+        admitted = asyncio.Event()
+        # The request task copies the context when it is created
+        token = slot_admitted.set(admitted)
+        try:
+            return start(), admitted
+        finally:
+            slot_admitted.reset(token)
+
+    async def _race(self, primary: asyncio.Future, admitted: asyncio.Event | None, start_secondary):
+        """Return the future that should win; losers are cancelled."""
+        if admitted is not None:
+            # Queue wait is not provider latency: the hedge clock starts at admission
+            admission = asyncio.ensure_future(admitted.wait())
+            try:
+                await asyncio.wait({primary, admission}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                admission.cancel()
+        started = time.monotonic()
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+        if primary in done and not _failed(primary):
+            self._first_token_latencies.append(time.monotonic() - started)
+            return primary
+
+        self.hedged += 1
+        print(f"🪁 Hedging model request ({'primary failed' if done else 'slow first token'}): {self.stats()}")
+        secondary = start_secondary()
+        pending = {secondary} if done else {primary, secondary}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if not _failed(future):
+                        if future is secondary:
+                            self.secondary_wins += 1
+                        if not (primary.done() and _failed(primary)):
+                            # The primary's latency is at least this long; leaving it out biases the delay down
+                            self._first_token_latencies.append(time.monotonic() - started)
+                        return future
+            # Both failed: surface the primary's error
+            return primary
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _failed(future: asyncio.Future) -> bool:
+    if future.cancelled():
+        return True
+    exc = future.exception()
+    return exc is not None and not isinstance(exc, StopAsyncIteration)
+
+
+async def _close_stream(task: asyncio.Future, stream):
+    # Let a cancelled __anext__ unwind (releasing limiter slots) before closing
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    try:
+        await stream.aclose()
+    except Exception:
+        pass
@@ -0,0 +1,165 @@
+# limiter.py
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+# Defaults for every provider limiter (0 = no rate limit)
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "16"))
+MODEL_RATE_PER_SECOND = float(os.getenv("MODEL_RATE_PER_SECOND", "0"))
+MODEL_MAX_QUEUE = int(os.getenv("MODEL_MAX_QUEUE", "500"))
+
+# Set by the UI before each run; Runner tasks inherit them through the context
+current_student: ContextVar[str] = ContextVar("current_student", default="anonymous")
+queue_notifier: ContextVar = ContextVar("queue_notifier", default=None)
+# An asyncio.Event set when the request gets its slot (hedging times the provider, not the queue)
+slot_admitted: ContextVar = ContextVar("slot_admitted", default=None)
+
+
+class LimiterBusy(Exception):
+    """Raised when the admission queue is full and the request is shed."""
+
+
+class ProviderLimiter:
+    """
+    Admission control for one model provider.
+    - at most `max_concurrency` completions in flight
+    - optional token-bucket rate limit (`rate_per_second`)
+    - waiting requests are served round-robin per student, so one student
+      with many queued calls cannot starve the rest of the class
+    - requests beyond `max_queue` waiting are rejected with LimiterBusy
+    """
+
+    def __init__(self, name: str, max_concurrency: int = MODEL_MAX_CONCURRENCY,
+                 rate_per_second: float = MODEL_RATE_PER_SECOND, max_queue: int = MODEL_MAX_QUEUE):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.max_queue = max_queue
+
+        self.in_flight = 0
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+        self._waiting = 0
+
+        self._tokens = float(max(1.0, rate_per_second))
+        self._tokens_updated = time.monotonic()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self._total_wait = 0.0
+
+    async def acquire(self, student_id: str):
+        started = time.monotonic()
+        if self.in_flight < self.max_concurrency and not self._waiting:
+            self.in_flight += 1
+        else:
+            await self._wait_for_slot(student_id)
+
+        try:
+            await self._take_rate_token()
+        except BaseException:
+            self.release()
+            raise
+
+        self.admitted += 1
+        self._total_wait += time.monotonic() - started
+
+    def release(self):
+        # Hand the slot straight to the next waiting student (in_flight unchanged)
+        while self._queues:
+            student_id, waiters = next(iter(self._queues.items()))
+            future = waiters.popleft()
+            if waiters:
+                self._queues.move_to_end(student_id)
+            else:
+                del self._queues[student_id]
+            self._waiting -= 1
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, student_id: str | None = None):
+        await self.acquire(student_id or current_student.get())
+        admitted = slot_admitted.get()
+        if admitted is not None:
+            admitted.set()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self) -> dict:
+        return {
+            "provider": self.name,
+            "in_flight": self.in_flight,
+            "queue_depth": self._waiting,
+            "queued_students": len(self._queues),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * self._total_wait / self.admitted, 1) if self.admitted else 0.0,
+        }
+
+    async def _wait_for_slot(self, student_id: str):
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise LimiterBusy(f"{self.name}: {self._waiting} requests already queued")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(student_id, deque()).append(future)
+        self._waiting += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._waiting)
+
+        notify = queue_notifier.get()
+        try:
+            if notify is not None:
+                await notify(self._waiting)
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just as we were cancelled
+                self.release()
+            else:
+                future.cancel()
+                self._drop_waiter(student_id, future)
+            raise
+
+    def _drop_waiter(self, student_id: str, future):
+        waiters = self._queues.get(student_id)
+        if waiters is None or future not in waiters:
+            return
+        waiters.remove(future)
+        self._waiting -= 1
+        if not waiters:
+            del self._queues[student_id]
+
+    async def _take_rate_token(self):
+        if self.rate_per_second <= 0:
+            return
+        now = time.monotonic()
+        capacity = max(1.0, self.rate_per_second)
+        self._tokens = min(capacity, self._tokens + (now - self._tokens_updated) * self.rate_per_second)
+        self._tokens_updated = now
+        # Reserve the token now (may go negative) and sleep until it exists
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate_per_second)
+
+
+_limiters: dict[str, ProviderLimiter] = {}
+
+
+def get_limiter(provider_name: str, **overrides) -> ProviderLimiter:
+    """Return the process-wide limiter for a provider, creating it on first use."""
+    if provider_name not in _limiters:
+        _limiters[provider_name] = ProviderLimiter(provider_name, **overrides)
+    return _limiters[provider_name]
+
+
+def limiter_metrics() -> list[dict]:
+    return [limiter.metrics() for limiter in _limiters.values()]
@@ -1,84 +1,152 @@
 # main.py
 import asyncio
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv, find_dotenv
 
-from agents import (
-    Agent,
-    AsyncOpenAI,
-    OpenAIChatCompletionsModel,
-    Runner,
-    SQLiteSession,
-    set_tracing_disabled
-)
-from agents.mcp import MCPServerStreamableHttp, MCPServerStreamableHttpParams
 from PROMPTS.tutor_prompt import TUTOR_AGENT_FINAL_PROMPT
 
 # Load env
 load_dotenv(find_dotenv())
 
-# Provider setup (Gemini, OpenAI-compatible mode)
-Provider = AsyncOpenAI(
-    api_key=os.getenv("GEMINI_API_KEY"),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-)
+# Heavy modules (agents SDK, openai, mcp) and the provider client are loaded
+# on first use, so the UI process starts fast; warm_up() preloads them.
+_ready = threading.Event()
 
-model = OpenAIChatCompletionsModel(
-    model="gemini-2.0-flash",
-    openai_client=Provider,
-)
 
-# Disable tracing
-set_tracing_disabled(True)
+def warm_up():
+    """Import the agent stack and build the models. Safe to call more than once."""
+    started = time.perf_counter()
+    import agents  # noqa: F401
+    import search_guard  # noqa: F401
+    from models import get_fast_model, get_model
 
-# Tavily Key
-tavily_api = os.getenv('TAVILY_API_KEY')
+    get_model()
+    get_fast_model()
+    _ready.set()
+    print(f"🔥 Warm-up finished in {time.perf_counter() - started:.2f}s")
 
-async def get_tutor_agent():
-    """
-    Create and return (TutorAgent, session, USER_ID, COURSE_ID, AUTH_TOKEN, mcp_servers).
-    Prepares and connects MCP servers. Caller must handle cleanup.
-    Raises ValueError if no MCP servers can be connected.
-    """
-    print("🔍 Starting get_tutor_agent")
-    # Define MCP server URLs
-    SERVER_URL_1 = "http://localhost:8001/mcp"
-    SERVER_URL_2 = f"https://mcp.tavily.com/mcp/?tavilyApiKey={tavily_api}"
 
-    # MCP parameters
-    mcp_params_1 = MCPServerStreamableHttpParams(url=SERVER_URL_1)
-    mcp_params_2 = MCPServerStreamableHttpParams(url=SERVER_URL_2)
+def is_ready() -> bool:
+    return _ready.is_set()
+
 
-    print(f"MCP SERVER URL 1 -> {mcp_params_1}")
-    print(f"MCP SERVER URL 2 -> {mcp_params_2}")
+# Tavily Key
+tavily_api = os.getenv('TAVILY_API_KEY')
 
-    mcp_servers = []
+# Both MCP servers speak stateless HTTP, so one set of connections per process
+# is shared by every session's agent and rebuilding an agent costs no handshake.
+# MCP_POOL=0 restores one set of connections per chat session.
+MCP_POOL = os.getenv("MCP_POOL", "1") == "1"
+# A pooled connection must answer a ping this fast to be handed to a new agent
+MCP_POOL_PING_SECONDS = float(os.getenv("MCP_POOL_PING_SECONDS", "2"))
+_pooled_servers: dict = {}
+_pool_lock = None
+
+
+async def connect_mcp_server(name: str):
+    """Connect one MCP server by name. Returns None (and logs) if it is unreachable."""
+    from agents.mcp import MCPServerStreamableHttp, MCPServerStreamableHttpParams
+    from search_guard import GuardedMCPServer
+
+    if name == "TutorMCPToolbox":
+        url = "http://localhost:8001/mcp"
+    else:
+        # TAVILY_MCP_URL lets tests point at a local stand-in (MCP_tools/search_stand_in.py)
+        url = os.getenv("TAVILY_MCP_URL", f"https://mcp.tavily.com/mcp/?tavilyApiKey={tavily_api}")
+    params = MCPServerStreamableHttpParams(url=url)
+    print(f"MCP SERVER {name} -> {params}")
 
-    # Server 1
     try:
-        mcp_server_1 = MCPServerStreamableHttp(params=mcp_params_1, name="TutorMCPToolbox")
-        await mcp_server_1.connect()
-        mcp_servers.append(mcp_server_1)
-        print(f"✅ Connected to {mcp_server_1.name}")
-        # print(f"Cache Tools List Enabled: {mcp_server_1.cache_tools_list}")
+        server = MCPServerStreamableHttp(params=params, name=name)
+        await server.connect()
+        print(f"✅ Connected to {server.name}")
     except Exception as e:
-        print(f"❌ Failed to connect to TutorMCPToolbox: {e}")
+        print(f"❌ Failed to connect to {name}: {e}")
+        return None
+    if name == "TavilySearchMCP":
+        # Timeouts, circuit breaker and result cache for the remote search server
+        return GuardedMCPServer(server)
+    return server
+
+
+async def pooled_server_alive(server) -> bool:
+    """A transport error tears a client session down for good; a dead one fails (or never answers) a ping."""
+    session = getattr(getattr(server, "inner", server), "session", None)
+    if session is None:
+        return False
+    try:
+        await asyncio.wait_for(session.send_ping(), MCP_POOL_PING_SECONDS)
+        return True
+    except Exception:
+        return False
+
 
-    # Server 2
+async def reconnect_pooled_server(server) -> bool:
+    """Reconnect a dead pooled server in place, so the agents already holding it recover too."""
+    connection = getattr(server, "inner", server)
     try:
-        mcp_server_2 = MCPServerStreamableHttp(params=mcp_params_2, name="TavilySearchMCP")
-        await mcp_server_2.connect()
-        mcp_servers.append(mcp_server_2)
-        print(f"✅ Connected to {mcp_server_2.name}")
-        # print(f"Cache Tools List Enabled: {mcp_server_2.cache_tools_list}")
+        await connection.cleanup()
     except Exception as e:
-        print(f"❌ Failed to connect to TavilySearchMCP: {e}")
+        print(f"⚠️ Closing dead {server.name} failed: {e}")
+    try:
+        await connection.connect()
+    except Exception as e:
+        print(f"❌ Failed to reconnect {server.name}: {e}")
+        return False
+    print(f"♻️ Reconnected pooled {server.name}")
+    return True
+
+
+async def get_mcp_servers():
+    """Connected MCP servers for a new agent: the process pool, or fresh connections."""
+    global _pool_lock
+    names = ("TutorMCPToolbox", "TavilySearchMCP")
+    if not MCP_POOL:
+        servers = [await connect_mcp_server(name) for name in names]
+        return [server for server in servers if server is not None]
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        # Servers that were unreachable, or whose session died, are retried for the next session
+        for name in names:
+            pooled = _pooled_servers.get(name)
+            if pooled is not None and not await pooled_server_alive(pooled):
+                if not await reconnect_pooled_server(pooled):
+                    del _pooled_servers[name]
+            if name not in _pooled_servers:
+                server = await connect_mcp_server(name)
+                if server is not None:
+                    _pooled_servers[name] = server
+    return list(_pooled_servers.values())
+
+
+async def get_tutor_agent(session_id: str | None = None):
+    """
+    Create and return (TutorAgent, session, USER_ID, COURSE_ID, AUTH_TOKEN, mcp_servers).
+    With a session_id the conversation lives in the shared session store, so any
+    UI replica can continue it. Caller must handle cleanup.
+    Raises ValueError if no MCP servers can be connected.
+    """
+    print("🔍 Starting get_tutor_agent")
+    from agents import Agent, SQLiteSession
+    from models import get_model
+    from uploads import notes_search_tool
+
+    mcp_servers = await get_mcp_servers()
 
     if not mcp_servers:
         raise ValueError("⚠️ No MCP servers could be connected - agent will have no tools!")
 
-    # Create SQLite session
-    session = SQLiteSession(session_id="student_session.db")
+    if session_id is not None:
+        from session_store import SharedConversation
+        session = SharedConversation(session_id)
+    else:
+        # Create SQLite session
+        session = SQLiteSession(session_id="student_session.db")
 
     # Define USER_ID
     USER_ID = "Mustafa"
@@ -96,9 +164,10 @@ async def get_tutor_agent():
     # Create the agent with multiple MCP servers
     TutorAgent = Agent(
         name="TutorAgent",
-        model=model,
+        model=get_model(),
         instructions=instructions,
         mcp_servers=mcp_servers,  # Pass connected servers
+        tools=[notes_search_tool(USER_ID)],  # the student's uploaded notes (uploads.py)
     )
 
     COURSE_ID = "PROMPT_ENGINEERING_101"
@@ -107,3 +176,35 @@ async def get_tutor_agent():
     # print(f"🎯 Agent created with {len(mcp_servers)} MCP servers")
 
     return TutorAgent, session, USER_ID, COURSE_ID, AUTH_TOKEN, mcp_servers
+
+
+async def call_tool_json(mcp_server, tool_name: str, arguments: dict):
+    """
+    Call an MCP tool directly (no LLM turn) and decode its JSON payload.
+    Raises ValueError if the tool reports an error.
+    """
+    result = await mcp_server.call_tool(tool_name, arguments)
+    text = "".join(getattr(part, "text", "") for part in result.content)
+    if result.isError:
+        raise ValueError(f"{tool_name} failed: {text}")
+    return json.loads(text)
+
+
+def get_toolbox_server(mcp_servers):
+    """Return the connected TutorMCPToolbox server, or None."""
+    for server in mcp_servers:
+        if server.name == "TutorMCPToolbox":
+            return server
+    return None
+
+
+async def cleanup_mcp_servers(mcp_servers):
+    """Disconnect every MCP server, ignoring servers that fail to close. Pooled servers stay open."""
+    for server in mcp_servers:
+        if any(server is pooled for pooled in _pooled_servers.values()):
+            continue
+        try:
+            await server.cleanup()
+            print(f"🔌 Cleaned up {server.name}")
+        except Exception as e:
+            print(f"❌ Failed to clean up {server.name}: {e}")
@@ -0,0 +1,91 @@
+# models.py
+# Model layer: provider clients and model wrappers. Importing this module
+# pulls in the agents SDK, so main.py / ui.py only import it on first use.
+import os
+from functools import cache
+
+from agents import AsyncOpenAI, Model, OpenAIChatCompletionsModel, set_tracing_disabled
+
+from limiter import get_limiter
+
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+# Disable tracing
+set_tracing_disabled(True)
+
+
+class LimitedModel(Model):
+    """Model wrapper that takes a provider slot for every completion call (see limiter.py)."""
+
+    def __init__(self, inner: Model, limiter):
+        self.inner = inner
+        self.limiter = limiter
+
+    async def get_response(self, *args, **kwargs):
+        async with self.limiter.slot():
+            return await self.inner.get_response(*args, **kwargs)
+
+    async def stream_response(self, *args, **kwargs):
+        async with self.limiter.slot():
+            async for event in self.inner.stream_response(*args, **kwargs):
+                yield event
+
+
+@cache
+def get_provider() -> AsyncOpenAI:
+    # Provider setup (Gemini, OpenAI-compatible mode)
+    return AsyncOpenAI(
+        api_key=os.getenv("GEMINI_API_KEY"),
+        base_url=GEMINI_BASE_URL,
+    )
+
+
+@cache
+def get_model() -> Model:
+    # Every completion takes a slot from the shared Gemini limiter
+    model = LimitedModel(
+        OpenAIChatCompletionsModel(
+            model="gemini-2.0-flash",
+            openai_client=get_provider(),
+        ),
+        get_limiter("gemini"),
+    )
+
+    # Optional hedging: a slow first token triggers a duplicate request to a
+    # fallback provider/model and the faster stream wins (see hedging.py).
+    # Hedging to the same provider only doubles the load on it when it is
+    # slow, so the fallback must be a different base URL
+    fallback_base_url = os.getenv("FALLBACK_BASE_URL", GEMINI_BASE_URL)
+    if os.getenv("HEDGE_ENABLED", "0") == "1" and fallback_base_url.rstrip("/") == GEMINI_BASE_URL.rstrip("/"):
+        print("⚠️ HEDGE_ENABLED ignored: FALLBACK_BASE_URL is the primary provider; set it to another provider")
+    elif os.getenv("HEDGE_ENABLED", "0") == "1":
+        from hedging import HedgedModel
+
+        fallback_provider = AsyncOpenAI(
+            api_key=os.getenv("FALLBACK_API_KEY", os.getenv("GEMINI_API_KEY")),
+            base_url=fallback_base_url,
+        )
+        model = HedgedModel(
+            model,
+            LimitedModel(
+                OpenAIChatCompletionsModel(
+                    model=os.getenv("FALLBACK_MODEL", "gemini-2.0-flash"),
+                    openai_client=fallback_provider,
+                ),
+                get_limiter("fallback"),
+            ),
+            waits_for_slot=True,
+        )
+    return model
+
+
+@cache
+def get_fast_model() -> Model:
+    # Cheaper / faster model for acknowledgement and navigation turns (see router.py)
+    return LimitedModel(
+        OpenAIChatCompletionsModel(
+            model=os.getenv("TUTOR_FAST_MODEL", "gemini-2.0-flash-lite"),
+            openai_client=get_provider(),
+        ),
+        get_limiter("gemini"),
+    )
@@ -0,0 +1,344 @@
+# recorder.py
+# Record a live tutoring session (model calls, stream events, MCP tool calls,
+# timings) to a gzip JSONL file and replay it offline against the agent.
+#
+#   TUTOR_RECORD_DIR=recordings chainlit run ui.py          # record every chat
+#   python recorder.py replay recordings/<id>.jsonl.gz      # original speed
+#   python recorder.py replay recordings/<id>.jsonl.gz --speed 10
+#   python recorder.py replay recordings/<id>.jsonl.gz --speed 0   # no delays
+#
+# Flame graph of a replay: py-spy record -o flame.svg -- python recorder.py replay <file> --speed 0
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+import time
+from collections import defaultdict, deque
+
+from agents import Agent, Model, ModelResponse, Runner, Usage, set_tracing_disabled
+from agents.mcp import MCPServer
+from mcp.types import CallToolResult, GetPromptResult, ListPromptsResult, Tool
+from openai.types.responses import ResponseOutputItem, ResponseStreamEvent
+from pydantic import TypeAdapter
+
+TUTOR_RECORD_DIR = os.getenv("TUTOR_RECORD_DIR")
+
+_stream_event_adapter = TypeAdapter(ResponseStreamEvent)
+_output_item_adapter = TypeAdapter(ResponseOutputItem)
+
+REDACTED = "<redacted>"
+# Values of these keys, wherever they appear (tool arguments, runtime input), never reach a fixture
+_SECRET_KEYS = {"auth_token", "access_token", "api_key", "authorization", "password", "secret"}
+# The same keys inside text: "auth_token=...", "\"auth_token\": \"...\"" (prompts, JSON-encoded arguments)
+_SECRET_IN_TEXT = re.compile(
+    r"(\b(?:%s)\\?[\"']?\s*[:=]\s*\\?[\"']?)[^\s\"'\\,;})]+" % "|".join(sorted(_SECRET_KEYS)), re.IGNORECASE
+)
+_JWT = re.compile(r"\beyJ[\w-]+\.[\w-]+\.[\w-]+")
+# Streamed tool-call arguments arrive in fragments a pattern cannot see whole; the completed
+# response still carries the (redacted) arguments, which is what replay builds tool calls from
+_ARGUMENT_DELTAS = "response.function_call_arguments.delta"
+
+
+def _jsonable(value):
+    return json.loads(json.dumps(value, default=str))
+
+
+def redact(value, secrets: tuple[str, ...] = ()):
+    """Copy of a JSON value with auth tokens, keys and the given secret strings replaced by REDACTED."""
+    if isinstance(value, dict):
+        if value.get("type") == _ARGUMENT_DELTAS and "delta" in value:
+            value = {**value, "delta": ""}
+        return {
+            # Only string values: a tool's input schema also has an "auth_token" property
+            key: REDACTED if key.lower() in _SECRET_KEYS and isinstance(item, str) and item else redact(item, secrets)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item, secrets) for item in value]
+    if isinstance(value, str):
+        for secret in secrets:
+            value = value.replace(secret, REDACTED)
+        return _JWT.sub(REDACTED, _SECRET_IN_TEXT.sub(rf"\1{REDACTED}", value))
+    return value
+
+
+class Recorder:
+    """
+    Appends timestamped records (seconds since the recording started) to a
+    gzip JSONL file. Records are redacted before they are written: `secrets`
+    (e.g. the AUTH_TOKEN the tutor sends) and any auth_token / api_key value
+    never end up in a fixture.
+    """
+
+    def __init__(self, path: str, secrets=()):
+        self.path = path
+        self.secrets = tuple(secret for secret in secrets if secret)
+        self._started = time.monotonic()
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._model_calls = 0
+
+    def record(self, kind: str, **data):
+        data = {"t": round(time.monotonic() - self._started, 4), "kind": kind, **redact(_jsonable(data), self.secrets)}
+        self._file.write(json.dumps(data) + "\n")
+
+    def next_model_call(self) -> int:
+        self._model_calls += 1
+        return self._model_calls
+
+    def close(self):
+        self._file.close()
+
+
+def recorder_for_session(session_id: str, secrets=()) -> Recorder | None:
+    """Recorder for one chat session, or None when TUTOR_RECORD_DIR is not set."""
+    if not TUTOR_RECORD_DIR:
+        return None
+    os.makedirs(TUTOR_RECORD_DIR, exist_ok=True)
+    return Recorder(os.path.join(TUTOR_RECORD_DIR, f"{session_id}.jsonl.gz"), secrets)
+
+
+def _request_summary(args, kwargs) -> dict:
+    # Model.get_response / stream_response(system_instructions, input, model_settings, tools, ...)
+    names = ["system_instructions", "input", "model_settings", "tools"]
+    request = dict(zip(names, args))
+    request.update({k: v for k, v in kwargs.items() if k in names})
+    return {
+        "system_instructions_chars": len(request.get("system_instructions") or ""),
+        "input": _jsonable(request.get("input")),
+        "tools": [getattr(tool, "name", str(tool)) for tool in request.get("tools") or []],
+    }
+
+
+class RecordingModel(Model):
+    def __init__(self, inner: Model, recorder: Recorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    async def get_response(self, *args, **kwargs):
+        call = self.recorder.next_model_call()
+        self.recorder.record("model_call", call=call, streamed=False, request=_request_summary(args, kwargs))
+        response = await self.inner.get_response(*args, **kwargs)
+        self.recorder.record(
+            "model_response", call=call,
+            output=[item.model_dump(mode="json") for item in response.output],
+            usage={
+                "input_tokens": response.usage.input_tokens,
+                "output_tokens": response.usage.output_tokens,
+                "total_tokens": response.usage.total_tokens,
+            },
+            response_id=response.response_id,
+        )
+        return response
+
+    async def stream_response(self, *args, **kwargs):
+        call = self.recorder.next_model_call()
+        self.recorder.record("model_call", call=call, streamed=True, request=_request_summary(args, kwargs))
+        async for event in self.inner.stream_response(*args, **kwargs):
+            self.recorder.record("model_event", call=call, event=event.model_dump(mode="json"))
+            yield event
+        self.recorder.record("model_stream_end", call=call)
+
+
+class RecordingMCPServer(MCPServer):
+    def __init__(self, inner: MCPServer, recorder: Recorder):
+        super().__init__()
+        self.inner = inner
+        self.recorder = recorder
+        self.use_structured_content = getattr(inner, "use_structured_content", False)
+
+    def __getattr__(self, item):
+        if item == "inner":
+            raise AttributeError(item)
+        return getattr(self.inner, item)
+
+    @property
+    def name(self) -> str:
+        return self.inner.name
+
+    async def connect(self):
+        await self.inner.connect()
+
+    async def cleanup(self):
+        await self.inner.cleanup()
+
+    async def list_tools(self, run_context=None, agent=None):
+        tools = await self.inner.list_tools(run_context, agent)
+        self.recorder.record("list_tools", server=self.name, tools=[tool.model_dump(mode="json") for tool in tools])
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: dict | None):
+        started = time.monotonic()
+        result = await self.inner.call_tool(tool_name, arguments)
+        self.recorder.record(
+            "tool_call", server=self.name, tool=tool_name, arguments=_jsonable(arguments),
+            result=result.model_dump(mode="json"), latency=round(time.monotonic() - started, 4),
+        )
+        return result
+
+    async def list_prompts(self):
+        return await self.inner.list_prompts()
+
+    async def get_prompt(self, name: str, arguments: dict | None = None):
+        return await self.inner.get_prompt(name, arguments)
+
+
+def attach_recorder(agent: Agent, recorder: Recorder | None) -> Agent:
+    """Clone of `agent` whose model and MCP servers are recorded (no-op without a recorder)."""
+    if recorder is None:
+        return agent
+    model = agent.model if isinstance(agent.model, RecordingModel) else RecordingModel(agent.model, recorder)
+    servers = [
+        server if isinstance(server, RecordingMCPServer) else RecordingMCPServer(server, recorder)
+        for server in agent.mcp_servers
+    ]
+    return agent.clone(model=model, mcp_servers=servers)
+
+
+# ---------------------------------------------------------------- replay
+
+
+def load_recording(path: str) -> list[dict]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayExhausted(Exception):
+    """The agent made more model or tool calls than the recording contains."""
+
+
+class ReplayModel(Model):
+    """Serves recorded model calls in order, at `speed` x the original pace (0 = no delays)."""
+
+    def __init__(self, records: list[dict], speed: float = 1.0):
+        self.speed = speed
+        self._calls = deque()
+        by_call = defaultdict(list)
+        for record in records:
+            if record["kind"].startswith("model_"):
+                by_call[record["call"]].append(record)
+        for call in sorted(by_call):
+            self._calls.append(by_call[call])
+
+    async def _pause(self, seconds: float):
+        if self.speed > 0 and seconds > 0:
+            await asyncio.sleep(seconds / self.speed)
+
+    def _next_call(self) -> list[dict]:
+        if not self._calls:
+            raise ReplayExhausted("no recorded model calls left")
+        return self._calls.popleft()
+
+    async def get_response(self, *args, **kwargs):
+        call_records = self._next_call()
+        start, response = call_records[0], call_records[-1]
+        if response["kind"] != "model_response":
+            raise ReplayExhausted(f"model call {start['call']} was recorded as a stream")
+        await self._pause(response["t"] - start["t"])
+        usage = response["usage"]
+        return ModelResponse(
+            output=[_output_item_adapter.validate_python(item) for item in response["output"]],
+            usage=Usage(requests=1, input_tokens=usage["input_tokens"],
+                        output_tokens=usage["output_tokens"], total_tokens=usage["total_tokens"]),
+            response_id=response.get("response_id"),
+        )
+
+    async def stream_response(self, *args, **kwargs):
+        call_records = self._next_call()
+        previous_t = call_records[0]["t"]
+        for record in call_records[1:]:
+            if record["kind"] != "model_event":
+                continue
+            await self._pause(record["t"] - previous_t)
+            previous_t = record["t"]
+            yield _stream_event_adapter.validate_python(record["event"])
+
+
+class ReplayMCPServer(MCPServer):
+    """Stand-in MCP server that answers with the recorded tool list and results."""
+
+    def __init__(self, name: str, records: list[dict], speed: float = 1.0):
+        super().__init__()
+        self._name = name
+        self.speed = speed
+        self._tools = []
+        self._results = defaultdict(deque)
+        for record in records:
+            if record.get("server") != name:
+                continue
+            if record["kind"] == "list_tools" and not self._tools:
+                self._tools = [Tool.model_validate(tool) for tool in record["tools"]]
+            elif record["kind"] == "tool_call":
+                self._results[record["tool"]].append(record)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def connect(self):
+        pass
+
+    async def cleanup(self):
+        pass
+
+    async def list_tools(self, run_context=None, agent=None):
+        return self._tools
+
+    async def call_tool(self, tool_name: str, arguments: dict | None):
+        if not self._results[tool_name]:
+            raise ReplayExhausted(f"no recorded results left for {self._name}.{tool_name}")
+        record = self._results[tool_name].popleft()
+        if self.speed > 0:
+            await asyncio.sleep(record["latency"] / self.speed)
+        return CallToolResult.model_validate(record["result"])
+
+    async def list_prompts(self):
+        # Prompts are not recorded: the replay server offers none
+        return ListPromptsResult(prompts=[])
+
+    async def get_prompt(self, name: str, arguments: dict | None = None):
+        return GetPromptResult(
+            description=f"Prompt {name!r} is not available in a replay: prompts are not recorded",
+            messages=[],
+        )
+
+
+async def replay(path: str, speed: float = 1.0):
+    """Re-drive every recorded agent turn and compare replay time with the original."""
+    set_tracing_disabled(True)
+    records = load_recording(path)
+    session = next((r for r in records if r["kind"] == "session_start"), None)
+    if session is None:
+        raise SystemExit(f"❌ {path} has no session_start record")
+
+    model = ReplayModel(records, speed)
+    servers = [ReplayMCPServer(name, records, speed) for name in session["mcp_servers"]]
+    agent = Agent(name=session["agent_name"], instructions=session["instructions"],
+                  model=model, mcp_servers=servers)
+
+    turns = [r for r in records if r["kind"] in ("turn_start", "turn_end")]
+    print(f"▶️ Replaying {path} at {speed or 'max'}x")
+    for start, end in zip(turns[::2], turns[1::2]):
+        started = time.monotonic()
+        result = Runner.run_streamed(agent, start["input"])
+        async for _ in result.stream_events():
+            pass
+        elapsed = time.monotonic() - started
+        original = end["t"] - start["t"]
+        same = "same" if result.final_output == end.get("output") else "DIFFERENT"
+        print(f"  {start['label']:<14} original {original:7.2f}s  replay {elapsed:7.2f}s  output {same}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded tutoring session offline")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay_parser = sub.add_parser("replay")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="1 = original pace, 0 = no delays")
+    args = parser.parse_args()
+    asyncio.run(replay(args.path, args.speed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# response_cache.py
+import os
+import re
+import time
+from collections import OrderedDict
+
+from greeting_cache import NAME_SLOT, first_name, slot_name
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(6 * 3600)))
+# Character-trigram Jaccard similarity needed to reuse an answer
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.82"))
+# Questions with fewer content words (filler dropped) than this are conversational or
+# lean on earlier turns ("yes", "next", "why not?") and are never cached
+RESPONSE_CACHE_MIN_WORDS = int(os.getenv("RESPONSE_CACHE_MIN_WORDS", "5"))
+
+FILLER_WORDS = {
+    "a", "an", "the", "please", "pls", "can", "could", "would", "you", "u",
+    "tell", "explain", "show", "about", "hey", "hi", "hello", "suzzi", "so", "just",
+}
+# Questions about the student themselves get personal answers: always bypass
+PERSONAL_WORDS = {"i", "me", "my", "mine", "myself", "im", "ive", "we", "our", "us"}
+# Pronouns and deictic words point at earlier turns ("what does that mean?"): the
+# answer depends on this student's conversation, so never cache or replay it
+CONTEXT_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "he", "she", "him", "her",
+    "here", "there", "above", "previous", "former", "latter",
+}
+# A near-duplicate that flips one of these is the opposite question
+NEGATION_WORDS = {
+    "not", "no", "never", "without", "none", "nor", "cannot", "cant", "dont", "doesnt", "didnt",
+    "isnt", "arent", "wasnt", "werent", "wont", "shouldnt", "wouldnt", "couldnt", "avoid",
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and filler words, collapse whitespace."""
+    text = _PUNCTUATION.sub("", text.lower())
+    words = [w for w in _SPACES.split(text) if w and w not in FILLER_WORDS]
+    return " ".join(words)
+
+
+def trigrams(text: str) -> frozenset[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def negations(normalized: str) -> frozenset[str]:
+    return frozenset(NEGATION_WORDS.intersection(normalized.split()))
+
+
+def is_cacheable_question(question: str) -> bool:
+    words = normalize_question(question).split()
+    if len(words) < RESPONSE_CACHE_MIN_WORDS:
+        return False
+    return not (PERSONAL_WORDS.intersection(words) or CONTEXT_WORDS.intersection(words))
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of agent answers keyed by (scope, normalized question),
+    where the scope is the topic's content hash when known (see content_scope).
+    Exact normalized matches are O(1); otherwise the entries of the same
+    scope are compared by trigram similarity, but never across a negation
+    ("why is context important" vs "... not important"). The student's name
+    is stored as a slot so an answer can be re-rendered for other students.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl_seconds: float = RESPONSE_CACHE_TTL,
+                 threshold: float = RESPONSE_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._buckets: dict[tuple, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def lookup(self, scope: str, question: str, student_name: str) -> str | None:
+        if not is_cacheable_question(question):
+            self.bypassed += 1
+            return None
+
+        normalized = normalize_question(question)
+        key = (scope, normalized)
+        entry = self._entries.get(key)
+        if entry is None:
+            key, entry = self._closest(scope, normalized)
+
+        if entry is None or self._expired(entry):
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry["answer"].replace(NAME_SLOT, first_name(student_name))
+
+    def store(self, scope: str, question: str, answer: str, student_name: str,
+              aliases: tuple[str, ...] = ()) -> bool:
+        """
+        Keep an answer for this scope. `aliases` are other names the agent
+        may have used for the student (see GreetingCache.store); they are
+        slotted out too, so no student's name is replayed to another.
+        """
+        if not answer or not is_cacheable_question(question):
+            return False
+
+        normalized = normalize_question(question)
+        key = (scope, normalized)
+        self._entries[key] = {
+            "answer": slot_name(answer, student_name, aliases),
+            "trigrams": trigrams(normalized),
+            "negations": negations(normalized),
+            "created_at": time.time(),
+        }
+        self._entries.move_to_end(key)
+        self._buckets.setdefault(scope, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+        }
+
+    def _closest(self, scope: str, normalized: str):
+        wanted, negated = trigrams(normalized), negations(normalized)
+        best_key, best_entry, best_score = None, None, self.threshold
+        for key in self._buckets.get(scope, ()):
+            entry = self._entries[key]
+            if entry["negations"] != negated:
+                continue
+            score = similarity(wanted, entry["trigrams"])
+            if score >= best_score:
+                best_key, best_entry, best_score = key, entry, score
+        return best_key, best_entry
+
+    def _expired(self, entry: dict) -> bool:
+        return time.time() - entry["created_at"] > self.ttl_seconds
+
+    def _remove(self, key: tuple):
+        self._entries.pop(key, None)
+        bucket = self._buckets.get(key[0])
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[key[0]]
+
+
+def content_scope(course_id: str, topic_id: str, content_hash: str | None = None) -> str:
+    """Cache scope of a question: the same lessons share answers across courses and topic ids."""
+    return f"sha256:{content_hash}" if content_hash else f"{course_id}/{topic_id}"
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,85 @@
+# router.py
+import json
+import os
+import re
+import time
+
+from greeting_cache import first_name
+
+# Optional JSONL file with one line per routed turn (route, latency)
+ROUTE_LOG_PATH = os.getenv("ROUTE_LOG_PATH")
+
+ROUTE_TOC = "toc"            # answered directly from get_table_of_contents, no model
+ROUTE_ACK = "ack"            # short acknowledgement / navigation -> fast model
+ROUTE_TEACHING = "teaching"  # everything else -> main model
+
+_TOC_PATTERN = re.compile(
+    r"^(please\s+)?(show|see|view|list|open|give)?\s*(me\s+)?(the\s+)?"
+    r"(toc|table of contents|contents|course outline|outline|syllabus|modules|course modules)\s*(please)?\W*$"
+)
+_ACK_WORDS = {
+    "yes", "y", "yeah", "yep", "yup", "ok", "okay", "k", "sure", "continue", "next", "go", "on",
+    "ahead", "lets", "let's", "start", "proceed", "please", "thanks", "thank", "you", "got", "it",
+    "cool", "great", "nice", "done", "ready", "im", "i'm", "fine", "alright", "and", "sounds", "good",
+}
+
+
+def classify_turn(user_input: str) -> str:
+    text = " ".join(user_input.lower().split())
+    if _TOC_PATTERN.match(text):
+        return ROUTE_TOC
+    words = re.findall(r"[a-z']+", text)
+    if words and len(words) <= 5 and all(w in _ACK_WORDS for w in words):
+        return ROUTE_ACK
+    return ROUTE_TEACHING
+
+
+def render_toc(toc: dict, student_name: str) -> str:
+    """Format a get_table_of_contents payload (compact or module_{i} form) as a tutor reply."""
+    if "modules" in toc:
+        modules = [(topic_id, description) for topic_id, description in toc["modules"]]
+    else:
+        keys = sorted((k for k in toc if k.startswith("module_")), key=lambda k: int(k.split("_")[1]))
+        modules = [tuple(toc[key].partition(": ")[::2]) for key in keys]
+    lines = [f"Here's the course outline, {first_name(student_name)} — we'll study it step by step, in this order:", ""]
+    for i, (topic_id, description) in enumerate(modules):
+        lines.append(f"{i + 1}. **{description or topic_id}** (`{topic_id}`)")
+    lines += ["", "Next Step: pick up where you left off in the current topic. Shall we continue?"]
+    return "\n".join(lines)
+
+
+class RouteStats:
+    """Per-route turn counts and latency, printed and optionally logged to JSONL."""
+
+    def __init__(self, log_path: str | None = ROUTE_LOG_PATH):
+        self.log_path = log_path
+        self._stats: dict[str, dict] = {}
+
+    def record(self, route: str, started: float, **extra):
+        latency_ms = (time.perf_counter() - started) * 1000
+        stats = self._stats.setdefault(route, {"turns": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["turns"] += 1
+        stats["total_ms"] += latency_ms
+        stats["max_ms"] = max(stats["max_ms"], latency_ms)
+        print(f"🧭 route={route} latency_ms={latency_ms:.0f}")
+
+        if self.log_path:
+            record = {"ts": time.time(), "route": route, "latency_ms": round(latency_ms, 1), **extra}
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"⚠️ Could not write route log {self.log_path}: {e}")
+
+    def summary(self) -> dict:
+        return {
+            route: {
+                "turns": s["turns"],
+                "avg_ms": round(s["total_ms"] / s["turns"], 1),
+                "max_ms": round(s["max_ms"], 1),
+            }
+            for route, s in self._stats.items()
+        }
+
+
+route_stats = RouteStats()
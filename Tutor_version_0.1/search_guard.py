@@ -0,0 +1,192 @@
+# search_guard.py
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+from agents.mcp import MCPServer
+from mcp.types import CallToolResult, TextContent
+
+SEARCH_CALL_TIMEOUT = float(os.getenv("SEARCH_CALL_TIMEOUT", "8"))
+SEARCH_BREAKER_FAILURES = int(os.getenv("SEARCH_BREAKER_FAILURES", "3"))
+SEARCH_BREAKER_COOLDOWN = float(os.getenv("SEARCH_BREAKER_COOLDOWN", "60"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+
+
+def normalize_arguments(arguments: dict | None) -> str:
+    """Cache key for tool arguments: strings lowercased and whitespace-collapsed."""
+    normalized = {}
+    for key, value in (arguments or {}).items():
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+        normalized[key] = value
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls go through; consecutive failures are counted
+    open      -> calls are refused until `cooldown` seconds pass
+    half-open -> one trial call; success closes, failure re-opens. Every
+                 allowed call must end in record_success or record_failure
+                 (a cancelled one too), or the trial never ends
+    """
+
+    def __init__(self, failure_threshold: int = SEARCH_BREAKER_FAILURES, cooldown: float = SEARCH_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class GuardedMCPServer(MCPServer):
+    """
+    Wraps a remote MCP server (Tavily search) with:
+    - a timeout on every list_tools / call_tool
+    - a circuit breaker fed by call_tool outcomes only (the SDK lists tools
+      before every model call, so a successful listing must not reset it);
+      while it is open the server lists no tools, so the agent simply does
+      not see (or wait on) the search tools
+    - a separate breaker for list_tools itself, so a hung listing is not
+      waited on every turn either
+    - a TTL cache of successful results keyed by tool + normalized arguments
+    """
+
+    def __init__(self, inner: MCPServer, timeout: float = SEARCH_CALL_TIMEOUT,
+                 breaker: CircuitBreaker | None = None,
+                 cache_ttl: float = SEARCH_CACHE_TTL, cache_size: int = SEARCH_CACHE_SIZE):
+        super().__init__()
+        self.inner = inner
+        self.use_structured_content = getattr(inner, "use_structured_content", False)
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.list_breaker = CircuitBreaker(self.breaker.failure_threshold, self.breaker.cooldown)
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, tuple[float, CallToolResult]] = OrderedDict()
+        self.cache_hits = 0
+
+    def __getattr__(self, item):
+        # Anything not guarded here behaves like the wrapped server
+        if item == "inner":
+            raise AttributeError(item)
+        return getattr(self.inner, item)
+
+    @property
+    def name(self) -> str:
+        return self.inner.name
+
+    async def connect(self):
+        await self.inner.connect()
+
+    async def cleanup(self):
+        await self.inner.cleanup()
+
+    async def list_tools(self, run_context=None, agent=None):
+        # Half-open still lists the tools, so the trial call can happen; only "open" hides them
+        if self.breaker.state == "open" or not self.list_breaker.allow():
+            return []
+        try:
+            tools = await asyncio.wait_for(self.inner.list_tools(run_context, agent), self.timeout)
+        except asyncio.CancelledError:
+            # The turn was cancelled mid-listing: release a half-open trial, or the breaker never closes
+            self.list_breaker.record_failure()
+            raise
+        except Exception as e:
+            self.list_breaker.record_failure()
+            print(f"⚠️ {self.name} list_tools failed ({self.list_breaker.state}): {e!r}")
+            return []
+        self.list_breaker.record_success()
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: dict | None):
+        key = (tool_name, normalize_arguments(arguments))
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached[1]
+
+        if not self.breaker.allow():
+            return self._unavailable(tool_name, "search is temporarily unavailable")
+
+        try:
+            result = await asyncio.wait_for(self.inner.call_tool(tool_name, arguments), self.timeout)
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            print(f"⏱️ {self.name}.{tool_name} timed out after {self.timeout}s ({self.breaker.state})")
+            return self._unavailable(tool_name, "search timed out")
+        except asyncio.CancelledError:
+            # A cancelled turn (new message, disconnect) must still end a half-open trial
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            print(f"⚠️ {self.name}.{tool_name} failed ({self.breaker.state}): {e!r}")
+            return self._unavailable(tool_name, "search failed")
+
+        if result.isError:
+            # An upstream error (quota, 5xx wrapped by the server) is a failure too; never cached
+            self.breaker.record_failure()
+            print(f"⚠️ {self.name}.{tool_name} returned an error ({self.breaker.state})")
+            return result
+        self.breaker.record_success()
+        self._cache[key] = (time.monotonic(), result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    async def list_prompts(self):
+        return await self.inner.list_prompts()
+
+    async def get_prompt(self, name: str, arguments: dict | None = None):
+        return await self.inner.get_prompt(name, arguments)
+
+    def stats(self) -> dict:
+        return {
+            "server": self.name,
+            "breaker": self.breaker.state,
+            "failures": self.breaker.failures,
+            "list_breaker": self.list_breaker.state,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+        }
+
+    def _unavailable(self, tool_name: str, reason: str) -> CallToolResult:
+        # Returned (not raised) so the model can tell the student and carry on
+        return CallToolResult(
+            content=[TextContent(type="text", text=f"{tool_name}: {reason}. Continue without live search results.")],
+            isError=True,
+        )
@@ -0,0 +1,335 @@
+# session_store.py
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager
+from functools import cache
+
+# Shared session state for every UI replica: a SQLite file (local stand-in,
+# shared by replicas on one host) or redis://host:port/db (needs `pip install redis`)
+TUTOR_SESSION_STORE = os.getenv("TUTOR_SESSION_STORE", "session_store.db")
+# Stored sessions expire after this long without a turn (matches user_session_timeout)
+TUTOR_SESSION_TTL_SECONDS = int(os.getenv("TUTOR_SESSION_TTL_SECONDS", str(15 * 24 * 3600)))
+# Sessions idle longer than this have their agent objects dropped from memory
+# (their MCP connections too, but only with MCP_POOL=0: pooled connections are shared)
+TUTOR_SESSION_IDLE_SECONDS = float(os.getenv("TUTOR_SESSION_IDLE_SECONDS", "900"))
+TUTOR_SESSION_SWEEP_SECONDS = float(os.getenv("TUTOR_SESSION_SWEEP_SECONDS", "60"))
+# Turns (one student message + one answer) of UI history kept in memory and in the store; 0 = unbounded
+TUTOR_HISTORY_TURNS = int(os.getenv("TUTOR_HISTORY_TURNS", "20"))
+
+# Plain data saved after every turn; everything in RUNTIME_KEYS is rebuilt on rehydrate
+PERSISTED_KEYS = ("USER_ID", "COURSE_ID", "STUDENT_NAME", "TOPIC_ID", "FLOW", "history")
+RUNTIME_KEYS = ("TutorAgent", "FastTutorAgent", "FlowTutorAgent", "Session", "mcp_servers")
+
+
+class SQLiteSessionStore:
+    """
+    Session state and conversation items in a SQLite file (WAL, safe across
+    processes). Callers run on to_thread workers, so the one connection is
+    used under a lock: pop_item's SELECT and DELETE never interleave with
+    another write.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str = TUTOR_SESSION_STORE, ttl: int = TUTOR_SESSION_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS conversation_items (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, item TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS conversation_items_session ON conversation_items (session_id, seq);
+            """
+        )
+
+    def put_state(self, session_id: str, state: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at",
+                (session_id, json.dumps(state, default=str), time.time()),
+            )
+            self._puts += 1
+            prune = self._puts % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def get_state(self, session_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def append_items(self, session_id: str, items: list):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO conversation_items (session_id, item) VALUES (?, ?)",
+                [(session_id, json.dumps(item, default=str)) for item in items],
+            )
+
+    def get_items(self, session_id: str, limit: int | None = None) -> list:
+        with self._lock:
+            if limit is None:
+                rows = self._conn.execute(
+                    "SELECT item FROM conversation_items WHERE session_id = ? ORDER BY seq", (session_id,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT item FROM conversation_items WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                    (session_id, limit),
+                ).fetchall()[::-1]
+        return [json.loads(row[0]) for row in rows]
+
+    def pop_item(self, session_id: str):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT seq, item FROM conversation_items WHERE session_id = ? ORDER BY seq DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM conversation_items WHERE seq = ?", (row[0],))
+        return json.loads(row[1])
+
+    def clear_items(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversation_items WHERE session_id = ?", (session_id,))
+
+    def delete(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM conversation_items WHERE session_id = ?", (session_id,))
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        with self._lock, self._conn:
+            expired = [(row[0],) for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE updated_at < ?", (cutoff,)
+            )]
+            self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", expired)
+            self._conn.executemany("DELETE FROM conversation_items WHERE session_id = ?", expired)
+
+
+class RedisSessionStore:
+    """The same store on Redis, for replicas spread across hosts. Keys expire after the TTL."""
+
+    def __init__(self, url: str, ttl: int = TUTOR_SESSION_TTL_SECONDS):
+        import redis  # optional dependency, only needed for redis:// stores
+
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _keys(session_id: str) -> tuple[str, str]:
+        return f"tutor:session:{session_id}:state", f"tutor:session:{session_id}:items"
+
+    def put_state(self, session_id: str, state: dict):
+        state_key, items_key = self._keys(session_id)
+        with self._redis.pipeline() as pipe:
+            pipe.set(state_key, json.dumps(state, default=str), ex=self.ttl)
+            pipe.expire(items_key, self.ttl)
+            pipe.execute()
+
+    def get_state(self, session_id: str) -> dict | None:
+        raw = self._redis.get(self._keys(session_id)[0])
+        return json.loads(raw) if raw else None
+
+    def append_items(self, session_id: str, items: list):
+        items_key = self._keys(session_id)[1]
+        with self._redis.pipeline() as pipe:
+            pipe.rpush(items_key, *(json.dumps(item, default=str) for item in items))
+            pipe.expire(items_key, self.ttl)
+            pipe.execute()
+
+    def get_items(self, session_id: str, limit: int | None = None) -> list:
+        start = 0 if limit is None else -limit
+        return [json.loads(raw) for raw in self._redis.lrange(self._keys(session_id)[1], start, -1)]
+
+    def pop_item(self, session_id: str):
+        raw = self._redis.rpop(self._keys(session_id)[1])
+        return json.loads(raw) if raw else None
+
+    def clear_items(self, session_id: str):
+        self._redis.delete(self._keys(session_id)[1])
+
+    def delete(self, session_id: str):
+        self._redis.delete(*self._keys(session_id))
+
+
+@cache
+def get_session_store():
+    """The process-wide store selected by TUTOR_SESSION_STORE."""
+    if TUTOR_SESSION_STORE.startswith(("redis://", "rediss://")):
+        return RedisSessionStore(TUTOR_SESSION_STORE)
+    return SQLiteSessionStore(TUTOR_SESSION_STORE)
+
+
+class SharedConversation:
+    """
+    Agent conversation memory (the agents SDK session interface) kept in the
+    shared store, so whichever replica serves the next message sees it.
+    """
+
+    def __init__(self, session_id: str, store=None):
+        self.session_id = session_id
+        self.store = store or get_session_store()
+
+    async def get_items(self, limit: int | None = None) -> list:
+        return await asyncio.to_thread(self.store.get_items, self.session_id, limit)
+
+    async def add_items(self, items: list):
+        if items:
+            await asyncio.to_thread(self.store.append_items, self.session_id, list(items))
+
+    async def pop_item(self):
+        return await asyncio.to_thread(self.store.pop_item, self.session_id)
+
+    async def clear_session(self):
+        await asyncio.to_thread(self.store.clear_items, self.session_id)
+
+
+def estimate_bytes(value, _seen=None) -> int:
+    """Approximate deep size of plain containers; other objects count their shallow size once."""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_bytes(k, seen) + estimate_bytes(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_bytes(item, seen) for item in value)
+    return size
+
+
+def bounded_history(history: list, turns: int = TUTOR_HISTORY_TURNS) -> list:
+    """The last `turns` turns of a UI history (two messages per turn)."""
+    if turns <= 0 or len(history) <= 2 * turns:
+        return history
+    return history[-2 * turns:]
+
+
+class IdleSessionManager:
+    """
+    Saves each session's plain state to the shared store after every turn and
+    tracks activity. A background sweep drops the agent objects of sessions
+    idle for longer than `idle_seconds`; their MCP connections are closed only
+    when they are not pooled (MCP_POOL=0), since pooled ones serve every session.
+    Any replica can rebuild a session from the store on its next message.
+    """
+
+    def __init__(self, store, cleanup, idle_seconds: float = TUTOR_SESSION_IDLE_SECONDS,
+                 sweep_seconds: float = TUTOR_SESSION_SWEEP_SECONDS):
+        self.store = store
+        self.cleanup = cleanup  # async callable(mcp_servers)
+        self.idle_seconds = idle_seconds
+        self.sweep_seconds = sweep_seconds
+        self._last_active: dict[str, float] = {}
+        self._busy: set[str] = set()
+        self._sweeper = None
+        self.evictions = 0
+        self.rehydrations = 0
+
+    def touch(self, session_id: str):
+        self._last_active[session_id] = time.monotonic()
+
+    def forget(self, session_id: str):
+        self._last_active.pop(session_id, None)
+        self._busy.discard(session_id)
+
+    @asynccontextmanager
+    async def turn(self, session_id: str):
+        """Mark a session busy (never evicted) for the duration of a turn."""
+        self._busy.add(session_id)
+        self.touch(session_id)
+        try:
+            yield
+        finally:
+            self._busy.discard(session_id)
+            self.touch(session_id)
+
+    async def save(self, session_id: str, data: dict):
+        state = {key: data.get(key) for key in PERSISTED_KEYS}
+        state["history"] = bounded_history(state["history"] or [])
+        await asyncio.to_thread(self.store.put_state, session_id, state)
+
+    async def load(self, session_id: str) -> dict | None:
+        """Stored state of a session this process does not hold (evicted, or served elsewhere)."""
+        state = await asyncio.to_thread(self.store.get_state, session_id)
+        if state is not None:
+            self.rehydrations += 1
+        return state
+
+    def _idle(self, session_id: str) -> bool:
+        last_active = self._last_active.get(session_id)
+        return (session_id not in self._busy and last_active is not None
+                and time.monotonic() - last_active >= self.idle_seconds)
+
+    async def evict(self, session_id: str, data: dict) -> bool:
+        """Save and drop an idle session's runtime objects; False if a turn started meanwhile."""
+        await self.save(session_id, data)
+        # A message may have arrived while the state was being written: that turn keeps its agent
+        if not self._idle(session_id):
+            return False
+        # Drop the objects before awaiting cleanup, so a turn starting now rebuilds instead of using them
+        mcp_servers = data.get("mcp_servers") or []
+        for key in RUNTIME_KEYS + ("history",):
+            data.pop(key, None)
+        self._last_active.pop(session_id, None)
+        await self.cleanup(mcp_servers)
+        self.evictions += 1
+        print(f"💤 Evicted idle session {session_id}")
+        return True
+
+    def gauge(self, sessions: dict) -> dict:
+        """Memory-per-session gauge over the live session dicts."""
+        resident = {
+            session_id: estimate_bytes(data)
+            for session_id, data in sessions.items()
+            if data.get("TutorAgent") is not None
+        }
+        total = sum(resident.values())
+        return {
+            "sessions": len(sessions),
+            "resident_sessions": len(resident),
+            "resident_bytes": total,
+            "bytes_per_session": total // len(resident) if resident else 0,
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+        }
+
+    def start(self, sessions: dict):
+        """Start the background sweep over `sessions` (session_id -> session dict) once."""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever(sessions))
+
+    async def _sweep_forever(self, sessions: dict):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                await self.sweep(sessions)
+            except Exception as e:
+                print(f"⚠️ Session sweep failed: {e}")
+
+    async def sweep(self, sessions: dict):
+        for session_id in list(self._last_active):
+            if not self._idle(session_id):
+                continue
+            data = sessions.get(session_id)
+            if data is None:
+                self.forget(session_id)
+            elif data.get("TutorAgent") is not None:
+                await self.evict(session_id, data)
+        print(f"📏 Session memory: {self.gauge(sessions)}")
@@ -0,0 +1,57 @@
+# startup_profile.py
+# Import-time breakdown for the UI or MCP process, using `python -X importtime`.
+#
+#   python startup_profile.py ui                        # Chainlit UI module
+#   python startup_profile.py main                      # agent setup only
+#   python startup_profile.py main --cwd ../MCP_tools   # MCP server
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+
+def profile_imports(module: str, cwd: str = ".") -> list[tuple[str, int, int]]:
+    """Return (module, self_us, cumulative_us) for every import made by `import module`."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:])
+        raise SystemExit(f"❌ import {module} failed (exit {completed.returncode})")
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown of a tutor process")
+    parser.add_argument("module", help="module to import, e.g. ui or main")
+    parser.add_argument("--cwd", default=".", help="directory to import from")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module, args.cwd)
+
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    total_us = sum(by_package.values())
+
+    print(f"📦 import {args.module}: {total_us / 1000:.0f} ms over {len(rows)} modules\n")
+    print(f"{'package':<30}{'self ms':>10}{'share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<30}{self_us / 1000:>10.1f}{100 * self_us / total_us:>7.1f}%")
+
+    print(f"\n{'slowest modules (cumulative)':<50}{'ms':>10}")
+    for name, _, cumulative_us in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f"{name:<50}{cumulative_us / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# teaching_flow.py
+import os
+import re
+import time
+
+from router import ROUTE_ACK, ROUTE_TEACHING, ROUTE_TOC, render_toc
+
+# Server-side teaching flow: greeting → TOC → lesson selection → fetch content → teach.
+# Navigation turns are answered directly (TOC) or with one tool-free model call
+# whose lesson text the server already fetched; questions still go to the full agent.
+STEP_TOC = "toc"          # next "yes/continue" shows the course outline
+STEP_SELECT = "select"    # next "yes/continue" (or a topic name / number) opens a topic
+STEP_TEACH = "teach"      # next "yes/continue" teaches the following lesson section
+
+ROUTE_FLOW = "flow"
+
+# Sections up to this size are one teaching step; larger ones are split into their subsections
+FLOW_STEP_TOKENS = int(os.getenv("FLOW_STEP_TOKENS", "900"))
+FLOW_PIECE_MAX_BYTES = int(os.getenv("FLOW_PIECE_MAX_BYTES", "6000"))
+FLOW_OUTLINE_TTL = float(os.getenv("FLOW_OUTLINE_TTL", "300"))
+# A split section's own text (before its first subsection) is taught as a step when it is at least this long
+_MIN_INTRO_TOKENS = 25
+
+_PIECE_REQUEST = re.compile(r"\b(examples?|exercises?|quiz|practice)\b")
+_SKIP_SECTIONS = re.compile(r"table of contents|^contents$", re.IGNORECASE)
+# "open", "let's start the topic", "go to lesson" ... before a topic name
+_SELECT_PREFIX = re.compile(
+    r"^(?:let'?s\s+)?(?:open|start|begin|do|study|learn|go to|teach me|continue with)?\s*"
+    r"(?:the\s+)?(?:topic|module|lesson)?\s*"
+)
+
+# Outlines are cached by content hash, so topics teaching the same lessons share one entry
+_outlines: dict[str, tuple[float, dict]] = {}
+_content_hashes: dict[str, str] = {}  # topic_id -> content hash, learned from TOCs and outlines
+
+
+def initial_flow_state(profile: dict) -> dict:
+    """First sessions start at the TOC; returning students continue their current topic."""
+    topic_id = (profile.get("active_cursor_position") or {}).get("topic_id")
+    if profile.get("is_first_session") or not topic_id:
+        return {"step": STEP_TOC, "topic_id": topic_id}
+    return {"step": STEP_SELECT, "topic_id": topic_id}
+
+
+def requested_piece(user_input: str) -> str | None:
+    """"show me an example" → "example", "give me an exercise / a quiz" → "exercise" (short requests only)."""
+    text = user_input.lower()
+    match = _PIECE_REQUEST.search(text)
+    if match is None or len(text.split()) > 8:
+        return None
+    return "example" if match.group(1).startswith("example") else "exercise"
+
+
+def mentioned_topic(user_input: str, modules: list) -> str | None:
+    """
+    A topic picked by TOC number ("2", "topic 2") or by naming it: the whole
+    message, after "open" / "let's start" etc., is its id or title. A question
+    that merely mentions a topic ("what is mcp?") is not a pick.
+    """
+    text = " ".join(user_input.lower().split())
+    number = re.fullmatch(r"(?:topic|module|lesson|start|open)?\s*#?(\d+)\W*", text)
+    if number and 1 <= int(number.group(1)) <= len(modules):
+        return modules[int(number.group(1)) - 1][0]
+    name = _SELECT_PREFIX.sub("", text).strip(" .!?")
+    for topic_id, description in modules:
+        names = {topic_id.lower(), re.sub(r"^\d+_", "", topic_id.lower()).replace("_", " ")}
+        if description:
+            names.add(description.lower())
+        if name in names:
+            return topic_id
+    return None
+
+
+def _subtree_end(sections: list[dict], i: int) -> int:
+    end = i + 1
+    while end < len(sections) and sections[i]["level"] and sections[end]["level"] > sections[i]["level"]:
+        end += 1
+    return end
+
+
+def lesson_steps(sections: list[dict]) -> list[tuple[int, bool]]:
+    """
+    (section number, intro only) pairs to teach in order: sections (level 2+)
+    small enough to be one step; otherwise the section's own text, when it
+    has any, followed by its subsections. Document titles are split the same
+    way, so their intro is taught too. TOCs are skipped.
+    """
+    steps = []
+    i = 0
+    while i < len(sections):
+        section = sections[i]
+        end = _subtree_end(sections, i)
+        if section["level"] and _SKIP_SECTIONS.search(section["title"]):
+            i = end
+            continue
+        if section["level"] >= 2 and (section["tokens"] <= FLOW_STEP_TOKENS or end == i + 1):
+            steps.append((i, False))
+            i = end
+            continue
+        # Outline tokens cover the subtree: the section's own share is what its direct children leave
+        own, child = section["tokens"], i + 1
+        while child < end:
+            own -= sections[child]["tokens"]
+            child = _subtree_end(sections, child)
+        if own >= _MIN_INTRO_TOKENS:
+            steps.append((i, True))
+        i += 1
+    return steps
+
+
+class FlowAction:
+    """
+    A navigation turn handled by the server: a direct reply, or context for
+    one model call (tool-free for ROUTE_FLOW, the full agent otherwise).
+    """
+
+    __slots__ = ("route", "reply", "context")
+
+    def __init__(self, route: str, reply: str | None = None, context: str | None = None):
+        self.route = route
+        self.reply = reply
+        self.context = context
+
+
+class TeachingFlow:
+    """
+    Tracks the student's step in `state` (a plain dict kept in the session)
+    and performs the navigation tool calls itself. `call(tool, arguments)`
+    calls a toolbox tool and returns its decoded JSON.
+    """
+
+    def __init__(self, call, state: dict, course_id: str, user_id: str, auth_token: str, student_name: str):
+        self.call = call
+        self.state = state
+        self.course_id = course_id
+        self.user_id = user_id
+        self.auth_token = auth_token
+        self.student_name = student_name
+
+    async def plan(self, route: str, user_input: str) -> FlowAction | None:
+        """What the server does for this turn, or None to let the agent handle it."""
+        step = self.state.get("step")
+        if route == ROUTE_TOC or (route == ROUTE_ACK and step == STEP_TOC):
+            return await self._show_toc()
+
+        if step == STEP_SELECT:
+            topic_id = None
+            if route != ROUTE_ACK:
+                topic_id = mentioned_topic(user_input, (await self._toc())["modules"])
+            if route == ROUTE_ACK or topic_id:
+                return await self._open_topic(topic_id or self.state.get("topic_id") or await self._first_topic())
+
+        if step == STEP_TEACH:
+            if route == ROUTE_ACK:
+                return await self._next_section()
+            piece = requested_piece(user_input)
+            if piece is not None:
+                return await self._piece(piece)
+        return None
+
+    async def _toc(self) -> dict:
+        toc = await self.call("get_table_of_contents", {"course_id": self.course_id, "user_id": self.user_id,
+                                                        "auth_token": self.auth_token, "compact": True})
+        # A topic whose files the server cannot read has a null hash: keep keying it by its id
+        _content_hashes.update((topic, digest) for topic, digest in (toc.get("content_hashes") or {}).items() if digest)
+        return toc
+
+    async def _first_topic(self) -> str:
+        return (await self._toc())["modules"][0][0]
+
+    async def _outline(self, topic_id: str) -> dict:
+        cached = _outlines.get(_content_hashes.get(topic_id, topic_id))
+        if cached is not None and time.monotonic() - cached[0] < FLOW_OUTLINE_TTL:
+            return cached[1]
+        outline = await self._lesson(topic_id, piece="outline")
+        if outline.get("content_hash"):
+            _content_hashes[topic_id] = outline["content_hash"]
+        _outlines[_content_hashes.get(topic_id, topic_id)] = (time.monotonic(), outline)
+        return outline
+
+    async def _lesson(self, topic_id: str, **arguments) -> dict:
+        return await self.call("get_lesson_piece", {
+            "topic_id": topic_id, "user_id": self.user_id, "auth_token": self.auth_token,
+            "max_bytes": FLOW_PIECE_MAX_BYTES, **arguments,
+        })
+
+    async def _show_toc(self) -> FlowAction:
+        toc = await self._toc()
+        self.state["step"] = STEP_SELECT
+        return FlowAction(ROUTE_TOC, reply=render_toc(toc, self.student_name))
+
+    async def _open_topic(self, topic_id: str) -> FlowAction:
+        outline = await self._outline(topic_id)
+        for resource in sorted(outline["resources"]):
+            steps = lesson_steps(outline["resources"][resource]["sections"])
+            if steps:
+                break
+        else:
+            raise ValueError(f"Topic {topic_id} has no lesson sections")
+        self.state.update(step=STEP_TEACH, topic_id=topic_id, content_hash=outline.get("content_hash"),
+                          resource=resource, section=steps[0][0], intro=steps[0][1], example=0, exercise=0)
+        subtopics = ", ".join(
+            f"{key}: {entry['title']}" for key, entry in sorted(outline["resources"].items())
+        )
+        return await self._teach(
+            f"Start topic {topic_id}. Remind the student where this sits in the course, list the subtopics "
+            f"({subtopics}), then teach the first section below."
+        )
+
+    async def _next_section(self) -> FlowAction:
+        topic_id = self.state["topic_id"]
+        outline = await self._outline(topic_id)
+        resources = sorted(outline["resources"])
+        position = resources.index(self.state["resource"]) if self.state.get("resource") in resources else 0
+        for resource in resources[position:]:
+            steps = lesson_steps(outline["resources"][resource]["sections"])
+            later = [s for s in steps if resource != self.state.get("resource") or s[0] > self.state["section"]]
+            if later:
+                self.state.update(resource=resource, section=later[0][0], intro=later[0][1])
+                return await self._teach("Continue with the next section below.")
+
+        # Topic finished: propose the next one in course order. The checkpoint needs tools,
+        # so this turn goes to the full agent (ROUTE_TEACHING), not the tool-free flow agent
+        modules = [topic for topic, _ in (await self._toc())["modules"]]
+        next_topic = modules[modules.index(topic_id) + 1] if topic_id in modules[:-1] else None
+        self.state.update(step=STEP_SELECT, topic_id=next_topic or topic_id, content_hash=None,
+                          resource=None, section=None, intro=False)
+        ending = f"The next topic is {next_topic}" if next_topic else "This was the last topic of the course"
+        return FlowAction(ROUTE_TEACHING, context=(
+            f"[TEACHING STEP] The student finished every section of topic {topic_id}. {ending}. "
+            f"Congratulate them briefly and offer the checkpoint quiz for {topic_id} (get_checkpoint, then "
+            "grade_checkpoint with their answers); if they would rather move on, ask if they are ready to continue."
+        ))
+
+    async def _piece(self, piece: str) -> FlowAction:
+        index = self.state.get(piece, 0)
+        try:
+            result = await self._lesson(self.state["topic_id"], piece=piece, index=index)
+        except ValueError:
+            if index == 0:
+                raise
+            # Shown them all: start over from the first one
+            index = 0
+            result = await self._lesson(self.state["topic_id"], piece=piece, index=0)
+        self.state[piece] = index + 1
+        return FlowAction(ROUTE_FLOW, context=(
+            f"[TEACHING STEP] The student asked for an {piece} "
+            f"({result['index'] + 1} of {result['total']}) from topic {self.state['topic_id']}: "
+            f"\"{result['title']}\". Use it now; for an exercise, ask the questions and wait for answers.\n\n"
+            f"{result['text']}"
+        ))
+
+    async def _teach(self, instruction: str) -> FlowAction:
+        intro = self.state.get("intro", False)
+        result = await self._lesson(self.state["topic_id"], piece="intro" if intro else "section",
+                                    resource=self.state["resource"], section=self.state["section"])
+        # An intro is the opening of a long section; its subsections are the next steps
+        part = "the introduction of section" if intro else "section"
+        return FlowAction(ROUTE_FLOW, context=(
+            f"[TEACHING STEP] {instruction} Topic {self.state['topic_id']}, part {result['resource']}, "
+            f"{part} \"{result['title']}\". Teach one micro-step from this text only.\n\n{result['text']}"
+        ))
+
+
+def flow_input(runtime_input: str, action: FlowAction) -> str:
+    """Agent input for a flow turn: the student's message plus the content the server fetched."""
+    if action.route != ROUTE_FLOW:
+        # Handed to the full agent (end of topic): it may call tools
+        return f"{runtime_input}\n\n{action.context}"
+    return (
+        f"{runtime_input}\n\n{action.context}\n\n"
+        "[SERVER NOTE] The lesson content above was already fetched for you; do not call tools this turn."
+    )
@@ -0,0 +1,30 @@
+import asyncio
+
+from delivery import StreamDelivery, delivery_stats
+
+
+class BrokenMessage:
+    """A Chainlit message whose websocket went away after the first token."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def stream_token(self, token):
+        if self.sent:
+            raise ConnectionError("websocket closed")
+        self.sent.append(token)
+
+
+def test_close_survives_a_dead_sender():
+    async def scenario():
+        msg = BrokenMessage()
+        stream = StreamDelivery(msg, "session-1")
+        for token in ("a", "b", "c"):
+            stream.put(token)
+        await asyncio.sleep(0.01)
+        # Must return normally so the caller can send the final update and write the ledger
+        await stream.close(drain_seconds=0.1)
+        assert msg.sent == ["a"]
+        assert "session-1" not in delivery_stats.snapshot()["depth_by_session"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,149 @@
+import asyncio
+
+from agents import Model
+
+from hedging import HedgedModel
+
+
+class FakeModel(Model):
+    """Streams `events` after `delay` seconds, or raises when `fail` is set; records cancellation."""
+
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False, events=("Hello", " there")):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.events = events
+        self.started = 0
+        self.cancelled = 0
+        self.closed = 0
+
+    async def _wait(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+
+    async def get_response(self, *args, **kwargs):
+        await self._wait()
+        return self.name
+
+    async def stream_response(self, *args, **kwargs):
+        try:
+            await self._wait()
+            for event in self.events:
+                yield f"{self.name}:{event}"
+        finally:
+            self.closed += 1
+
+
+def hedged(primary: FakeModel, secondary: FakeModel) -> HedgedModel:
+    return HedgedModel(primary, secondary, initial_delay=0.05)
+
+
+async def collect(model: HedgedModel) -> list[str]:
+    return [event async for event in model.stream_response()]
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = FakeModel("primary"), FakeModel("secondary")
+    model = hedged(primary, secondary)
+    assert asyncio.run(collect(model)) == ["primary:Hello", "primary: there"]
+    assert model.hedged == 0 and secondary.started == 0
+
+
+def test_slow_first_token_hedges_and_cancels_the_loser():
+    primary, secondary = FakeModel("primary", delay=5), FakeModel("secondary")
+    model = hedged(primary, secondary)
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        events = await collect(model)
+        return events, asyncio.get_running_loop().time() - started
+
+    events, elapsed = asyncio.run(scenario())
+    assert events == ["secondary:Hello", "secondary: there"]
+    assert elapsed < 1
+    assert model.hedged == 1 and model.secondary_wins == 1
+    assert primary.cancelled == 1 and primary.closed == 1
+
+
+def test_failed_primary_falls_back_without_waiting_for_hedge_delay():
+    primary, secondary = FakeModel("primary", fail=True), FakeModel("secondary")
+    model = HedgedModel(primary, secondary, initial_delay=5)
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        events = await collect(model)
+        return events, asyncio.get_running_loop().time() - started
+
+    events, elapsed = asyncio.run(scenario())
+    assert events == ["secondary:Hello", "secondary: there"]
+    assert elapsed < 1
+
+
+def test_get_response_hedge_cancels_slow_primary():
+    primary, secondary = FakeModel("primary", delay=5), FakeModel("secondary")
+    model = hedged(primary, secondary)
+
+    async def scenario():
+        result = await model.get_response()
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == "secondary"
+    assert primary.cancelled == 1
+
+
+def test_both_failing_surfaces_primary_error():
+    primary, secondary = FakeModel("primary", fail=True), FakeModel("secondary", fail=True)
+    model = hedged(primary, secondary)
+    try:
+        asyncio.run(model.get_response())
+    except RuntimeError as e:
+        assert "primary failed" in str(e)
+    else:
+        raise AssertionError("expected the primary's error")
+
+
+def test_primary_latency_is_recorded_when_the_secondary_wins():
+    primary, secondary = FakeModel("primary", delay=5), FakeModel("secondary")
+    model = hedged(primary, secondary)
+    asyncio.run(collect(model))
+    # At least the hedge delay: slow primaries keep pushing the percentile up
+    assert len(model._first_token_latencies) == 1
+    assert model._first_token_latencies[0] >= 0.05
+
+
+def test_failed_primary_adds_no_latency_sample():
+    primary, secondary = FakeModel("primary", fail=True), FakeModel("secondary")
+    model = hedged(primary, secondary)
+    asyncio.run(collect(model))
+    assert len(model._first_token_latencies) == 0
+
+
+def test_queue_wait_before_the_primary_is_admitted_does_not_hedge():
+    from limiter import ProviderLimiter
+    from models import LimitedModel
+
+    limiter = ProviderLimiter("test", max_concurrency=1)
+    primary, secondary = FakeModel("primary", delay=0.01), FakeModel("secondary")
+    model = HedgedModel(LimitedModel(primary, limiter), secondary, initial_delay=0.05, waits_for_slot=True)
+
+    async def scenario():
+        # Another student holds the only slot for longer than the hedge delay
+        async def busy():
+            async with limiter.slot("other"):
+                await asyncio.sleep(0.2)
+
+        other = asyncio.create_task(busy())
+        await asyncio.sleep(0)
+        events = await collect(model)
+        await other
+        return events
+
+    assert asyncio.run(scenario()) == ["primary:Hello", "primary: there"]
+    assert model.hedged == 0 and secondary.started == 0
@@ -0,0 +1,76 @@
+import asyncio
+
+import main
+
+
+class FakeSession:
+    def __init__(self, alive: bool = True):
+        self.alive = alive
+
+    async def send_ping(self):
+        if not self.alive:
+            # A session torn down by a transport error never answers
+            await asyncio.sleep(60)
+
+
+class FakeServer:
+    """Stand-in for MCPServerStreamableHttp: `session` is None until connected."""
+
+    def __init__(self, name: str, reconnects: bool = True):
+        self.name = name
+        self.reconnects = reconnects
+        self.session = FakeSession()
+        self.connects = 0
+
+    async def connect(self):
+        if not self.reconnects:
+            raise ConnectionError("still down")
+        self.connects += 1
+        self.session = FakeSession()
+
+    async def cleanup(self):
+        self.session = None
+
+
+def pooled(monkeypatch, **servers):
+    monkeypatch.setattr(main, "MCP_POOL", True)
+    monkeypatch.setattr(main, "MCP_POOL_PING_SECONDS", 0.05)
+    monkeypatch.setattr(main, "_pool_lock", None)
+    monkeypatch.setattr(main, "_pooled_servers", dict(servers))
+    fresh = []
+
+    async def connect_mcp_server(name):
+        server = FakeServer(name)
+        fresh.append(server)
+        return server
+
+    monkeypatch.setattr(main, "connect_mcp_server", connect_mcp_server)
+    return fresh
+
+
+def test_live_pooled_servers_are_reused(monkeypatch):
+    toolbox, search = FakeServer("TutorMCPToolbox"), FakeServer("TavilySearchMCP")
+    fresh = pooled(monkeypatch, TutorMCPToolbox=toolbox, TavilySearchMCP=search)
+    servers = asyncio.run(main.get_mcp_servers())
+    assert servers == [toolbox, search]
+    assert fresh == [] and toolbox.connects == 0
+
+
+def test_dead_pooled_server_is_reconnected_in_place(monkeypatch):
+    toolbox, search = FakeServer("TutorMCPToolbox"), FakeServer("TavilySearchMCP")
+    toolbox.session.alive = False
+    pooled(monkeypatch, TutorMCPToolbox=toolbox, TavilySearchMCP=search)
+    servers = asyncio.run(main.get_mcp_servers())
+    # Agents already holding this object see the new connection too
+    assert servers[0] is toolbox
+    assert toolbox.connects == 1 and toolbox.session.alive
+
+
+def test_dead_pooled_server_that_cannot_reconnect_is_replaced(monkeypatch):
+    toolbox, search = FakeServer("TutorMCPToolbox", reconnects=False), FakeServer("TavilySearchMCP")
+    toolbox.session.alive = False
+    fresh = pooled(monkeypatch, TutorMCPToolbox=toolbox, TavilySearchMCP=search)
+    servers = asyncio.run(main.get_mcp_servers())
+    assert [server.name for server in fresh] == ["TutorMCPToolbox"]
+    by_name = {server.name: server for server in servers}
+    assert by_name == {"TutorMCPToolbox": fresh[0], "TavilySearchMCP": search}
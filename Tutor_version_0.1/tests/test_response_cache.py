@@ -0,0 +1,24 @@
+from response_cache import ResponseCache
+
+QUESTION = "What are the six parts of a good prompt framework?"
+
+
+def test_stored_answers_never_replay_a_students_alias():
+    cache = ResponseCache()
+    answer = "Great question, Mustafa! Muhammad, the six parts are role, task, context, format, tone, examples."
+    assert cache.store("scope", QUESTION, answer, "Muhammad Mustafa", aliases=("Mustafa",))
+    replayed = cache.lookup("scope", QUESTION, "Ann Lee")
+    assert "Mustafa" not in replayed and "Muhammad" not in replayed
+    assert replayed.startswith("Great question, Ann! Ann, the six parts")
+
+
+def test_names_are_slotted_as_whole_words_only():
+    cache = ResponseCache()
+    cache.store("scope", QUESTION, "Ann, annotate each part.", "Ann Lee")
+    assert cache.lookup("scope", QUESTION, "Bo Chen") == "Bo, annotate each part."
+
+
+def test_near_duplicates_do_not_match_across_a_negation():
+    cache = ResponseCache()
+    cache.store("scope", "why is context engineering important for agents", "Because ...", "Ann Lee")
+    assert cache.lookup("scope", "why is context engineering not important for agents", "Ann Lee") is None
@@ -0,0 +1,187 @@
+import asyncio
+
+from mcp.types import CallToolResult, TextContent
+
+from search_guard import CircuitBreaker, GuardedMCPServer
+
+
+class FakeSearchServer:
+    """Stand-in for the Tavily MCP server; `mode` decides how call_tool behaves."""
+
+    name = "FakeSearch"
+
+    def __init__(self, mode: str = "ok", delay: float = 1.0):
+        self.mode = mode
+        self.delay = delay
+        self.calls = 0
+        self.listings = 0
+
+    async def list_tools(self, run_context=None, agent=None):
+        self.listings += 1
+        return ["tavily_search"]
+
+    async def call_tool(self, tool_name, arguments):
+        self.calls += 1
+        if self.mode == "slow":
+            await asyncio.sleep(self.delay)
+        if self.mode == "raise":
+            raise ConnectionError("upstream down")
+        text = f"results for {arguments['query']}"
+        return CallToolResult(content=[TextContent(type="text", text=text)], isError=self.mode == "error")
+
+
+def guarded(mode: str = "ok", failures: int = 3) -> tuple[GuardedMCPServer, FakeSearchServer]:
+    inner = FakeSearchServer(mode)
+    return GuardedMCPServer(inner, timeout=0.05, breaker=CircuitBreaker(failures, cooldown=60)), inner
+
+
+def fast_forward(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.cooldown
+
+
+def test_timeouts_open_breaker_even_with_listings_in_between():
+    async def scenario():
+        server, inner = guarded("slow")
+        for i in range(3):
+            # The SDK lists tools before every model call
+            assert await server.list_tools() == ["tavily_search"]
+            result = await server.call_tool("tavily_search", {"query": f"q{i}"})
+            assert result.isError
+        assert server.breaker.state == "open"
+        assert await server.list_tools() == []
+
+    asyncio.run(scenario())
+
+
+def test_open_breaker_refuses_calls_without_waiting_on_upstream():
+    async def scenario():
+        server, inner = guarded("raise", failures=1)
+        await server.call_tool("tavily_search", {"query": "a"})
+        assert server.breaker.state == "open"
+        result = await server.call_tool("tavily_search", {"query": "b"})
+        assert result.isError and "temporarily unavailable" in result.content[0].text
+        assert inner.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_half_open_trial_success_closes():
+    async def scenario():
+        server, inner = guarded("raise", failures=1)
+        await server.call_tool("tavily_search", {"query": "a"})
+        fast_forward(server.breaker)
+        assert server.breaker.state == "half-open"
+        # Listing does not use up the single trial call
+        assert await server.list_tools() == ["tavily_search"]
+        inner.mode = "ok"
+        result = await server.call_tool("tavily_search", {"query": "a"})
+        assert not result.isError
+        assert server.breaker.state == "closed" and server.breaker.failures == 0
+
+    asyncio.run(scenario())
+
+
+def test_half_open_allows_one_trial_and_failure_reopens():
+    async def scenario():
+        server, inner = guarded("slow", failures=1)
+        await server.call_tool("tavily_search", {"query": "a"})
+        fast_forward(server.breaker)
+        trial = asyncio.ensure_future(server.call_tool("tavily_search", {"query": "a"}))
+        await asyncio.sleep(0)
+        refused = await server.call_tool("tavily_search", {"query": "b"})
+        assert "temporarily unavailable" in refused.content[0].text
+        assert (await trial).isError
+        assert server.breaker.state == "open"
+        assert inner.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_error_results_count_as_failures_and_are_not_cached():
+    async def scenario():
+        server, inner = guarded("error", failures=2)
+        await server.call_tool("tavily_search", {"query": "a"})
+        await server.call_tool("tavily_search", {"query": "a"})
+        assert inner.calls == 2
+        assert server.breaker.state == "open"
+        assert server.stats()["cache_entries"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_successful_results_are_cached_by_normalized_arguments():
+    async def scenario():
+        server, inner = guarded("ok")
+        first = await server.call_tool("tavily_search", {"query": "Prompt  Engineering"})
+        second = await server.call_tool("tavily_search", {"query": "prompt engineering"})
+        assert second is first
+        assert inner.calls == 1 and server.cache_hits == 1
+
+    asyncio.run(scenario())
+
+
+def test_hung_listing_trips_its_own_breaker_only():
+    async def scenario():
+        server, inner = guarded("ok", failures=1)
+
+        async def hang(run_context=None, agent=None):
+            await asyncio.sleep(1)
+
+        inner.list_tools = hang
+        assert await server.list_tools() == []
+        assert server.list_breaker.state == "open"
+        assert server.breaker.state == "closed"
+        # Calls still go through while the listing breaker is open
+        assert not (await server.call_tool("tavily_search", {"query": "a"})).isError
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_half_open_trial_is_released():
+    async def scenario():
+        server, inner = guarded("raise", failures=1)
+        await server.call_tool("tavily_search", {"query": "a"})
+        fast_forward(server.breaker)
+        inner.mode, inner.delay = "slow", 1.0
+        # The student sends a new message while the trial search is running
+        trial = asyncio.create_task(server.call_tool("tavily_search", {"query": "a"}))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        try:
+            await trial
+        except asyncio.CancelledError:
+            pass
+        # The cancelled trial counts as a failure: open again, and a later trial is possible
+        assert server.breaker.state == "open"
+        fast_forward(server.breaker)
+        inner.mode = "ok"
+        assert not (await server.call_tool("tavily_search", {"query": "b"})).isError
+        assert server.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_half_open_listing_is_released():
+    async def scenario():
+        server, inner = guarded("ok", failures=1)
+        listed = inner.list_tools
+
+        async def hang(run_context=None, agent=None):
+            await asyncio.sleep(1)
+
+        inner.list_tools = hang
+        assert await server.list_tools() == []
+        fast_forward(server.list_breaker)
+        listing = asyncio.create_task(server.list_tools())
+        await asyncio.sleep(0.01)
+        listing.cancel()
+        try:
+            await listing
+        except asyncio.CancelledError:
+            pass
+        fast_forward(server.list_breaker)
+        inner.list_tools = listed
+        assert await server.list_tools() == ["tavily_search"]
+        assert server.list_breaker.state == "closed"
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+import asyncio
+
+import uploads
+from uploads import NotesIndex, UploadPipeline, student_usage
+
+
+async def no_report(text):
+    pass
+
+
+def ingest(*files) -> list:
+    batch = [(name, data, len(data)) for name, data in files]
+    return asyncio.run(UploadPipeline().ingest("ada", batch, no_report))
+
+
+def test_failed_index_leaves_nothing_on_the_quota(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    # A .txt name with binary content: copied, then refused by the indexer
+    [job] = ingest(("notes.txt", b"\x00\x01binary" * 1000))
+    assert job.status == "failed"
+    assert not list((tmp_path / "ada" / "files").iterdir())
+    # Only the notes index counts against the quota, not the copy
+    index_bytes = sum(path.stat().st_size for path in (tmp_path / "ada").glob("notes.db*"))
+    assert student_usage("ada") == index_bytes
+    assert NotesIndex("ada").files()[0]["status"] == "failed"
+
+
+def test_indexed_upload_is_kept_and_searchable(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    [job] = ingest(("notes.md", b"Few-shot prompting uses worked examples.\n"))
+    assert job.status == "done"
+    assert len(list((tmp_path / "ada" / "files").iterdir())) == 1
+    assert NotesIndex("ada").search("examples")[0]["file"] == "notes.md"
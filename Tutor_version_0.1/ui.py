@@ -1,18 +1,282 @@
 import chainlit as cl
+from chainlit.server import app
+from chainlit.user_session import user_sessions
 from contextlib import aclosing
-from agents import Runner
-from openai.types.responses import ResponseTextDeltaEvent
+from starlette.responses import JSONResponse
 import asyncio
 import json
+import os
+import threading
+import time
+from functools import partial
+
+# Import the agent setup (the agents SDK itself is loaded lazily, see main.warm_up)
+from main import get_tutor_agent, cleanup_mcp_servers, call_tool_json, get_toolbox_server, warm_up, is_ready
+from greeting_cache import greeting_cache, greeting_context
+from response_cache import content_scope, response_cache
+from limiter import LimiterBusy, current_student, queue_notifier, limiter_metrics
+from router import ROUTE_ACK, ROUTE_TEACHING, ROUTE_TOC, classify_turn, route_stats
+from teaching_flow import ROUTE_FLOW, STEP_SELECT, TeachingFlow, flow_input, initial_flow_state
+from usage import TurnUsage, estimate_tokens, usage_ledger
+from delivery import StreamDelivery, delivery_stats
+from session_store import IdleSessionManager, PERSISTED_KEYS, bounded_history, get_session_store
+from uploads import upload_pipeline
+
+BUSY_TEXT = "⚠️ The tutor is at capacity right now. Please try again in a minute."
+# Overall budget for one agent turn (model + tools); 0 disables it
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "90"))
+DEADLINE_NOTE = "\n\n_(⏱️ I ran out of time on this answer — reply **continue** and I'll pick up from here.)_"
+SUPERSEDED_NOTE = "\n\n_(⏹️ Stopped here to answer your newer message.)_"
+
+
+async def ready():
+    """Readiness probe for the load balancer: 503 until warm-up has finished."""
+    if is_ready():
+        return JSONResponse({"status": "ready"})
+    return JSONResponse({"status": "warming_up"}, status_code=503)
+
+
+async def session_metrics():
+    """Memory-per-session gauge and eviction counters of the idle-session manager."""
+    return JSONResponse(session_manager.gauge(user_sessions))
+
+
+async def delivery_metrics():
+    """Stream buffer depth per session and coalesced / dropped frame counters."""
+    return JSONResponse(delivery_stats.snapshot())
+
+
+async def upload_metrics():
+    """Background upload ingestion: active / queued files and totals."""
+    return JSONResponse(upload_pipeline.stats())
+
+
+async def route_metrics():
+    """Turns, average and max latency per turn route since startup."""
+    return JSONResponse(route_stats.summary())
+
+
+PROBE_ROUTES = {
+    "/ready": ready, "/metrics/sessions": session_metrics, "/metrics/delivery": delivery_metrics,
+    "/metrics/uploads": upload_metrics, "/metrics/routes": route_metrics,
+}
+for path, endpoint in PROBE_ROUTES.items():
+    app.add_api_route(path, endpoint, methods=["GET"])
+# Chainlit serves its frontend from a catch-all route; keep these routes in front of it
+app.router.routes[:0] = [app.router.routes.pop() for _ in PROBE_ROUTES][::-1]
+
+# Session state lives in the shared store (any replica can serve the next message);
+# idle sessions also give their agent objects back (and their MCP connections when MCP_POOL=0)
+session_manager = IdleSessionManager(get_session_store(), cleanup_mcp_servers)
+
+# Load the agent stack in the background so the process can accept
+# health checks immediately and the first student doesn't pay for imports
+threading.Thread(target=warm_up, name="tutor-warm-up", daemon=True).start()
+
+
+class QueueNotice:
+    """Shows a single "you're in queue" message while a turn waits for a model slot."""
+
+    def __init__(self):
+        self.message = None
+
+    async def notify(self, position: int):
+        if self.message is not None:
+            return
+        print(f"⏳ Queued for model slot at position {position}: {limiter_metrics()}")
+        self.message = cl.Message(
+            content=f"⏳ The tutor is busy right now — you're #{position} in the queue. Your answer will start shortly."
+        )
+        await self.message.send()
+
+    async def clear(self):
+        if self.message is not None:
+            await self.message.remove()
+            self.message = None
+
+
+class ActiveRun:
+    """The agent turn a session is streaming, so a newer message or a disconnect can stop it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.reason = None
+
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+            self.task.cancel()
+
+
+def cancel_active_run(reason: str):
+    """Stop the session's in-flight agent turn, if any (it keeps what was already streamed)."""
+    active = cl.user_session.get("ActiveRun")
+    if active is not None and not active.task.done():
+        print(f"🛑 Cancelling in-flight turn: {reason}")
+        active.cancel(reason)
+
+
+async def stream_agent_reply(TutorAgent, agent_input, Session, msg, USER_ID, label, route):
+    """Run the agent and stream its text into `msg`. Returns the full text."""
+    from agents import Runner
+    from openai.types.responses import ResponseTextDeltaEvent
+
+    recorder = cl.user_session.get("Recorder")
+    if recorder is not None:
+        recorder.record("turn_start", label=label, input=agent_input)
+    turn_started = time.monotonic()
+
+    notice = QueueNotice()
+    turn_usage = TurnUsage()
+    # Runner tasks copy the current context, so the limiter sees these
+    current_student.set(USER_ID)
+    queue_notifier.set(notice.notify)
+
+    ai_response = Runner.run_streamed(TutorAgent, agent_input, session=Session)
+    active = ActiveRun(asyncio.current_task())
+    cl.user_session.set("ActiveRun", active)
+
+    # Tokens go through a bounded buffer so a slow client never slows the model stream down
+    delivery = StreamDelivery(msg, cl.user_session.get("id"))
+    final_output = ""
+    cancelled = None
+    try:
+        async with asyncio.timeout(TURN_DEADLINE_SECONDS or None):
+            async with aclosing(ai_response.stream_events()) as events:
+                async for event in events:
+                    print(f"EVENT ({label}):", event.type)
+                    turn_usage.observe(event)
+                    if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                        await notice.clear()
+                        token = event.data.delta
+                        final_output += token
+                        delivery.put(token)
+                    await asyncio.sleep(0)  # Yield to prevent task cancellation
+    except TimeoutError:
+        # Keep whatever was streamed so far and stop the run
+        print(f"⏱️ Turn deadline of {TURN_DEADLINE_SECONDS}s reached ({len(final_output)} chars streamed)")
+        ai_response.cancel()
+        final_output += DEADLINE_NOTE
+        delivery.put(DEADLINE_NOTE)
+    except LimiterBusy as e:
+        print(f"🚦 Request shed by limiter: {e}")
+        final_output = final_output or BUSY_TEXT
+    except asyncio.CancelledError:
+        # Cancelling the run cancels its model stream (freeing the limiter slot) and pending tool calls
+        ai_response.cancel()
+        cancelled = active.reason or "stopped"
+        if active.reason is None:
+            # Not ours (stop button, shutdown): account for it and let the cancellation through
+            usage_ledger.record_cancelled(
+                cl.user_session.get("id"), USER_ID, route, cancelled,
+                turn_usage.tokens(ai_response), turn_usage.tool_payload_tokens, estimate_tokens(final_output),
+            )
+            raise
+        asyncio.current_task().uncancel()
+        if cancelled == "superseded":
+            final_output += SUPERSEDED_NOTE
+            delivery.put(SUPERSEDED_NOTE)
+    finally:
+        if cl.user_session.get("ActiveRun") is active:
+            cl.user_session.set("ActiveRun", None)
+        # Callers follow up with msg.update(), which delivers the complete text
+        await delivery.close()
+        await notice.clear()
+        if recorder is not None:
+            recorder.record("turn_end", label=label, output=final_output,
+                            duration=round(time.monotonic() - turn_started, 4))
+
+    if cancelled is not None:
+        usage_ledger.record_cancelled(
+            cl.user_session.get("id"), USER_ID, route, cancelled,
+            turn_usage.tokens(ai_response), turn_usage.tool_payload_tokens, estimate_tokens(final_output),
+        )
+        return final_output
+
+    warning = usage_ledger.record_turn(
+        cl.user_session.get("id"), USER_ID, route,
+        turn_usage.tokens(ai_response), turn_usage.tool_payload_tokens,
+    )
+    if warning:
+        await cl.Message(content=warning).send()
+    return final_output
+
+
+def is_complete_reply(text: str) -> bool:
+    """False for empty, shed, deadline-truncated or cancelled replies (never cache those)."""
+    return bool(text) and text != BUSY_TEXT and not text.endswith((DEADLINE_NOTE, SUPERSEDED_NOTE))
+
+
+async def get_cached_greeting(mcp_servers, USER_ID, AUTH_TOKEN):
+    """
+    Look up the student's place in the course with one direct tool call and
+    render a cached greeting for it. Returns (greeting, context, profile);
+    greeting is None on a cache miss, context is None for first sessions,
+    and everything is None if the lookup fails.
+    """
+    toolbox = get_toolbox_server(mcp_servers)
+    if toolbox is None:
+        return None, None, None
+    try:
+        profile = await call_tool_json(
+            toolbox, "get_student_profile", {"user_id": USER_ID, "auth_token": AUTH_TOKEN}
+        )
+    except Exception as e:
+        print(f"⚠️ Greeting cache lookup failed: {e}")
+        return None, None, None
+
+    context = greeting_context(profile)
+    if context is None:
+        return None, None, profile
+    return greeting_cache.render(**context), context, profile
+
+async def rehydrate_session() -> bool:
+    """
+    Rebuild the agent of a session this process does not hold (evicted while
+    idle, or started on another replica) from the shared session store.
+    """
+    state = await session_manager.load(cl.user_session.get("id"))
+    if state is None:
+        return False
+
+    TutorAgent, Session, USER_ID, COURSE_ID, AUTH_TOKEN, mcp_servers = await get_tutor_agent(cl.user_session.get("id"))
+    recorder = cl.user_session.get("Recorder")
+    if recorder is not None:
+        from recorder import attach_recorder
+        TutorAgent = attach_recorder(TutorAgent, recorder)
+
+    cl.user_session.set("TutorAgent", TutorAgent)
+    cl.user_session.set("Session", Session)
+    cl.user_session.set("AUTH_TOKEN", AUTH_TOKEN)
+    cl.user_session.set("mcp_servers", mcp_servers)
+    defaults = {"USER_ID": USER_ID, "COURSE_ID": COURSE_ID, "history": []}
+    for key in PERSISTED_KEYS:
+        value = state.get(key)
+        cl.user_session.set(key, value if value is not None else defaults.get(key))
+    print(f"♻️ Rehydrated session {cl.user_session.get('id')}")
+    return True
+
+
+async def save_session():
+    session_id = cl.user_session.get("id")
+    await session_manager.save(session_id, user_sessions.get(session_id, {}))
 
-# Import the agent setup
-from main import get_tutor_agent, cleanup_mcp_servers
 
 @cl.on_chat_start
 async def start():
+    session_manager.start(user_sessions)
+    await usage_ledger.load()
+    async with session_manager.turn(cl.user_session.get("id")):
+        # A reconnect routed to this replica continues where the student left off
+        if not await rehydrate_session():
+            await start_session()
+        await save_session()
+
+
+async def start_session():
     print("🔍 Starting new Chainlit session")
     try:
-        TutorAgent, Session, USER_ID, COURSE_ID, AUTH_TOKEN, mcp_servers = await get_tutor_agent()
+        TutorAgent, Session, USER_ID, COURSE_ID, AUTH_TOKEN, mcp_servers = await get_tutor_agent(cl.user_session.get("id"))
         cl.user_session.set("TutorAgent", TutorAgent)
         cl.user_session.set("Session", Session)
         cl.user_session.set("USER_ID", USER_ID)
@@ -20,6 +284,18 @@ async def start():
         cl.user_session.set("AUTH_TOKEN", AUTH_TOKEN)
         cl.user_session.set("mcp_servers", mcp_servers)
 
+        if os.getenv("TUTOR_RECORD_DIR"):
+            # Record this chat for offline replay (see recorder.py)
+            from recorder import attach_recorder, recorder_for_session
+            recorder = recorder_for_session(cl.user_session.get("id"), secrets=[AUTH_TOKEN])
+            recorder.record(
+                "session_start", agent_name=TutorAgent.name, instructions=TutorAgent.instructions,
+                mcp_servers=[server.name for server in mcp_servers],
+            )
+            TutorAgent = attach_recorder(TutorAgent, recorder)
+            cl.user_session.set("TutorAgent", TutorAgent)
+            cl.user_session.set("Recorder", recorder)
+
         # Debug: List available tools
         tools = await TutorAgent.get_all_tools(None)
         print(f"🛠️ Available tools: {tools}")
@@ -33,29 +309,45 @@ async def start():
 
         print("🚀 Sending greeting to TutorAgent:", initial_session_message)
 
-        # Placeholder
-        msg = cl.Message(content="(waiting for agent response...)")
-        await msg.send()
+        cached_greeting, greeting_ctx, profile = await get_cached_greeting(mcp_servers, USER_ID, AUTH_TOKEN)
+        profile = profile or {}
+        cl.user_session.set("STUDENT_NAME", profile.get("name", USER_ID))
+        cl.user_session.set("TOPIC_ID", (profile.get("active_cursor_position") or {}).get("topic_id", ""))
+        cl.user_session.set("FLOW", initial_flow_state(profile))
 
-        ai_response = Runner.run_streamed(TutorAgent, initial_session_message, session=Session)
+        if cached_greeting is not None:
+            print(f"⚡ Greeting cache hit ({greeting_cache.hits} hits / {greeting_cache.misses} misses)")
+            msg = cl.Message(content=cached_greeting)
+            await msg.send()
+            # Keep the agent's memory consistent with what the student saw
+            await Session.add_items([
+                {"role": "user", "content": initial_session_message},
+                {"role": "assistant", "content": cached_greeting},
+            ])
+        else:
+            # Placeholder
+            msg = cl.Message(content="(waiting for agent response...)")
+            await msg.send()
 
-        final_output = ""
-        async with aclosing(ai_response.stream_events()) as events:
-            async for event in events:
-                print("EVENT (on_chat_start):", event.type)
-                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-                    token = event.data.delta
-                    final_output += token
-                    await msg.stream_token(token)
-                await asyncio.sleep(0)  # Yield to prevent task cancellation
+            final_output = await stream_agent_reply(
+                TutorAgent, initial_session_message, Session, msg, USER_ID, "on_chat_start", "greeting"
+            )
 
-        msg.content = final_output or "(⚠️ No response from agent)"
-        await msg.update()
+            msg.content = final_output or "(⚠️ No response from agent)"
+            await msg.update()
+
+            if is_complete_reply(final_output) and greeting_ctx is not None:
+                greeting_cache.store(
+                    greeting_ctx["course_id"], greeting_ctx["topic_id"], greeting_ctx["level"],
+                    final_output, greeting_ctx["student_name"],
+                    # The agent's prompt names the student by USER_ID, which may differ from the profile name
+                    aliases=(USER_ID,),
+                )
 
         # Save history
         history = cl.user_session.get("history", [])
         history.append({"role": "assistant", "content": msg.content})
-        cl.user_session.set("history", history)
+        cl.user_session.set("history", bounded_history(history))
 
     except ValueError as ve:
         error_text = f"⚠️ Setup error: {str(ve)}"
@@ -70,19 +362,91 @@ async def start():
 
 @cl.on_chat_end
 async def end():
+    # The student is gone: stop any turn still streaming to them
+    cancel_active_run("disconnected")
     mcp_servers = cl.user_session.get("mcp_servers", [])
     print("🧹 Initiating cleanup in on_chat_end")
     await cleanup_mcp_servers(mcp_servers)
     cl.user_session.set("mcp_servers", [])
     print("🔌 Disconnected all MCP servers")
+    # Stored state stays until its TTL: the student may reconnect to another replica
+    session_manager.forget(cl.user_session.get("id"))
+    usage_ledger.end_session(cl.user_session.get("id"))
+    recorder = cl.user_session.get("Recorder")
+    if recorder is not None:
+        recorder.close()
+        cl.user_session.set("Recorder", None)
+
+def session_agent(TutorAgent, key: str, **overrides):
+    """A clone of the session's tutor agent with `overrides`, built once per session (and recorded if recording)."""
+    agent = cl.user_session.get(key)
+    if agent is None:
+        agent = TutorAgent.clone(**overrides)
+        recorder = cl.user_session.get("Recorder")
+        if recorder is not None:
+            from recorder import attach_recorder
+            agent = attach_recorder(agent, recorder)
+        cl.user_session.set(key, agent)
+    return agent
+
 
 @cl.on_message
 async def main(message: cl.Message):
+    # A newer message replaces the answer still streaming for the previous one
+    cancel_active_run("superseded")
+    async with session_manager.turn(cl.user_session.get("id")):
+        if cl.user_session.get("TutorAgent") is None:
+            await rehydrate_session()
+        # Attached files are indexed before the agent turn, so search_my_notes can already find them
+        searchable = await ingest_uploads(message) if message.elements else []
+        # A message with only files needs no agent turn, but the session is still saved
+        if message.content.strip():
+            await handle_message(message, searchable)
+        await save_session()
+
+
+async def ingest_uploads(message: cl.Message) -> list[str]:
+    """Index the message's files into the student's notes (with a progress message); returns the searchable ones."""
+    uploads = []
+    for element in message.elements or []:
+        if getattr(element, "path", None):
+            uploads.append((element.name, element.path, os.path.getsize(element.path)))
+        elif getattr(element, "content", None):
+            uploads.append((element.name, element.content, len(element.content)))
+    if not uploads:
+        return []
+
+    progress = cl.Message(content=f"📥 Indexing {len(uploads)} file(s) into your notes…")
+    await progress.send()
+
+    async def report(text: str):
+        progress.content = f"📥 Indexing your notes\n{text}"
+        await progress.update()
+
+    try:
+        jobs = await upload_pipeline.ingest(cl.user_session.get("USER_ID"), uploads, report)
+    except Exception as e:
+        print(f"⚠️ Upload ingestion failed: {e}")
+        progress.content = "⚠️ I couldn't index your files, please try again."
+        await progress.update()
+        return []
+    summary = "\n".join(job.describe() for job in jobs)
+    if any(job.status == "done" for job in jobs):
+        summary += "\n\nAsk me about them any time, I'll look things up in your notes."
+    progress.content = f"📥 Your notes\n{summary}"
+    await progress.update()
+    return [job.name for job in jobs if job.searchable]
+
+
+async def handle_message(message: cl.Message, uploaded_files: list[str] | None = None):
     TutorAgent = cl.user_session.get("TutorAgent")
     Session = cl.user_session.get("Session")
     USER_ID = cl.user_session.get("USER_ID")
     COURSE_ID = cl.user_session.get("COURSE_ID")
     AUTH_TOKEN = cl.user_session.get("AUTH_TOKEN")
+    STUDENT_NAME = cl.user_session.get("STUDENT_NAME", USER_ID)
+    TOPIC_ID = cl.user_session.get("TOPIC_ID", "")
+    CONTENT_HASH = (cl.user_session.get("FLOW") or {}).get("content_hash")
 
     if TutorAgent is None or Session is None:
         await cl.Message(content="⚠️ Agent not initialized. Please restart the chat.").send()
@@ -96,30 +460,86 @@ async def main(message: cl.Message):
         "user_input": user_input,
         "auth_token": AUTH_TOKEN
     }
+    if uploaded_files:
+        # Indexed before this turn (skipped / failed files left out); the agent reads them through search_my_notes
+        runtime_input["uploaded_files"] = uploaded_files
     runtime_input_str = json.dumps(runtime_input)
     print("🚀 Sending runtime input to TutorAgent:", runtime_input_str)
 
-    # Placeholder
-    msg = cl.Message(content="")
-    await msg.send()
+    started = time.perf_counter()
+    route = classify_turn(user_input)
+    direct_reply = None
+    agent_input = runtime_input_str
 
-    ai_response = Runner.run_streamed(TutorAgent, runtime_input_str, session=Session)
+    # Navigation turns (TOC, "continue", "show me an example") are run by the server-side
+    # teaching flow: a direct reply, or one tool-free model call with the lesson text injected
+    action = None
+    toolbox = get_toolbox_server(cl.user_session.get("mcp_servers", []))
+    if toolbox is not None:
+        # Work on a copy so a failed step leaves the stored state untouched
+        flow_state = dict(cl.user_session.get("FLOW") or {"step": STEP_SELECT, "topic_id": TOPIC_ID})
+        flow = TeachingFlow(partial(call_tool_json, toolbox), flow_state, COURSE_ID, USER_ID, AUTH_TOKEN, STUDENT_NAME)
+        try:
+            action = await flow.plan(route, user_input)
+        except Exception as e:
+            # Let the agent handle it (it has its own error wording)
+            print(f"⚠️ Teaching flow step failed, falling back to agent: {e}")
+        if action is not None:
+            cl.user_session.set("FLOW", flow.state)
+            TOPIC_ID = flow.state.get("topic_id") or TOPIC_ID
+            CONTENT_HASH = flow.state.get("content_hash")
+            cl.user_session.set("TOPIC_ID", TOPIC_ID)
 
-    final_output = ""
-    async with aclosing(ai_response.stream_events()) as events:
-        async for event in events:
-            print("EVENT (on_message):", event.type)
-            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-                token = event.data.delta
-                final_output += token
-                await msg.stream_token(token)
-            await asyncio.sleep(0)  # Yield to prevent task cancellation
-
-    msg.content = final_output or "(no response)"
-    await msg.update()
+    if action is not None and action.reply is not None:
+        direct_reply, route = action.reply, action.route
+    elif action is not None:
+        agent_input, route = flow_input(runtime_input_str, action), action.route
+    elif route == ROUTE_TOC:
+        route = ROUTE_TEACHING
+    elif route == ROUTE_TEACHING:
+        direct_reply = response_cache.lookup(content_scope(COURSE_ID, TOPIC_ID, CONTENT_HASH), user_input, STUDENT_NAME)
+        if direct_reply is not None:
+            route = "cache"
+            print(f"⚡ Response cache hit: {response_cache.stats()}")
+
+    if direct_reply is not None:
+        msg = cl.Message(content=direct_reply)
+        await msg.send()
+        # Keep the agent's memory consistent with what the student saw
+        await Session.add_items([
+            {"role": "user", "content": runtime_input_str},
+            {"role": "assistant", "content": direct_reply},
+        ])
+    else:
+        agent = TutorAgent
+        if route == ROUTE_ACK:
+            from models import get_fast_model
+            agent = session_agent(TutorAgent, "FastTutorAgent", model=get_fast_model())
+        elif route == ROUTE_FLOW:
+            # The server already fetched the lesson text: one model call, no tool round trips
+            agent = session_agent(TutorAgent, "FlowTutorAgent", mcp_servers=[], tools=[])
+
+        # Placeholder
+        msg = cl.Message(content="")
+        await msg.send()
+
+        final_output = await stream_agent_reply(
+            agent, agent_input, Session, msg, USER_ID, "on_message", route
+        )
+
+        msg.content = final_output or "(no response)"
+        await msg.update()
+
+        if route == ROUTE_TEACHING and action is None and is_complete_reply(final_output):
+            response_cache.store(content_scope(COURSE_ID, TOPIC_ID, CONTENT_HASH), user_input, final_output,
+                                 STUDENT_NAME, aliases=(USER_ID,))
+
+    route_stats.record(route, started, user_id=USER_ID)
+    if direct_reply is not None:
+        usage_ledger.record_turn(cl.user_session.get("id"), USER_ID, route)
 
     # Update history
     history = cl.user_session.get("history", [])
     history.append({"role": "user", "content": message.content})
     history.append({"role": "assistant", "content": msg.content})
-    cl.user_session.set("history", history)
\ No newline at end of file
+    cl.user_session.set("history", bounded_history(history))
\ No newline at end of file
@@ -0,0 +1,408 @@
+# uploads.py
+import asyncio
+import codecs
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
+# Student uploads: copied to UPLOAD_DIR/<student>/files/ and indexed into UPLOAD_DIR/<student>/notes.db (FTS5)
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# Larger files are skipped (keep .chainlit/config.toml max_size_mb at or below this)
+UPLOAD_MAX_FILE_MB = float(os.getenv("UPLOAD_MAX_FILE_MB", "50"))
+# Bytes read per step while copying / extracting; with the batch size this bounds memory per upload
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Disk one student's uploads and notes index may use; uploads past it are skipped
+UPLOAD_MAX_STUDENT_MB = float(os.getenv("UPLOAD_MAX_STUDENT_MB", "200"))
+# Files ingested at once across the whole process; the rest wait their turn
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", "2"))
+UPLOAD_PASSAGE_CHARS = int(os.getenv("UPLOAD_PASSAGE_CHARS", "1200"))
+UPLOAD_BATCH_PASSAGES = int(os.getenv("UPLOAD_BATCH_PASSAGES", "200"))
+UPLOAD_PROGRESS_SECONDS = float(os.getenv("UPLOAD_PROGRESS_SECONDS", "1"))
+
+TEXT_SUFFIXES = {
+    ".txt", ".md", ".markdown", ".rst", ".csv", ".tsv", ".json", ".jsonl", ".yaml", ".yml",
+    ".py", ".js", ".ts", ".java", ".c", ".cpp", ".h", ".go", ".rs", ".sql", ".html", ".htm", ".xml", ".ipynb",
+}
+
+# PDFs are indexed only when the optional pypdf package is installed (see .chainlit/config.toml accept)
+PDF_SUPPORTED = importlib.util.find_spec("pypdf") is not None
+
+_TAGS = re.compile(r"<[^>]+>")
+_WORDS = re.compile(r"\w+")
+
+
+def student_dir(user_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, re.sub(r"[^\w.-]", "_", user_id))
+
+
+def student_usage(user_id: str) -> int:
+    """Bytes on disk for a student: copied files plus the notes index."""
+    total = 0
+    for root, _, names in os.walk(student_dir(user_id)):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class UploadJob:
+    """Progress of one uploaded file, written by the worker thread and read by the progress reporter."""
+
+    __slots__ = ("name", "size", "copied", "passages", "status", "detail")
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.copied = 0
+        self.passages = 0
+        self.status = "queued"   # queued → copying → indexing → done / skipped / failed
+        self.detail = ""
+
+    def describe(self) -> str:
+        if self.status == "copying" and self.size:
+            return f"{self.name}: copying {self.copied * 100 // self.size}%"
+        if self.status == "indexing":
+            return f"{self.name}: indexing ({self.passages} passages so far)"
+        if self.status == "done":
+            return f"{self.name}: ✅ {self.passages} passages indexed"
+        return f"{self.name}: {self.status}{f' ({self.detail})' if self.detail else ''}"
+
+    @property
+    def searchable(self) -> bool:
+        """The file's text is in the notes index (indexed now, or already indexed before)."""
+        return self.status == "done" or self.detail == "already indexed"
+
+
+def copy_in_chunks(source, dest_dir: str, job: UploadJob, max_bytes: int, chunk_bytes: int = UPLOAD_CHUNK_BYTES) -> str:
+    """
+    Copy an upload (a path, or bytes Chainlit kept in memory) into dest_dir one
+    chunk at a time, hashing as it goes. Returns the sha256; the file is saved
+    as <sha256><suffix> so re-uploads of the same file are recognised.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if isinstance(source, (bytes, bytearray)):
+                view = memoryview(source)
+                chunks = (view[i:i + chunk_bytes] for i in range(0, len(view), chunk_bytes))
+                for chunk in chunks:
+                    _write_chunk(out, digest, chunk, job, max_bytes)
+            else:
+                with open(source, "rb") as f:
+                    for chunk in iter(lambda: f.read(chunk_bytes), b""):
+                        _write_chunk(out, digest, chunk, job, max_bytes)
+        sha256 = digest.hexdigest()
+        os.replace(tmp_path, os.path.join(dest_dir, sha256 + os.path.splitext(job.name)[1].lower()))
+        return sha256
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write_chunk(out, digest, chunk, job: UploadJob, max_bytes: int):
+    job.copied += len(chunk)
+    if job.copied > max_bytes:
+        raise ValueError(f"larger than {max_bytes // (1024 * 1024)} MB")
+    digest.update(chunk)
+    out.write(chunk)
+
+
+def iter_passages(path: str, passage_chars: int = UPLOAD_PASSAGE_CHARS, chunk_bytes: int = UPLOAD_CHUNK_BYTES):
+    """
+    Passages of about `passage_chars`, split at blank lines where possible,
+    decoded incrementally so only one chunk and one passage are in memory.
+    PDFs are read page by page when the optional `pypdf` package is installed.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".pdf":
+        yield from _pdf_passages(path, passage_chars)
+        return
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    with open(path, "rb") as f:
+        first = True
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            if first and b"\x00" in chunk[:8192]:
+                raise ValueError("binary file, no text to index")
+            first = False
+            buffer += decoder.decode(chunk)
+            while len(buffer) >= passage_chars * 2:
+                passage, buffer = _cut(buffer, passage_chars)
+                yield _clean(passage, suffix)
+    buffer += decoder.decode(b"", final=True)
+    while buffer.strip():
+        passage, buffer = _cut(buffer, passage_chars)
+        yield _clean(passage, suffix)
+
+
+def _cut(text: str, size: int) -> tuple[str, str]:
+    if len(text) <= size:
+        return text, ""
+    end = text.rfind("\n\n", size // 2, size)
+    if end == -1:
+        end = text.rfind(" ", size // 2, size)
+    end = size if end == -1 else end
+    return text[:end], text[end:].lstrip()
+
+
+def _clean(passage: str, suffix: str) -> str:
+    if suffix in (".html", ".htm", ".xml"):
+        passage = _TAGS.sub(" ", passage)
+    return " ".join(passage.split())
+
+
+def _pdf_passages(path: str, passage_chars: int):
+    try:
+        from pypdf import PdfReader  # optional dependency, only needed for PDF uploads
+    except ImportError:
+        raise ValueError("PDF text extraction needs `pip install pypdf`") from None
+    for page in PdfReader(path).pages:
+        text = page.extract_text() or ""
+        while text.strip():
+            passage, text = _cut(text, passage_chars)
+            yield " ".join(passage.split())
+
+
+class NotesIndex:
+    """A student's uploaded notes in a SQLite FTS5 index (one database file per student)."""
+
+    def __init__(self, user_id: str):
+        self.path = os.path.join(student_dir(user_id), "notes.db")
+
+    def connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                sha256 TEXT PRIMARY KEY, name TEXT NOT NULL, bytes INTEGER NOT NULL,
+                passages INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, indexed_at REAL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(name, text, sha256 UNINDEXED);
+            """
+        )
+        return conn
+
+    def has_file(self, sha256: str) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT status FROM files WHERE sha256 = ?", (sha256,)).fetchone()
+        finally:
+            conn.close()
+        return row is not None and row[0] == "done"
+
+    def index_file(self, sha256: str, name: str, path: str, job: UploadJob, batch: int = UPLOAD_BATCH_PASSAGES):
+        """Index a copied file's passages, committing every `batch` passages."""
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM passages WHERE sha256 = ?", (sha256,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO files (sha256, name, bytes, status) VALUES (?, ?, ?, 'indexing')",
+                    (sha256, name, os.path.getsize(path)),
+                )
+            pending = []
+            try:
+                for passage in iter_passages(path):
+                    if passage:
+                        pending.append((name, passage, sha256))
+                    if len(pending) >= batch:
+                        self._flush(conn, pending, job)
+                self._flush(conn, pending, job)
+            except Exception:
+                # Passages already committed would show up in search for a file that failed
+                with conn:
+                    conn.execute("DELETE FROM passages WHERE sha256 = ?", (sha256,))
+                    conn.execute("UPDATE files SET status = 'failed' WHERE sha256 = ?", (sha256,))
+                raise
+            with conn:
+                conn.execute(
+                    "UPDATE files SET status = 'done', passages = ?, indexed_at = ? WHERE sha256 = ?",
+                    (job.passages, time.time(), sha256),
+                )
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _flush(conn: sqlite3.Connection, pending: list, job: UploadJob):
+        if pending:
+            with conn:
+                conn.executemany("INSERT INTO passages (name, text, sha256) VALUES (?, ?, ?)", pending)
+            job.passages += len(pending)
+            pending.clear()
+
+    def search(self, query: str, limit: int = 5) -> list[dict]:
+        """Best-matching excerpts (FTS5 bm25), any query word matching."""
+        words = _WORDS.findall(query.lower())
+        if not words or not os.path.exists(self.path):
+            return []
+        match = " OR ".join(f'"{word}"' for word in words[:32])
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT name, snippet(passages, 1, '', '', ' … ', 48) FROM passages "
+                "WHERE passages MATCH ? ORDER BY bm25(passages) LIMIT ?",
+                (match, max(1, min(limit, 20))),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{"file": name, "excerpt": excerpt} for name, excerpt in rows]
+
+    def files(self) -> list[dict]:
+        if not os.path.exists(self.path):
+            return []
+        conn = self.connect()
+        try:
+            rows = conn.execute("SELECT name, bytes, passages, status FROM files ORDER BY indexed_at").fetchall()
+        finally:
+            conn.close()
+        return [{"file": name, "bytes": size, "passages": passages, "status": status}
+                for name, size, passages, status in rows]
+
+
+class UploadPipeline:
+    """
+    Ingests uploaded files in the background: at most `max_concurrent` files
+    at a time process-wide, each copied and indexed in a worker thread in
+    fixed-size chunks, so a large upload never blocks the event loop or
+    holds a whole file in memory. `report(text)` receives throttled progress.
+    """
+
+    def __init__(self, max_concurrent: int = UPLOAD_MAX_CONCURRENT, max_file_mb: float = UPLOAD_MAX_FILE_MB,
+                 max_student_mb: float = UPLOAD_MAX_STUDENT_MB):
+        self.max_concurrent = max_concurrent
+        self.max_bytes = int(max_file_mb * 1024 * 1024)
+        self.max_student_bytes = int(max_student_mb * 1024 * 1024)
+        self._slots = None
+        self._reserved: dict[str, int] = {}  # user_id -> bytes of that student's uploads in progress
+        self.active = 0
+        self.queued = 0
+        self.files_done = 0
+        self.files_failed = 0
+        self.bytes_ingested = 0
+
+    async def ingest(self, user_id: str, uploads: list[tuple[str, object, int]], report) -> list[UploadJob]:
+        """Ingest (name, path-or-bytes, size) uploads for a student; returns the finished jobs."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        jobs = [UploadJob(name, size) for name, _, size in uploads]
+        work = asyncio.gather(*(self._ingest_one(user_id, job, source) for job, (_, source, _) in zip(jobs, uploads)))
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(work), UPLOAD_PROGRESS_SECONDS)
+                break
+            except TimeoutError:
+                await report("\n".join(job.describe() for job in jobs))
+        await report("\n".join(job.describe() for job in jobs))
+        return jobs
+
+    async def _ingest_one(self, user_id: str, job: UploadJob, source):
+        if job.size > self.max_bytes:
+            job.status, job.detail = "skipped", f"larger than {self.max_bytes // (1024 * 1024)} MB"
+            return
+        suffix = os.path.splitext(job.name)[1].lower()
+        if suffix == ".pdf" and not PDF_SUPPORTED:
+            job.status, job.detail = "skipped", "PDF text extraction needs `pip install pypdf`"
+            return
+        if suffix not in TEXT_SUFFIXES | {".pdf"}:
+            job.status, job.detail = "skipped", "not a text, code or PDF file"
+            return
+        # Checked and reserved without an await in between, so concurrent uploads cannot both squeeze in
+        reserved = self._reserved.get(user_id, 0)
+        if student_usage(user_id) + reserved + job.size > self.max_student_bytes:
+            job.status, job.detail = "skipped", f"your notes are full ({self.max_student_bytes // (1024 * 1024)} MB)"
+            return
+        self._reserved[user_id] = reserved + job.size
+        try:
+            await self._ingest_reserved(user_id, job, source)
+        finally:
+            self._reserved[user_id] -= job.size
+            if not self._reserved[user_id]:
+                del self._reserved[user_id]
+
+    async def _ingest_reserved(self, user_id: str, job: UploadJob, source):
+        self.queued += 1
+        async with self._slots:
+            self.queued -= 1
+            self.active += 1
+            try:
+                await asyncio.to_thread(self._run, user_id, job, source)
+                self.files_done += 1
+                self.bytes_ingested += job.copied
+            except Exception as e:
+                job.status, job.detail = "failed", str(e)
+                self.files_failed += 1
+                print(f"⚠️ Upload {job.name} for {user_id} failed: {e}")
+            finally:
+                self.active -= 1
+
+    def _run(self, user_id: str, job: UploadJob, source):
+        job.status = "copying"
+        files_dir = os.path.join(student_dir(user_id), "files")
+        sha256 = copy_in_chunks(source, files_dir, job, self.max_bytes)
+        index = NotesIndex(user_id)
+        if index.has_file(sha256):
+            job.status, job.detail = "skipped", "already indexed"
+            return
+        job.status = "indexing"
+        path = os.path.join(files_dir, sha256 + os.path.splitext(job.name)[1].lower())
+        try:
+            index.index_file(sha256, job.name, path, job)
+        except Exception:
+            # An unindexed copy is unusable but would still count against the student's quota
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            raise
+        job.status = "done"
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "files_done": self.files_done,
+            "files_failed": self.files_failed,
+            "bytes_ingested": self.bytes_ingested,
+        }
+
+
+upload_pipeline = UploadPipeline()
+
+
+def notes_search_tool(user_id: str):
+    """The search_my_notes function tool, bound to one student's notes index."""
+    from agents import function_tool
+
+    index = NotesIndex(user_id)
+
+    async def search_my_notes(query: str, limit: int = 5) -> str:
+        """
+        Search the notes and files this student uploaded. Returns short excerpts
+        with their file names; quote or summarize them, never the whole file.
+
+        Args:
+            query: Words to look for.
+            limit: Maximum number of excerpts (1-20).
+        """
+        results = await asyncio.to_thread(index.search, query, limit)
+        if not results:
+            files = await asyncio.to_thread(index.files)
+            return json.dumps({"results": [], "files": [f["file"] for f in files]})
+        return json.dumps({"results": results})
+
+    return function_tool(search_my_notes)
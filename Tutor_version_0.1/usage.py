@@ -0,0 +1,318 @@
+# usage.py
+# Token accounting per turn, per tool payload, per session and per student.
+#
+#   python usage.py report                 # aggregate report of usage.jsonl
+#   python usage.py report other.jsonl --top 20
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+USAGE_LOG_PATH = os.getenv("USAGE_LOG_PATH", "usage.jsonl")
+# Daily token budget per student (input + output); 0 disables budget warnings
+TUTOR_TOKEN_BUDGET = int(os.getenv("TUTOR_TOKEN_BUDGET", "0"))
+TUTOR_BUDGET_WARN_RATIO = float(os.getenv("TUTOR_BUDGET_WARN_RATIO", "0.8"))
+# Write-behind: flush buffered records every N records or every N seconds
+USAGE_FLUSH_EVERY = int(os.getenv("USAGE_FLUSH_EVERY", "50"))
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "10"))
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for payloads the provider does not report on (≈4 chars per token)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class TurnUsage:
+    """Collects tool payload sizes from run stream events and the run's token usage."""
+
+    def __init__(self):
+        self._tool_names: dict[str, str] = {}
+        self.tool_payload_tokens: dict[str, int] = defaultdict(int)
+
+    def observe(self, event):
+        if event.type != "run_item_stream_event":
+            return
+        raw = event.item.raw_item
+        if event.name == "tool_called":
+            call_id = getattr(raw, "call_id", None) or getattr(raw, "id", None)
+            self._tool_names[call_id] = getattr(raw, "name", "unknown_tool")
+        elif event.name == "tool_output":
+            call_id = raw.get("call_id") if isinstance(raw, dict) else getattr(raw, "call_id", None)
+            name = self._tool_names.get(call_id, "unknown_tool")
+            self.tool_payload_tokens[name] += estimate_tokens(str(event.item.output))
+
+    def tokens(self, run_result) -> dict:
+        """Token usage reported by the provider for the whole run (all model calls)."""
+        usage = run_result.context_wrapper.usage
+        details = getattr(usage, "input_tokens_details", None)
+        return {
+            "requests": usage.requests,
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+        }
+
+
+class UsageLedger:
+    """
+    In-memory per-session / per-student totals with soft daily budgets.
+    Records are buffered and appended to a JSONL log in the background
+    (write-behind), so accounting never adds I/O to a turn. Only today's
+    student totals and live sessions are kept: a new day drops the previous
+    day's entries and `end_session` drops a session's totals.
+    """
+
+    def __init__(self, path: str = USAGE_LOG_PATH, budget: int = TUTOR_TOKEN_BUDGET,
+                 warn_ratio: float = TUTOR_BUDGET_WARN_RATIO):
+        self.path = path
+        self.budget = budget
+        self.warn_ratio = warn_ratio
+        self.sessions: dict[str, dict] = defaultdict(lambda: defaultdict(int))
+        self._student_day: dict[tuple[str, str], int] = defaultdict(int)
+        self._warned: set[tuple[str, str, str]] = set()
+        self._day = time.strftime("%Y-%m-%d")
+        self._buffer: list[dict] = []
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._loaded = False
+        # Completed agent turns, for estimating what a cancelled turn would have cost
+        self._completed_turns = 0
+        self._completed_output_tokens = 0
+        self.cancelled: dict[str, int] = defaultdict(int)
+        self.tokens_avoided = 0
+
+    def record_turn(self, session_id: str, user_id: str, route: str,
+                    tokens: dict | None = None, tool_payload_tokens: dict | None = None,
+                    cancelled: str | None = None, tokens_avoided: int = 0) -> str | None:
+        """
+        Account one turn. Returns a soft budget warning for the student the
+        first time they cross the warning ratio or the budget today, else None.
+        """
+        self._load_today()
+        tokens = tokens or {}
+        record = {
+            "ts": time.time(),
+            "day": self._today(),
+            "session_id": session_id,
+            "user_id": user_id,
+            "route": route,
+            "requests": tokens.get("requests", 0),
+            "input_tokens": tokens.get("input_tokens", 0),
+            "output_tokens": tokens.get("output_tokens", 0),
+            "cached_tokens": tokens.get("cached_tokens", 0),
+            "tool_payload_tokens": dict(tool_payload_tokens or {}),
+        }
+        if cancelled:
+            record["cancelled"] = cancelled
+            record["tokens_avoided"] = tokens_avoided
+        elif record["requests"]:
+            self._completed_turns += 1
+            self._completed_output_tokens += record["output_tokens"]
+
+        session = self.sessions[session_id]
+        session["turns"] += 1
+        for key in ("requests", "input_tokens", "output_tokens", "cached_tokens"):
+            session[key] += record[key]
+
+        day_key = (user_id, record["day"])
+        self._student_day[day_key] += record["input_tokens"] + record["output_tokens"]
+
+        with self._lock:
+            self._buffer.append(record)
+            flush_now = len(self._buffer) >= USAGE_FLUSH_EVERY
+        if flush_now:
+            self._schedule_flush()
+        self._ensure_flusher()
+
+        return self._budget_warning(user_id, record["day"])
+
+    def record_cancelled(self, session_id: str, user_id: str, route: str, reason: str,
+                         tokens: dict | None = None, tool_payload_tokens: dict | None = None,
+                         streamed_tokens: int = 0) -> int:
+        """
+        Account a turn cut short (newer message, disconnect, stop button).
+        Returns the output tokens the cancel is estimated to have avoided:
+        an average completed turn's output minus what had already streamed.
+        """
+        self._load_today()
+        average = self._completed_output_tokens // self._completed_turns if self._completed_turns else 0
+        avoided = max(0, average - streamed_tokens)
+        self.cancelled[reason] += 1
+        self.tokens_avoided += avoided
+        self.record_turn(session_id, user_id, route, tokens, tool_payload_tokens,
+                         cancelled=reason, tokens_avoided=avoided)
+        print(f"🛑 Turn cancelled ({reason}); ~{avoided} output tokens avoided, {self.tokens_avoided} in total")
+        return avoided
+
+    def student_tokens_today(self, user_id: str) -> int:
+        self._load_today()
+        return self._student_day.get((user_id, self._today()), 0)
+
+    def end_session(self, session_id: str):
+        """Drop a finished chat's totals (its records stay in the log)."""
+        self.sessions.pop(session_id, None)
+
+    async def load(self):
+        """Rebuild today's totals from the log once, reading it on a worker thread."""
+        if self._loaded:
+            return
+        self._loaded = True
+        self._merge_log(*await asyncio.to_thread(self._read_log, self._today()))
+
+    def flush(self):
+        """Append buffered records to the log (blocking; run it in a thread)."""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if not records:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in records)
+        except OSError as e:
+            print(f"⚠️ Could not write usage log {self.path}: {e}")
+            with self._lock:
+                self._buffer[:0] = records
+
+    def _budget_warning(self, user_id: str, day: str) -> str | None:
+        if self.budget <= 0:
+            return None
+        used = self._student_day[(user_id, day)]
+        for level, threshold in (("over", self.budget), ("near", self.warn_ratio * self.budget)):
+            if used >= threshold:
+                if (user_id, day, level) in self._warned:
+                    return None
+                self._warned.add((user_id, day, level))
+                print(f"💸 {user_id} used {used} of {self.budget} tokens today ({level} budget)")
+                if level == "over":
+                    return "📊 Heads-up: you've reached today's study budget. I'll keep helping, but let's keep answers short."
+                return "📊 Heads-up: you've used most of today's study budget."
+        return None
+
+    def _today(self) -> str:
+        """Today's date; the first call on a new day drops the previous days' totals and warnings."""
+        today = time.strftime("%Y-%m-%d")
+        if today != self._day:
+            self._day = today
+            self._student_day = defaultdict(int, {k: v for k, v in self._student_day.items() if k[1] == today})
+            self._warned = {key for key in self._warned if key[1] == today}
+        return today
+
+    def _load_today(self):
+        # Budgets survive restarts: rebuild today's per-student totals from the log once.
+        # The UI awaits load() first; this blocking read is the fallback outside an event loop
+        if self._loaded:
+            return
+        self._loaded = True
+        self._merge_log(*self._read_log(self._today()))
+
+    def _read_log(self, today: str) -> tuple[dict, int, int]:
+        student_day, turns, output_tokens = defaultdict(int), 0, 0
+        if not os.path.exists(self.path):
+            return student_day, turns, output_tokens
+        for record in read_records(self.path):
+            if record.get("day") == today:
+                student_day[(record["user_id"], today)] += record["input_tokens"] + record["output_tokens"]
+            if record["requests"] and not record.get("cancelled"):
+                turns += 1
+                output_tokens += record["output_tokens"]
+        return student_day, turns, output_tokens
+
+    def _merge_log(self, student_day: dict, turns: int, output_tokens: int):
+        for key, used in student_day.items():
+            if key[1] == self._day:
+                self._student_day[key] += used
+        self._completed_turns += turns
+        self._completed_output_tokens += output_tokens
+
+    def _schedule_flush(self):
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self.flush)
+        except RuntimeError:
+            self.flush()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and not self._flusher.done():
+            return
+        try:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+        except RuntimeError:
+            pass
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_SECONDS)
+            await asyncio.to_thread(self.flush)
+
+
+def read_records(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def report(path: str, top: int = 10):
+    per_student = defaultdict(lambda: defaultdict(int))
+    per_route = defaultdict(lambda: defaultdict(int))
+    per_tool = defaultdict(int)
+    cancelled = defaultdict(int)
+    tokens_avoided = 0
+    sessions = set()
+    for record in read_records(path):
+        sessions.add(record["session_id"])
+        if record.get("cancelled"):
+            cancelled[record["cancelled"]] += 1
+            tokens_avoided += record.get("tokens_avoided", 0)
+        for bucket in (per_student[record["user_id"]], per_route[record["route"]]):
+            bucket["turns"] += 1
+            bucket["input_tokens"] += record["input_tokens"]
+            bucket["output_tokens"] += record["output_tokens"]
+            bucket["cached_tokens"] += record["cached_tokens"]
+        for tool, tokens in record["tool_payload_tokens"].items():
+            per_tool[tool] += tokens
+
+    total_in = sum(s["input_tokens"] for s in per_student.values())
+    total_out = sum(s["output_tokens"] for s in per_student.values())
+    total_turns = sum(s["turns"] for s in per_student.values())
+    print(f"📊 {path}: {total_turns} turns, {len(sessions)} sessions, {len(per_student)} students")
+    print(f"   input {total_in:,}  output {total_out:,}  per turn {(total_in + total_out) // max(1, total_turns):,}")
+    if cancelled:
+        reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(cancelled.items()))
+        print(f"   cancelled turns: {sum(cancelled.values())} ({reasons}), ~{tokens_avoided:,} output tokens avoided")
+    print()
+
+    print(f"{'route':<12}{'turns':>8}{'input':>12}{'output':>10}{'cached':>10}")
+    for route, s in sorted(per_route.items(), key=lambda item: -item[1]["input_tokens"]):
+        print(f"{route:<12}{s['turns']:>8}{s['input_tokens']:>12,}{s['output_tokens']:>10,}{s['cached_tokens']:>10,}")
+
+    print(f"\n{'tool payload':<32}{'est. tokens':>12}{'share of input':>16}")
+    for tool, tokens in sorted(per_tool.items(), key=lambda item: -item[1])[:top]:
+        print(f"{tool:<32}{tokens:>12,}{100 * tokens / max(1, total_in):>15.1f}%")
+
+    print(f"\n{'student':<24}{'turns':>8}{'tokens':>12}")
+    for user_id, s in sorted(per_student.items(), key=lambda item: -(item[1]['input_tokens'] + item[1]['output_tokens']))[:top]:
+        print(f"{user_id:<24}{s['turns']:>8}{s['input_tokens'] + s['output_tokens']:>12,}")
+
+
+usage_ledger = UsageLedger()
+atexit.register(usage_ledger.flush)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token usage report")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_parser = sub.add_parser("report")
+    report_parser.add_argument("path", nargs="?", default=USAGE_LOG_PATH)
+    report_parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    report(args.path, args.top)
+
+
+if __name__ == "__main__":
+    main()